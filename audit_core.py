@@ -0,0 +1,619 @@
+import io
+import json
+import math
+import re
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# =========================================================
+# Shared helpers for the Uzio vs ADP / Paycom audit tools
+# (census, payment & emergency, deduction, prior payroll)
+# =========================================================
+
+# Whole floats below this print without an exponent, so str(1001.0) == "1001.0"
+# and the ".0" artifact can be dropped with a plain int conversion.
+_FLOAT_KEY_LIMIT = 1e16
+
+def _norm_key_text(text: pd.Series) -> np.ndarray:
+    """String half of norm_key_series, run on Arrow-backed strings (C++ kernels)."""
+    text = text.astype("string[pyarrow]").str.strip().str.replace("\u00A0", " ", regex=False)
+    # "1001.00" -> "1001": digits, a dot, then only zeros
+    head = text.str.rstrip("0")
+    mant = head.str[:-1]
+    artifact = head.str.endswith(".") & (head.str.len() < text.str.len()) & mant.str.isdecimal()
+    return text.mask(artifact, mant).to_numpy(dtype=object)
+
+def norm_key_series(s: pd.Series) -> pd.Series:
+    """
+    Normalize an employee key column in one vectorized pass:
+      - NaN/None -> ""
+      - surrounding whitespace (including NBSP) stripped, inner NBSP -> space
+      - Excel float artifacts dropped: 1001.0 / "1001.00" -> "1001"
+    Same result as str(v).strip() + re.fullmatch(r"\\d+\\.0+") per cell.
+    """
+    vals = s.to_numpy(dtype=object, na_value=None)
+    out = np.full(len(vals), "", dtype=object)
+    present = pd.notna(vals)
+
+    # Whole non-negative floats (IDs read from Excel) skip the string round trip
+    if pd.api.types.infer_dtype(vals, skipna=True) in ("string", "empty"):
+        float_pos = np.empty(0, dtype=np.intp)
+    else:
+        is_float = np.fromiter((isinstance(v, float) for v in vals), dtype=bool, count=len(vals))
+        float_pos = np.flatnonzero(is_float & present)
+    nums = vals[float_pos].astype("float64")
+    whole = (nums >= 0) & (nums < _FLOAT_KEY_LIMIT) & (nums == np.floor(nums)) & ~np.signbit(nums)
+    out[float_pos[whole]] = nums[whole].astype(np.int64).astype(str)
+
+    text_pos = np.setdiff1d(np.flatnonzero(present), float_pos[whole], assume_unique=True)
+    if len(text_pos):
+        out[text_pos] = _norm_key_text(pd.Series(vals[text_pos], dtype=object).astype(str))
+    return pd.Series(out, index=s.index, dtype=object)
+
+def first_index_by_key(keys: pd.Series) -> dict:
+    """{key: index label of its first row} for a normalized key column, blanks skipped."""
+    first = keys[~keys.duplicated() & (keys != "")]
+    return dict(zip(first, first.index))
+
+# ---------- Distinct values (column-at-a-time comparisons) ----------
+def as_object_array(values) -> np.ndarray:
+    values = list(values)
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+def distinct_positions(values: np.ndarray):
+    """First position of each distinct value and the inverse index mapping every row back to it."""
+    codes, _ = pd.factorize(values)
+    # factorize groups by equality, so 1, 1.0 and True would collapse into one value; split them by type
+    type_codes, type_uniques = pd.factorize(pd.Series(values, dtype=object).map(type).to_numpy())
+    combined = codes.astype(np.int64) * len(type_uniques) + type_codes
+    _, first_pos, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    return first_pos, inverse.ravel()
+
+def normalize_distinct(values, normalize) -> np.ndarray:
+    """Apply normalize() once per distinct value of a column and map the results back onto every row."""
+    values = np.asarray(values, dtype=object)
+    if len(values) == 0:
+        return values.copy()
+    first_pos, inverse = distinct_positions(values)
+    normalized = as_object_array(normalize(values[i]) for i in first_pos)
+    return normalized[inverse]
+
+# ---------- Duplicate row resolution ----------
+def parse_sort_dates(s: pd.Series) -> pd.Series:
+    """Parse a date column for ranking; blank or unparseable values rank as Timestamp.min."""
+    vals = s.where(s.notna(), "").astype(str).str.strip()
+    uniques = [v for v in pd.unique(vals) if v != ""]
+    try:
+        bulk = pd.to_datetime(pd.Series(uniques, dtype=object), format="mixed", errors="coerce")
+        if not pd.api.types.is_datetime64_any_dtype(bulk):
+            bulk = pd.Series(pd.NaT, index=range(len(uniques)))
+    except (ValueError, TypeError):
+        bulk = pd.Series(pd.NaT, index=range(len(uniques)))
+
+    parsed = {"": pd.Timestamp.min}
+    for v, d in zip(uniques, bulk):
+        if not pd.isna(d):
+            parsed[v] = d
+            continue
+        try:
+            parsed[v] = pd.to_datetime(v)
+        except Exception:
+            parsed[v] = pd.Timestamp.min
+    return vals.map(parsed)
+
+# ---------- Money / percent amounts (deduction, prior payroll) ----------
+def _parse_money_values(vals: np.ndarray):
+    """parse_money_column on an object array: (float64 amounts, text or None)."""
+    amounts = np.zeros(len(vals))
+    text = np.full(len(vals), None, dtype=object)
+    pos = np.flatnonzero(pd.notna(vals) & (vals != ""))
+    raw = pd.Series(vals[pos], dtype=object).map(str).str.strip()
+    cleaned = (
+        raw.str.replace("$", "", regex=False).str.replace("%", "", regex=False).str.replace(",", "", regex=False)
+        .str.replace("(", "-", regex=False).str.replace(")", "", regex=False)  # accounting negative
+    )
+
+    # astype reads with float() semantics (to_numeric can differ in the last bit);
+    # when some cell does not parse, to_numeric picks out the ones that do
+    try:
+        amounts[pos] = cleaned.astype("float64").to_numpy()
+        return amounts, text
+    except ValueError:
+        numeric = pd.to_numeric(cleaned, errors="coerce").notna().to_numpy()
+    try:
+        amounts[pos[numeric]] = cleaned[numeric].astype("float64").to_numpy()
+    except ValueError:
+        numeric[:] = False
+    # The rest is text, apart from what only float() reads ("nan", "1_000")
+    for p, r, c in zip(pos[~numeric], raw[~numeric], cleaned[~numeric]):
+        try:
+            amounts[p] = float(c)
+        except ValueError:
+            amounts[p] = np.nan
+            text[p] = r
+    return amounts, text
+
+def parse_money_column(s: pd.Series):
+    """
+    Parse a money / percentage column, once per distinct value:
+      - blank (NaN / None / "") -> 0.0
+      - "$1,200.00" / "5%" / "(15.00)" -> 1200.0 / 5.0 / -15.0
+      - anything float() rejects (e.g. "N/A") keeps its stripped text
+    Returns (amounts, text): float64 with NaN where the cell is text, and the text
+    (None elsewhere). Same values as str(v).strip() + float() per cell.
+    """
+    if pd.api.types.is_float_dtype(s) or pd.api.types.is_integer_dtype(s):
+        amounts, text = s.astype("float64").fillna(0.0).to_numpy(), np.full(len(s), None, dtype=object)
+    elif len(s) == 0:
+        amounts, text = np.zeros(0), np.full(0, None, dtype=object)
+    else:
+        vals = s.to_numpy(dtype=object)
+        first_pos, inverse = distinct_positions(vals)
+        amounts, text = _parse_money_values(vals[first_pos])
+        amounts, text = amounts[inverse], text[inverse]
+    return pd.Series(amounts, index=s.index), pd.Series(text, index=s.index, dtype=object)
+
+def money_values_match(a_amount: pd.Series, a_text: pd.Series, b_amount: pd.Series, b_text: pd.Series) -> np.ndarray:
+    """Numbers agree within a cent; when either side is text, both must be the same text."""
+    a_is_text = a_text.notna().to_numpy()
+    b_is_text = b_text.notna().to_numpy()
+    numbers_match = np.abs(a_amount.to_numpy(dtype="float64") - b_amount.to_numpy(dtype="float64")) < 0.01
+    texts_match = a_is_text & b_is_text & (a_text.to_numpy() == b_text.to_numpy())
+    return np.where(a_is_text | b_is_text, texts_match, numbers_match)
+
+def money_display(amount: pd.Series, text: pd.Series) -> pd.Series:
+    """Report value of a parsed amount: the number, or the original text where it did not parse."""
+    return amount.astype(object).where(text.isna(), text)
+
+def composite_key_codes(left_parts: list, right_parts: list):
+    """
+    Case-insensitive join key for two record sets matched on several text columns
+    (employee, [pay date], deduction). Each column is lowercased once per distinct
+    value and factorized over both sides; the per-column codes fold into one int64
+    per row. Codes sort like the lowercased tuples, so an outer merge on them orders
+    rows by employee, then pay date, then deduction. A missing part (None / NaN) gets a
+    code of its own, sorted first: it matches only another missing part, never a value.
+    Returns (left codes, right codes).
+    """
+    n_left = len(left_parts[0])
+    combined = np.zeros(n_left + len(right_parts[0]), dtype=np.int64)
+    for left, right in zip(left_parts, right_parts):
+        values = np.concatenate([np.asarray(left, dtype=object), np.asarray(right, dtype=object)])
+        codes, uniques = pd.factorize(values)
+        lowered = pd.Index(uniques, dtype=object).astype(str).str.lower()
+        part_codes, part_uniques = pd.factorize(lowered, sort=True)
+        # factorize codes missing values -1, which indexes the trailing 0 slot
+        part_codes = np.append(part_codes + 1, 0)
+        # Re-factorize after each fold so the codes stay below the row count
+        combined = combined * (len(part_uniques) + 1) + part_codes[codes]
+        combined = pd.factorize(combined, sort=True)[0].astype(np.int64)
+    return combined[:n_left], combined[n_left:]
+
+def deduction_status(has_adp, has_uzio, matched, emp_in_uzio, emp_in_adp) -> np.ndarray:
+    """Status of each merged deduction line (ADP and/or Uzio side present)."""
+    return np.select(
+        [has_adp & has_uzio & matched, has_adp & has_uzio, has_adp & emp_in_uzio, has_adp,
+         has_uzio & emp_in_adp, has_uzio],
+        ["Data Match", "Data Mismatch", "Value Missing in Uzio (ADP has Value)", "Employee Missing in Uzio",
+         "Value Missing in ADP (Uzio has Value)", "Employee Missing in ADP"],
+        default="",
+    ).astype(object)
+
+# ---------- Categorical detail columns ----------
+def column_codes(s: pd.Series):
+    """
+    (integer codes, labels) of a detail column. Categorical columns hand over their
+    codes as-is; other columns are factorized. Missing values get code -1.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), np.asarray(s.cat.categories, dtype=object)
+    codes, labels = pd.factorize(s)
+    return codes, np.asarray(labels, dtype=object)
+
+def count_by_field_and_status(detail: pd.DataFrame, field_col: str, status_col: str) -> pd.DataFrame:
+    """
+    Rows per field (index) and status (columns) from one bincount over the integer
+    codes; the same table as pivot_table(aggfunc="count"), labels sorted and only
+    observed fields / statuses kept.
+    """
+    f_codes, fields = column_codes(detail[field_col])
+    s_codes, statuses = column_codes(detail[status_col])
+    present = (f_codes >= 0) & (s_codes >= 0)
+    flat = f_codes[present].astype(np.int64) * len(statuses) + s_codes[present]
+    counts = np.bincount(flat, minlength=len(fields) * len(statuses)).reshape(len(fields), len(statuses))
+    table = pd.DataFrame(
+        counts,
+        index=pd.Index(fields, dtype=object, name=field_col),
+        columns=pd.Index(statuses, dtype=object, name=status_col),
+    )
+    table = table.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+    return table.sort_index().sort_index(axis=1)
+
+# ---------- Employee rollup ----------
+MATCH_STATUS = "Data Match"
+# Employee- and column-level statuses: counted, but not listed as mismatched fields
+NON_FIELD_STATUS_PREFIXES = ("Employee ID Not Found in ", "Column Missing in ")
+FIELD_LIST_SEP = ", "
+
+def build_employee_summary(detail: pd.DataFrame, key_col: str, status_col: str,
+                           statuses: list, context_cols=()) -> pd.DataFrame:
+    """
+    One row per employee of a comparison detail frame, from a single groupby:
+    the employee's context columns, how many fields landed in each status, and
+    the fields that did not match.
+    """
+    s_codes, labels = column_codes(detail[status_col])
+    # extra statuses in order of first appearance, as pd.unique would list them
+    seen = [labels[c] for c in pd.unique(s_codes) if c >= 0]
+    all_statuses = list(statuses) + [s for s in seen if s not in statuses]
+    code_of = {s: i for i, s in enumerate(labels)}
+
+    cols = {key_col: detail[key_col].to_numpy(dtype=object)}
+    for c in context_cols:
+        cols[c] = detail[c].to_numpy(dtype=object)
+    for s in all_statuses:
+        cols[s] = (s_codes == code_of.get(s, -2)).astype(np.int32)
+    # per label, then broadcast through the codes
+    label_listed = np.array(
+        [s != MATCH_STATUS and not str(s).startswith(NON_FIELD_STATUS_PREFIXES) for s in labels] + [False],
+        dtype=bool,
+    )
+    f_codes, fields = column_codes(detail["Field"])
+    field_parts = np.append(np.array([f"{f}{FIELD_LIST_SEP}" for f in fields], dtype=object), "")
+    cols["Mismatched Fields"] = np.where(label_listed[s_codes], field_parts[f_codes], "")
+
+    agg = {c: "first" for c in context_cols}
+    agg.update({s: "sum" for s in all_statuses})
+    agg["Mismatched Fields"] = "sum"
+    summary = pd.DataFrame(cols).groupby(key_col, sort=False).agg(agg).reset_index()
+
+    summary.insert(1 + len(context_cols), "Fields Compared", summary[all_statuses].sum(axis=1))
+    summary.insert(2 + len(context_cols), "Fields Not OK", summary["Fields Compared"] - summary[MATCH_STATUS])
+    summary["Mismatched Fields"] = summary["Mismatched Fields"].str[:-len(FIELD_LIST_SEP)]
+    return summary
+
+# ---------- Audit scope (selective re-runs) ----------
+def _as_list(values) -> list:
+    if values is None:
+        return []
+    if isinstance(values, str):
+        return [values]
+    return list(values)
+
+def _field_token(name) -> str:
+    return " ".join(str(name).split()).casefold()
+
+def select_fields(mapped_fields: list, fields=None) -> list:
+    """
+    Mapped fields restricted to `fields` (matched ignoring case and spacing), in
+    mapping-sheet order. None / empty keeps every mapped field.
+    """
+    fields = _as_list(fields)
+    if not fields:
+        return list(mapped_fields)
+    known = {_field_token(f) for f in mapped_fields}
+    unknown = [str(f) for f in fields if _field_token(f) not in known]
+    if unknown:
+        raise ValueError(f"Fields not found in the mapping sheet: {', '.join(unknown)}")
+    wanted = {_field_token(f) for f in fields}
+    return [f for f in mapped_fields if _field_token(f) in wanted]
+
+def normalize_employee_ids(employee_ids=None) -> set:
+    """Requested employee IDs normalized like the key columns. Empty set = no filter."""
+    ids = _as_list(employee_ids)
+    if not ids:
+        return set()
+    return set(norm_key_series(pd.Series(ids, dtype=object))) - {""}
+
+def parse_employee_ids(text: str) -> list:
+    """IDs pasted into the UI: separated by commas, semicolons, spaces or new lines."""
+    return [t for t in re.split(r"[\s,;]+", text or "") if t]
+
+def audit_scope_metrics(selected_fields: list, n_mapped_fields: int, requested_ids: set, found_ids: set) -> pd.DataFrame:
+    """Extra Summary rows (Metric / Value) describing a selective run; empty for a full audit."""
+    rows = []
+    if len(selected_fields) != n_mapped_fields:
+        rows.append(("Fields selected for this run", f"{len(selected_fields)} of {n_mapped_fields}: {', '.join(selected_fields)}"))
+    if requested_ids:
+        missing = sorted(requested_ids - found_ids)
+        rows.append(("Employee IDs requested for this run", len(requested_ids)))
+        rows.append(("Requested employee IDs not found in either sheet", ", ".join(missing) if missing else 0))
+    return pd.DataFrame(rows, columns=["Metric", "Value"])
+
+# ---------- Mapping label resolution ----------
+# Mapping sheets name payroll columns loosely ("ASSOCIATE ID (or Associate ID)",
+# "SV1 - savings"). The index over one sheet's columns is built once per workbook;
+# each label then tries, in order: the exact name, each alias part of the label,
+# and finally the first column (in sheet order) whose name contains the label or
+# is contained in it.
+LABEL_ALIAS_SPLIT = re.compile(r"\(|\)|\bor\b|/|,|;", flags=re.IGNORECASE)
+LABEL_DASH_SPLIT = re.compile(r"\s[-–]\s")
+
+def build_label_index(columns, norm) -> dict:
+    """Lookup tables for resolve_label over one sheet's columns; norm is the module's norm_colname."""
+    exact = {norm(c).casefold(): c for c in columns}
+    names = [k for k in exact if k]
+    starts, pos = [], 0
+    for k in names:
+        starts.append(pos)
+        pos += len(k) + 1
+    by_length = {}
+    for order, k in enumerate(names):
+        by_length.setdefault(len(k), {})[k] = order
+    return {
+        "norm": norm,
+        "exact": exact,
+        "names": names,
+        # names joined by a separator no header contains: one find() locates the first name containing a label
+        "joined": "\x00".join(names),
+        "starts": np.array(starts, dtype=np.int64),
+        "by_length": by_length,
+    }
+
+def _first_containing(index: dict, text: str):
+    """First name (in sheet order) that contains text or is contained in text."""
+    best = len(index["names"])
+    hit = index["joined"].find(text)
+    if hit >= 0 and index["names"]:
+        best = int(np.searchsorted(index["starts"], hit, side="right")) - 1
+    for length, names in index["by_length"].items():
+        if length > len(text):
+            continue
+        for i in range(len(text) - length + 1):
+            order = names.get(text[i:i + length])
+            if order is not None and order < best:
+                best = order
+    return index["names"][best] if best < len(index["names"]) else None
+
+def clean_mapping_label(label) -> str:
+    if label is None:
+        return ""
+    raw = str(label).strip()
+    raw = raw.replace("’", "'").replace("“", '"').replace("”", '"')
+    return raw.strip().strip(",")
+
+def resolve_label(label, index: dict) -> tuple:
+    """
+    (column, how) for a mapping-sheet label, how being "exact", "alias" or
+    "contains"; ("", "") when the label is blank or matches no column.
+    """
+    raw = clean_mapping_label(label)
+    if raw == "":
+        return "", ""
+
+    norm, exact = index["norm"], index["exact"]
+    direct = norm(raw).casefold()
+    if direct in exact:
+        return exact[direct], "exact"
+
+    parts = [norm(p) for p in LABEL_ALIAS_SPLIT.split(raw) if norm(p)]
+    extra = []
+    for p in parts:
+        extra.extend([norm(x) for x in LABEL_DASH_SPLIT.split(p) if norm(x)])
+    for p in parts + extra:
+        k = norm(p).casefold()
+        if k in exact:
+            return exact[k], "alias"
+
+    name = _first_containing(index, direct)
+    if name is not None:
+        return exact[name], "contains"
+    return "", ""
+
+# ---------- Preflight (header-only validation) ----------
+def require_sheets(xls: pd.ExcelFile, *sheet_names: str):
+    """Fail fast when an expected tab is absent; only the workbook's sheet list is read."""
+    missing = [s for s in sheet_names if s not in xls.sheet_names]
+    if missing:
+        raise ValueError(
+            f"Missing tab(s): {', '.join(missing)}. Found: {', '.join(map(str, xls.sheet_names))}"
+        )
+
+def read_header(xls: pd.ExcelFile, sheet_name: str) -> list:
+    """Column headers of a sheet; openpyxl streams in read-only mode and stops after row 1."""
+    return list(pd.read_excel(xls, sheet_name=sheet_name, nrows=0).columns)
+
+# ---------- Report export (Excel row limit, Parquet copy) ----------
+# An xlsx sheet holds 1,048,576 rows; one goes to the header written by to_excel.
+EXCEL_MAX_DATA_ROWS = 1_048_575
+
+def shard_sheet_names(sheet_name: str, n_rows: int, max_rows: int = EXCEL_MAX_DATA_ROWS) -> list:
+    """[sheet_name] when the rows fit on one sheet, else sheet_name_1, sheet_name_2, ..."""
+    n_sheets = max(1, math.ceil(n_rows / max_rows))
+    if n_sheets == 1:
+        return [sheet_name]
+    return [f"{sheet_name}_{i}" for i in range(1, n_sheets + 1)]
+
+def write_sheet_sharded(writer: pd.ExcelWriter, df: pd.DataFrame, sheet_name: str,
+                        max_rows: int = EXCEL_MAX_DATA_ROWS) -> list:
+    """
+    DataFrame.to_excel that splits frames over the Excel row limit across
+    consecutive sheets (each with its own header). Returns the sheet names written.
+    """
+    names = shard_sheet_names(sheet_name, len(df), max_rows)
+    for i, name in enumerate(names):
+        df.iloc[i * max_rows:(i + 1) * max_rows].to_excel(writer, sheet_name=name, index=False)
+    return names
+
+def shard_metrics(sheet_names: list) -> pd.DataFrame:
+    """Extra Summary row (Metric / Value) naming the detail sheets; empty when not split."""
+    rows = []
+    if len(sheet_names) > 1:
+        rows.append(("Comparison detail split across sheets (Excel row limit)", ", ".join(sheet_names)))
+    return pd.DataFrame(rows, columns=["Metric", "Value"])
+
+def detail_parquet_bytes(df: pd.DataFrame) -> bytes:
+    """
+    The whole detail frame as Parquet (no row limit, loads in one call with
+    pd.read_parquet). Object columns mix text, numbers and dates, so they are
+    stored as strings.
+    """
+    text_cols = df.select_dtypes(include="object").columns
+    out = io.BytesIO()
+    df.astype({c: "string" for c in text_cols}).to_parquet(out, index=False)
+    return out.getvalue()
+
+# ---------- Arrow storage of mixed-type columns ----------
+# Raw cells mix text, numbers, dates, durations and blanks in one object column. For a
+# Parquet snapshot each cell is stored as "<type>\x1f<text>" and read back as the same
+# type, so a stored value compares and writes to Excel exactly like the original. This
+# covers everything openpyxl and pandas put in a cell (numpy scalars by dtype); nothing
+# read back is unpickled or evaluated.
+_CELL_SEP = "\x1f"
+
+def _timedelta_text(v: timedelta) -> str:
+    return f"{v.days},{v.seconds},{v.microseconds}"
+
+def _timedelta_from_text(t: str) -> timedelta:
+    days, seconds, microseconds = map(int, t.split(","))
+    return timedelta(days=days, seconds=seconds, microseconds=microseconds)
+
+_CELL_TYPES = {
+    str: ("str", str, str),
+    int: ("int", str, int),
+    float: ("float", repr, float),
+    complex: ("complex", repr, complex),
+    bool: ("bool", str, lambda t: t == "True"),
+    bytes: ("bytes", bytes.hex, bytes.fromhex),
+    Decimal: ("decimal", str, Decimal),
+    type(None): ("none", lambda v: "", lambda t: None),
+    datetime: ("datetime", datetime.isoformat, datetime.fromisoformat),
+    date: ("date", date.isoformat, date.fromisoformat),
+    time: ("time", time.isoformat, time.fromisoformat),
+    timedelta: ("timedelta", _timedelta_text, _timedelta_from_text),
+    pd.Timestamp: ("timestamp", pd.Timestamp.isoformat, pd.Timestamp),
+    pd.Timedelta: ("pd_timedelta", lambda v: str(v.value), lambda t: pd.Timedelta(int(t), unit="ns")),
+    type(pd.NaT): ("nat", lambda v: "", lambda t: pd.NaT),
+}
+_CELL_DECODERS = {name: from_text for name, _, from_text in _CELL_TYPES.values()}
+_NUMPY_CELL_PREFIX = "np:"
+ARROW_OBJECT_COLUMNS_KEY = b"audit_object_columns"
+
+def _numpy_cell_text(value: np.generic) -> str:
+    kind = value.dtype.kind
+    if kind in "iu":
+        return str(int(value))
+    if kind == "b":
+        return str(bool(value))
+    if kind in "fc":
+        # repr of the Python scalar is exact up to 64 bits; str of a longdouble is too
+        return repr(value.item()) if value.dtype.itemsize <= 8 else str(value)
+    if kind in "mM":
+        return str(int(value.view(np.int64)))
+    if kind == "U":
+        return str(value)
+    raise ValueError(f"Cannot store a {type(value).__name__} cell.")
+
+def _numpy_cell_from_text(dtype: np.dtype, text: str):
+    if dtype.kind in "mM":
+        return np.int64(int(text)).view(dtype)
+    if dtype.kind == "b":
+        return dtype.type(text == "True")
+    if dtype.kind == "c" and dtype.itemsize <= 16:
+        return dtype.type(complex(text))
+    return dtype.type(text)
+
+def _encode_cell(value) -> str:
+    codec = _CELL_TYPES.get(type(value))
+    if codec is not None:
+        name, to_text, _ = codec
+        return name + _CELL_SEP + to_text(value)
+    if isinstance(value, np.generic):
+        return _NUMPY_CELL_PREFIX + value.dtype.str + _CELL_SEP + _numpy_cell_text(value)
+    raise ValueError(f"Cannot store a {type(value).__name__} cell.")
+
+def _decode_cell(cell: str):
+    name, _, text = cell.partition(_CELL_SEP)
+    if name.startswith(_NUMPY_CELL_PREFIX):
+        return _numpy_cell_from_text(np.dtype(name[len(_NUMPY_CELL_PREFIX):]), text)
+    return _CELL_DECODERS[name](text)
+
+def frame_to_arrow(df: pd.DataFrame, metadata: dict = None) -> pa.Table:
+    """
+    df as an Arrow table; object columns are tagged per cell (see above) and listed in
+    the schema metadata, with any extra metadata (str -> str). Raises ValueError for a
+    cell type that cannot be stored.
+    """
+    object_cols = list(df.select_dtypes(include="object").columns)
+    encoded = df.copy(deep=False)
+    for c in object_cols:
+        encoded[c] = normalize_distinct(df[c].to_numpy(), _encode_cell)
+    table = pa.Table.from_pandas(encoded, preserve_index=False)
+    extra = {ARROW_OBJECT_COLUMNS_KEY: json.dumps(object_cols).encode("utf-8")}
+    extra.update({k.encode("utf-8"): v.encode("utf-8") for k, v in (metadata or {}).items()})
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), **extra})
+
+def frame_from_arrow(table: pa.Table) -> pd.DataFrame:
+    """Inverse of frame_to_arrow: the tagged object columns come back as their original cells."""
+    object_cols = json.loads((table.schema.metadata or {}).get(ARROW_OBJECT_COLUMNS_KEY, b"[]"))
+    df = table.to_pandas()
+    for c in object_cols:
+        codes, uniques = pd.factorize(df[c].to_numpy(dtype=object))
+        # a Series keeps object dtype; assigning the bare array would infer datetime64
+        df[c] = pd.Series(as_object_array(_decode_cell(u) for u in uniques)[codes], index=df.index, dtype=object)
+    return df
+
+def arrow_metadata(table: pa.Table) -> dict:
+    """The str -> str schema metadata of a table written by frame_to_arrow."""
+    return {k.decode("utf-8"): v.decode("utf-8") for k, v in (table.schema.metadata or {}).items()}
+
+# ---------- Row fingerprints (incremental re-audits) ----------
+def row_fingerprints(df: pd.DataFrame) -> pd.Series:
+    """
+    Deterministic 64-bit hash of every row's values, same index as df. Cells are
+    hashed by text and by Python type, so 1, 1.0 and "1" fingerprint differently.
+    """
+    kinds = {}
+    for i, (_, col) in enumerate(df.items()):
+        codes, uniques = pd.factorize(col.map(type), use_na_sentinel=False)
+        kinds[i] = np.asarray([t.__name__ for t in uniques], dtype=object)[codes]
+    values = df.set_axis(range(df.shape[1]), axis=1)
+    hashed = pd.concat([values, pd.DataFrame(kinds, index=df.index).add_prefix("type_")], axis=1)
+    return pd.util.hash_pandas_object(hashed, index=False)
+
+# ---------- Employment status filter ----------
+# "Active only" audits: ADP / Paycom report employees on leave as "Leave ..." /
+# "On Leave", which the census rules already treat as active.
+ACTIVE_STATUSES = ("active", "leave")
+
+def normalize_status_filter(statuses=None) -> tuple:
+    """Status words to keep, compared ignoring case and spacing. Empty tuple = no filter."""
+    tokens = (" ".join(str(s).split()).casefold() for s in _as_list(statuses))
+    return tuple(dict.fromkeys(t for t in tokens if t))
+
+def _status_text(s: pd.Series) -> pd.Series:
+    return s.where(s.notna(), "").astype(str).str.split().str.join(" ").str.casefold()
+
+def status_excluded_employees(statuses_by_sheet: list, keep: tuple) -> pd.Series:
+    """
+    Employees outside a status filter: key -> the status they were excluded with.
+    statuses_by_sheet holds one Series per sheet (employee key -> raw status; the first
+    row per key counts). An employee is kept when any sheet's status contains one of
+    `keep` as whole words ("On Leave" matches "leave", "Inactive" does not match
+    "active"), or when neither sheet has a status for them.
+    """
+    sides = [s[(s.index != "") & ~s.index.duplicated()] for s in statuses_by_sheet]
+    raw = pd.concat(sides, axis=1, ignore_index=True)
+    text = raw.apply(_status_text)
+    known = text != ""
+    pattern = r"\b(?:" + "|".join(re.escape(k) for k in keep) + r")\b"
+    kept = (known & text.apply(lambda col: col.str.contains(pattern, regex=True))).any(axis=1)
+    excluded = known.any(axis=1) & ~kept
+    shown = raw.where(known).bfill(axis=1).iloc[:, 0]
+    return shown[excluded].astype(str).str.strip()
+
+def status_filter_metrics(keep: tuple, excluded: pd.Series) -> pd.DataFrame:
+    """Extra Summary rows (Metric / Value) for a status-filtered run; empty without a filter."""
+    rows = []
+    if keep:
+        rows.append(("Employment statuses audited (status contains)", ", ".join(keep)))
+        rows.append(("Employees excluded by status filter", len(excluded)))
+        for status, n in excluded.value_counts().items():
+            rows.append((f"Excluded with status: {status}", int(n)))
+    return pd.DataFrame(rows, columns=["Metric", "Value"])
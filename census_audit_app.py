@@ -1,11 +1,74 @@
 # app.py
+import hashlib
 import io
+import json
+import os
 import re
-from datetime import datetime, date
+import tempfile
+import time
+from datetime import date
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableStyleInfo
+
+import audit_core
+from audit_core import (
+    ACTIVE_STATUSES,
+    EXCEL_MAX_DATA_ROWS,
+    as_object_array,
+    audit_scope_metrics,
+    build_employee_summary,
+    count_by_field_and_status,
+    detail_parquet_bytes,
+    norm_key_series,
+    normalize_employee_ids,
+    normalize_status_filter,
+    parse_employee_ids,
+    read_header,
+    require_sheets,
+    row_fingerprints,
+    select_fields,
+    shard_metrics,
+    shard_sheet_names,
+    status_excluded_employees,
+    status_filter_metrics,
+    write_sheet_sharded,
+)
+import census_audit_core
+from census_audit_core import (
+    ALLOWED_TERM_REASONS,
+    COMPARISON_ENGINES,
+    DETAIL_COLUMNS,
+    EMPLOYEE_COLUMNS,
+    EMPLOYMENT_STATUS_OUTCOMES,
+    OUTPUT_LAYOUTS,
+    STAR_DETAIL_COLUMNS,
+    build_comparison_detail_columnar,
+    build_normalizer_plan,
+    cleanse_uzio_value_for_field,
+    deduplicate_adp,
+    employee_context_columns,
+    encode_detail,
+    is_annual_salary_field,
+    is_employment_status_field,
+    is_hourly_rate_field,
+    is_pay_type_field,
+    is_termination_reason_field,
+    norm_blank,
+    norm_colname,
+    normalize_paytype_for_compare,
+    normalize_paytype_text,
+    normalize_reason_text,
+    paytype_bucket,
+    status_contains_any,
+    uzio_is_active,
+    uzio_is_terminated,
+)
 
 # =========================================================
 # Data_Audit_Tool (Streamlit)
@@ -18,6 +81,7 @@ import streamlit as st
 #   - Summary
 #   - Field_Summary_By_Status   (Columns G,H,I removed)
 #   - Comparison_Detail_AllFields
+#     (split into Comparison_Detail_AllFields_1, _2, ... past Excel's row limit)
 #
 # Removed sheets from output report:
 #   - Mismatches_Only
@@ -31,294 +95,195 @@ UZIO_SHEET = "Uzio Data"
 ADP_SHEET = "ADP Data"
 MAP_SHEET = "Mapping Sheet"
 
-# ---------- Helpers ----------
-def norm_colname(c: str) -> str:
-    if c is None:
-        return ""
-    c = str(c).replace("\n", " ").replace("\r", " ")
-    c = c.replace("\u00A0", " ")
-    c = re.sub(r"\s+", " ", c).strip()
-    c = c.replace("*", "")
-    c = c.strip('"').strip("'")
-    return c
-
-def norm_blank(x):
-    if x is None:
-        return ""
-    if isinstance(x, float) and np.isnan(x):
-        return ""
-    if isinstance(x, str) and x.strip().lower() in {"", "nan", "none", "null"}:
-        return ""
-    return x
-
-def try_parse_date(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    if isinstance(x, (datetime, date, np.datetime64, pd.Timestamp)):
-        return pd.to_datetime(x).date().isoformat()
-    if isinstance(x, str):
-        s = x.strip()
+# ---------- Report layout ----------
+def add_excel_table(worksheet, df: pd.DataFrame, name: str):
+    """
+    Register a sheet written by DataFrame.to_excel (header in row 1) as an Excel table,
+    so auditors can relate Comparison_Detail to Employees on Employee ID.
+    """
+    if df.empty:
+        return
+    ref = f"A1:{get_column_letter(df.shape[1])}{df.shape[0] + 1}"
+    table = Table(displayName=name, ref=ref)
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleLight9", showRowStripes=True)
+    worksheet.add_table(table)
+
+# ---------- Incremental re-audit cache ----------
+# Each full run can leave a snapshot for the client: one fingerprint per employee (their
+# raw mapped values on both sides plus Employment Status / Pay Type) and the employee's
+# comparison rows. The next run recompares only employees whose fingerprint changed. A
+# row is reused only when its inputs hash identically, and the snapshot is keyed by the
+# mapping, the columns present and this code. Snapshots hold employee data, so caching is
+# off unless AUDIT_CACHE_ENV names a private directory; each client gets its own
+# subdirectory, snapshots are Parquet (never unpickled), and old ones are pruned.
+AUDIT_CACHE_ENV = "CENSUS_AUDIT_CACHE_DIR"
+AUDIT_CACHE_FORMAT = 2
+AUDIT_CACHE_KEEP = 3
+AUDIT_CACHE_MAX_AGE_DAYS = 30
+_FINGERPRINT_COL = "_employee_fingerprint"
+
+def audit_cache_root():
+    """Directory configured for incremental re-audit snapshots, or None (caching disabled)."""
+    return os.environ.get(AUDIT_CACHE_ENV) or None
+
+def client_cache_dir(root: str, client_name: str) -> str:
+    """Snapshot directory of one client under root (client names compare ignoring case and spacing)."""
+    name = " ".join(str(client_name or "").split()).casefold()
+    if not name:
+        raise ValueError("Enter the client name to run an incremental re-audit.")
+    slug = re.sub(r"[^a-z0-9]+", "_", name).strip("_")[:40] or "client"
+    return os.path.join(root, f"{slug}_{hashlib.sha256(name.encode('utf-8')).hexdigest()[:12]}")
+
+def _source_digest() -> str:
+    digest = hashlib.sha256()
+    for module_file in (__file__, census_audit_core.__file__, audit_core.__file__):
+        with open(module_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def audit_cache_signature(mapped_fields, uz_to_adp: dict, uzio_columns, adp_columns) -> str:
+    """Identity of a run's comparison rules; snapshots only serve runs with the same signature."""
+    uzio_columns, adp_columns = set(uzio_columns), set(adp_columns)
+    plan = [
+        (f, uz_to_adp.get(f, ""), f in uzio_columns, uz_to_adp.get(f, "") in adp_columns)
+        for f in mapped_fields
+    ]
+    payload = json.dumps([AUDIT_CACHE_FORMAT, _source_digest(), plan], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def employee_fingerprints(all_keys, uzio_idx: pd.DataFrame, adp_idx: pd.DataFrame,
+                          uz_cols, adp_cols, emp_status, emp_paytype) -> pd.Series:
+    """One hash per employee of everything their comparison rows depend on, indexed by key."""
+    keys = pd.Index(all_keys, dtype=object)
+    inputs = pd.concat(
+        [
+            uzio_idx[list(uz_cols)].reindex(keys).set_axis([f"uz:{c}" for c in uz_cols], axis=1),
+            adp_idx[list(adp_cols)].reindex(keys).set_axis([f"adp:{c}" for c in adp_cols], axis=1),
+            pd.DataFrame({
+                "in_uzio": keys.isin(uzio_idx.index),
+                "in_adp": keys.isin(adp_idx.index),
+                "status": as_object_array(emp_status),
+                "pay_type": as_object_array(emp_paytype),
+            }, index=keys),
+        ],
+        axis=1,
+    )
+    return row_fingerprints(inputs)
+
+def _audit_cache_path(cache_dir: str, signature: str) -> str:
+    return os.path.join(cache_dir, f"census_audit_{signature[:24]}.parquet")
+
+def prune_audit_cache(cache_dir: str, keep: int = AUDIT_CACHE_KEEP,
+                      max_age_days: float = AUDIT_CACHE_MAX_AGE_DAYS):
+    """
+    Delete snapshots older than max_age_days or beyond the `keep` most recent, and
+    temporary files left by interrupted saves.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    snapshots, stale = [], []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.startswith("census_audit_"):
+            continue
         try:
-            return pd.to_datetime(s, errors="raise").date().isoformat()
-        except Exception:
-            return s
-    return str(x)
-
-def digits_only(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    return re.sub(r"\D", "", str(x))
-
-def norm_ssn_9digits(x):
-    # ONLY CHANGE: SSN compare as 9 digits (pad leading zeros if Excel dropped them)
-    d = digits_only(x)
-    if d == "":
-        return ""
-    if len(d) < 9:
-        return d.zfill(9)
-    if len(d) > 9:
-        return d[-9:]
-    return d
-
-def norm_zip_first5(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    if isinstance(x, (int, np.integer)):
-        s = str(int(x))
-    elif isinstance(x, (float, np.floating)) and float(x).is_integer():
-        s = str(int(x))
-    else:
-        s = re.sub(r"[^\d]", "", str(x).strip())
-    if s == "":
-        return ""
-    if 0 < len(s) < 5:
-        s = s.zfill(5)
-    return s[:5]
-
-NUMERIC_KEYWORDS = {"salary", "rate", "hours", "amount"}
-DATE_KEYWORDS = {"date", "dob", "birth", "doh", "hire"}
-SSN_KEYWORDS = {"ssn", "tax id"}
-ZIP_KEYWORDS = {"zip", "zipcode", "postal"}
-GENDER_KEYWORDS = {"gender"}
-PHONE_KEYWORDS = {"phone"}
-MIDDLE_INITIAL_KEYWORDS = {"middle initial"}  # ONLY CHANGE: treat as initial vs full middle name
-JOB_TITLE_KEYWORDS = {"job title", "position title"}
-VETERAN_KEYWORDS = {"veteran"}
-
-JOB_TITLE_MAPPINGS = {
-    "admin": "administrator",
-    "management": "manager",
-    "dsp owner": "owner"
-}
-
-def norm_gender(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    s = str(x).replace("\u00A0", " ")
-    s = re.sub(r"\s+", " ", s).strip().casefold()
-    if "female" in s or "woman" in s:
-        return "female"
-    if "male" in s or "man" in s:
-        return "male"
-    return s
-
-def norm_middle_initial(x):
-    # ONLY CHANGE: compare middle initial to the first letter of ADP middle name
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    s = str(x).strip()
-    m = re.search(r"[A-Za-z]", s)
-    return (m.group(0).casefold() if m else "")
-
-def norm_job_title(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    s = str(x).replace("\u00A0", " ")
-    s = re.sub(r"\s+", " ", s).strip().casefold()
-    return JOB_TITLE_MAPPINGS.get(s, s)
-
-def norm_veteran_status(x):
-    x = norm_blank(x)
-    if x == "":
-        return ""
-    s = str(x).replace("\u00A0", " ")
-    s = re.sub(r"\s+", " ", s).strip().casefold()
-    
-    # Normalize phrases
-    # "i am not a protected veteran" -> "not a protected veteran"
-    if "not a protected veteran" in s:
-        return "not a protected veteran"
-    
-    # "identify as a protected veteran", "protected veteran" (without 'not') -> "protected veteran"
-    if "protected veteran" in s and "not" not in s:
-        return "protected veteran"
-        
-    return s
-
-def norm_value(x, field_name: str):
-    f = norm_colname(field_name).lower()
-    x = norm_blank(x)
-    if x == "":
-        return ""
-
-    if any(k in f for k in MIDDLE_INITIAL_KEYWORDS):  # ONLY CHANGE
-        return norm_middle_initial(x)
-
-    if any(k in f for k in GENDER_KEYWORDS):
-        return norm_gender(x)
-
-    if any(k in f for k in VETERAN_KEYWORDS):
-        return norm_veteran_status(x)
-
-    if any(k in f for k in JOB_TITLE_KEYWORDS):
-        return norm_job_title(x)
-
-    if any(k in f for k in SSN_KEYWORDS):  # ONLY CHANGE: use 9-digit padded SSN
-        return norm_ssn_9digits(x)
-
-    if any(k in f for k in PHONE_KEYWORDS):
-        return digits_only(x)
-
-    if any(k in f for k in ZIP_KEYWORDS):
-        return norm_zip_first5(x)
-
-    if any(k in f for k in DATE_KEYWORDS):
-        return try_parse_date(x)
-
-    if any(k in f for k in NUMERIC_KEYWORDS):
-        if isinstance(x, (int, float, np.integer, np.floating)):
-            return float(x)
-        if isinstance(x, str):
-            s = x.strip().replace(",", "").replace("$", "")
-            try:
-                return float(s)
-            except Exception:
-                return re.sub(r"\s+", " ", x.strip()).casefold()
-
-    if isinstance(x, str):
-        return re.sub(r"\s+", " ", x.strip()).casefold()
-
-    return str(x).casefold()
-
-def norm_emp_key_series(s: pd.Series) -> pd.Series:
-    s2 = s.astype(object).where(~s.isna(), "")
-    def _fix(v):
-        v = str(v).strip()
-        v = v.replace("\u00A0", " ")
-        if re.fullmatch(r"\d+\.0+", v):
-            v = v.split(".")[0]
-        return v
-    return s2.map(_fix)
-
-# ---------- Rule helpers ----------
-def is_termination_reason_field(field_name: str) -> bool:
-    return "termination reason" in norm_colname(field_name).casefold()
-
-def is_employment_status_field(field_name: str) -> bool:
-    return "employment status" in norm_colname(field_name).casefold()
-
-def status_contains_any(s: str, needles) -> bool:
-    s = ("" if s is None else str(s)).casefold()
-    return any(n in s for n in needles)
-
-def uzio_is_active(uz_norm: str) -> bool:
-    s = ("" if uz_norm is None else str(uz_norm)).casefold()
-    return s == "active" or s.startswith("active")
-
-def uzio_is_terminated(uz_norm: str) -> bool:
-    s = ("" if uz_norm is None else str(uz_norm)).casefold()
-    return s == "terminated" or s.startswith("terminated")
-
-ALLOWED_TERM_REASONS = {
-    "quit without notice",
-    "no reason given",
-    "misconduct",
-    "abandoned job",
-    "advancement (better job with higher pay)",
-    "no-show (never started employment)",
-    "performance",
-    "personal",
-    "scheduling conflicts (schedules don't work)",
-    "attendance",
-}
-
-def normalize_reason_text(x) -> str:
-    s = norm_blank(x)
-    if s == "":
-        return ""
-    s = str(s).replace("\u00A0", " ")
-    s = s.replace("’", "'").replace("“", '"').replace("”", '"')
-    s = re.sub(r"\s+", " ", s).strip()
-    s = s.strip('"').strip("'")
-    return s.casefold()
-
-def normalize_paytype_text(x) -> str:
-    s = norm_blank(x)
-    if s == "":
-        return ""
-    s = str(s).replace("\u00A0", " ")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s.casefold()
-
-def paytype_bucket(paytype_norm: str) -> str:
-    s = ("" if paytype_norm is None else str(paytype_norm)).casefold()
-    if "hour" in s:
-        return "hourly"
-    if "salary" in s or "salaried" in s:
-        return "salaried"
-    return ""
-
-def is_annual_salary_field(field_name: str) -> bool:
-    return "annual salary" in norm_colname(field_name).casefold()
-
-def is_hourly_rate_field(field_name: str) -> bool:
-    f = norm_colname(field_name).casefold()
-    return ("hourly pay rate" in f) or ("hourly rate" in f)
-
-# ---------- Guardrail: prevent ACTIVE/TERMINATED/RETIRED values leaking into non-status fields ----------
-EMP_STATUS_TOKENS = {"active", "terminated", "retired"}
-
-def field_allows_emp_status_value(field_name: str) -> bool:
-    f = norm_colname(field_name).casefold()
-    return (f == "status") or ("employment status" in f)
-
-def cleanse_uzio_value_for_field(field_name: str, uz_val):
-    if norm_blank(uz_val) == "":
-        return uz_val
-    s = str(uz_val).strip().casefold()
-    if (s in EMP_STATUS_TOKENS) and (not field_allows_emp_status_value(field_name)):
-        return ""
-    return uz_val
-
-# ---------- Pay Type equivalence (UZIO Salaried == ADP Salary) ----------
-def is_pay_type_field(field_name: str) -> bool:
-    f = norm_colname(field_name).casefold()
-    return f == "pay type" or ("pay type" in f)
-
-def normalize_paytype_for_compare(x) -> str:
-    s = normalize_paytype_text(x)
-    if s in {"salary", "salaried"}:
-        return "salaried"
-    if s in {"hourly", "hour"}:
-        return "hourly"
-    return s
+            age = now - entry.stat().st_mtime
+        except OSError:
+            continue
+        if entry.name.endswith(".tmp"):
+            # another session may still be writing a recent one
+            if age > 3600:
+                stale.append(entry.path)
+        elif entry.name.endswith(".parquet"):
+            if age > max_age_days * 86400:
+                stale.append(entry.path)
+            else:
+                snapshots.append((age, entry.path))
+    stale += [path for _, path in sorted(snapshots)[keep:]]
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def load_audit_cache(cache_dir: str, signature: str):
+    """
+    (fingerprints, flat comparison detail) of the last run with this signature, or None.
+    A snapshot that cannot be read is ignored, so the run compares every employee.
+    """
+    prune_audit_cache(cache_dir)
+    path = _audit_cache_path(cache_dir, signature)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pq.read_table(path)
+        if audit_core.arrow_metadata(table).get("signature") != signature:
+            return None
+        snapshot = audit_core.frame_from_arrow(table)
+        if list(snapshot.columns) != DETAIL_COLUMNS + [_FINGERPRINT_COL]:
+            return None
+    except (OSError, ValueError, KeyError, TypeError, pa.ArrowException):
+        return None
+    first_rows = snapshot.drop_duplicates("Employee ID")
+    fingerprints = pd.Series(
+        first_rows[_FINGERPRINT_COL].to_numpy(dtype=np.uint64),
+        index=pd.Index(first_rows["Employee ID"], dtype=object),
+    )
+    return fingerprints, snapshot[DETAIL_COLUMNS]
+
+def save_audit_cache(cache_dir: str, signature: str, fingerprints: pd.Series, detail: pd.DataFrame):
+    """
+    Write the snapshot to a private temporary file, then publish it with one atomic rename.
+    Raises OSError, or ValueError for a cell the snapshot cannot store.
+    """
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    snapshot = detail.assign(**{
+        _FINGERPRINT_COL: fingerprints.reindex(detail["Employee ID"]).to_numpy(dtype=np.uint64)
+    })
+    table = audit_core.frame_to_arrow(snapshot, {"signature": signature})
+    tmp = tempfile.NamedTemporaryFile(dir=cache_dir, prefix="census_audit_", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            pq.write_table(table, tmp)
+        os.replace(tmp.name, _audit_cache_path(cache_dir, signature))
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    prune_audit_cache(cache_dir)
+
+def unchanged_employees(fingerprints: pd.Series, cached) -> set:
+    """Keys whose fingerprint equals the cached one (compared as uint64, no float round trip)."""
+    if cached is None:
+        return set()
+    cached_fp = cached[0]
+    common = fingerprints.index.intersection(cached_fp.index)
+    same = fingerprints.loc[common].to_numpy() == cached_fp.loc[common].to_numpy()
+    return set(common[same])
+
+def merge_cached_detail(fresh: pd.DataFrame, cached, reused_keys: set, all_keys) -> pd.DataFrame:
+    """Recompared rows plus the cached rows of unchanged employees, back in employee-major key order."""
+    if not reused_keys:
+        return fresh
+    cached_detail = cached[1]
+    reused = cached_detail[cached_detail["Employee ID"].isin(reused_keys)]
+    merged = pd.concat([fresh, reused], ignore_index=True)
+    order = pd.Index(all_keys, dtype=object).get_indexer(merged["Employee ID"])
+    return merged.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
 
 # ---------- Core compare ----------
-def run_comparison(file_bytes: bytes) -> bytes:
-    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
-
-    uzio = pd.read_excel(xls, sheet_name=UZIO_SHEET, dtype=object)
-    adp = pd.read_excel(xls, sheet_name=ADP_SHEET, dtype=object)
+def find_uzio_employment_status_col(columns):
+    for c in columns:
+        if norm_colname(c).casefold() == "employment status":
+            return c
+    for c in columns:
+        cc = norm_colname(c).casefold()
+        if "employment" in cc and "status" in cc:
+            return c
+    return None
+
+def read_mapping_sheet(xls: pd.ExcelFile):
+    """Valid Uzio -> ADP rows of the Mapping Sheet, plus the (Uzio, ADP) employee key columns."""
     mapping = pd.read_excel(xls, sheet_name=MAP_SHEET, dtype=object)
-
-    uzio.columns = [norm_colname(c) for c in uzio.columns]
-    adp.columns = [norm_colname(c) for c in adp.columns]
     mapping.columns = [norm_colname(c) for c in mapping.columns]
 
     if "Uzio Coloumn" not in mapping.columns or "ADP Coloumn" not in mapping.columns:
@@ -335,124 +300,80 @@ def run_comparison(file_bytes: bytes) -> bytes:
     if len(key_row) == 0:
         raise ValueError("Mapping sheet must include UZIO 'Employee ID' mapped to ADP key (usually 'Associate ID').")
 
-    UZIO_KEY = key_row.iloc[0]["Uzio Coloumn"]
-    ADP_KEY = key_row.iloc[0]["ADP Coloumn"]
-
-    if UZIO_KEY not in uzio.columns:
-        raise ValueError(f"UZIO key column '{UZIO_KEY}' not found in Uzio Data tab.")
-    if ADP_KEY not in adp.columns:
-        raise ValueError(f"ADP key column '{ADP_KEY}' not found in ADP Data tab.")
-
-    uzio[UZIO_KEY] = norm_emp_key_series(uzio[UZIO_KEY])
-    adp[ADP_KEY] = norm_emp_key_series(adp[ADP_KEY])
-
-    uzio[UZIO_KEY] = norm_emp_key_series(uzio[UZIO_KEY])
-    adp[ADP_KEY] = norm_emp_key_series(adp[ADP_KEY])
-
-    # NEW: Deduplicate ADP Data based on user logic
-    def deduplicate_adp(df: pd.DataFrame, key_col: str) -> pd.DataFrame:
-        # Identify special columns (normalized)
-        col_map = {c: c.lower() for c in df.columns}
-        
-        status_col = next((c for c, l in col_map.items() if "position status" in l), None)
-        term_date_col = next((c for c, l in col_map.items() if "termination date" in l), None)
-        start_date_col = next((c for c, l in col_map.items() if "position start date" in l), None)
-        loc_desc_col = next((c for c, l in col_map.items() if "work location description" in l), None)
-        license_id_col = next((c for c, l in col_map.items() if "license/certification id" in l), None)
-        
-        # If we can't find status col, fallback to basic drop_duplicates
-        if not status_col:
-            return df.drop_duplicates(subset=[key_col], keep="first")
-            
-        def pick_best(group):
-            if len(group) <= 1:
-                return group.iloc[[0]]
-            
-            # Helper to parse date for sorting
-            def get_date_val(row, col):
-                if not col or pd.isna(row[col]):
-                    return pd.Timestamp.min
-                val = str(row[col]).strip()
-                if not val:
-                    return pd.Timestamp.min
-                try:
-                    return pd.to_datetime(val)
-                except:
-                    return pd.Timestamp.min
-
-            if isinstance(group, pd.Series):
-                 return group.to_frame().T
-
-            group = group.copy()
-            group['__norm_status'] = group[status_col].astype(str).str.lower().str.strip()
-            
-            # Add license check
-            if license_id_col:
-                group['__has_license'] = group[license_id_col].apply(lambda x: 1 if norm_blank(x) != "" else 0)
-            else:
-                group['__has_license'] = 0
+    return mapping_valid, key_row.iloc[0]["Uzio Coloumn"], key_row.iloc[0]["ADP Coloumn"]
 
-            actives = group[group['__norm_status'] == 'active']
-            terms = group[group['__norm_status'] == 'terminated']
-            others = group[(group['__norm_status'] != 'active') & (group['__norm_status'] != 'terminated')]
-            
-            # Logic 1: If Actives exist, prioritize them
-            if not actives.empty:
-                # Rule: select row where Work Location Description is not blank
-                actives['__sort_date'] = actives.apply(lambda r: get_date_val(r, start_date_col), axis=1)
-
-                if loc_desc_col:
-                    actives['__has_loc'] = actives[loc_desc_col].apply(lambda x: 1 if norm_blank(x) != "" else 0)
-                    best_active = actives.sort_values(by=['__has_loc', '__has_license', '__sort_date'], ascending=[False, False, False]).iloc[[0]]
-                else:
-                    best_active = actives.sort_values(by=['__has_license', '__sort_date'], ascending=[False, False]).iloc[[0]]
-                
-                return best_active
-
-            # Logic 2: Terminated
-            if not terms.empty:
-                # Rule: If term dates are different, select latest.
-                # Rule: If one blank and one value -> select latest Position Start Date
-                
-                # Check for blank term dates
-                terms['__sort_date'] = pd.Timestamp.min
-                
-                # Determine which date to sort by mainly
-                use_start_date = False
-                if term_date_col:
-                    terms['__term_dt_val'] = terms[term_date_col].apply(norm_blank)
-                    has_blank = (terms['__term_dt_val'] == "").any()
-                    has_val = (terms['__term_dt_val'] != "").any()
-                    
-                    if has_blank and has_val:
-                        use_start_date = True
-                else:
-                    use_start_date = True
-
-                if use_start_date:
-                     terms['__sort_date'] = terms.apply(lambda r: get_date_val(r, start_date_col), axis=1)
-                elif term_date_col:
-                     terms['__sort_date'] = terms.apply(lambda r: get_date_val(r, term_date_col), axis=1)
-                
-                # Add License priority to Terminated as well (implicitly safe)
-                return terms.sort_values(by=['__has_license', '__sort_date'], ascending=[False, False]).iloc[[0]]
-
-            # Fallback (Others, e.g. Leave)
-            if not others.empty:
-                 others['__sort_date'] = others.apply(lambda r: get_date_val(r, start_date_col), axis=1)
-                 return others.sort_values(by=['__has_license', '__sort_date'], ascending=[False, False]).iloc[[0]]
-
-            return group.iloc[[0]]
-
-        # Apply grouping
-        deduped = df.groupby(key_col, group_keys=False).apply(pick_best)
-        
-        # Cleanup temp columns if they leaked (apply usually returns pure subset but safe to drop)
-        cols_to_drop = [c for c in ['__norm_status', '__has_loc', '__sort_date', '__term_dt_val', '__has_license'] if c in deduped.columns]
-        if cols_to_drop:
-            deduped = deduped.drop(columns=cols_to_drop)
-            
-        return deduped
+def preflight_workbook(xls: pd.ExcelFile):
+    """
+    Validate tabs, the Mapping Sheet and both key columns from header rows only,
+    so a malformed upload fails before the data tabs are parsed.
+    """
+    require_sheets(xls, UZIO_SHEET, ADP_SHEET, MAP_SHEET)
+    mapping_valid, uzio_key, adp_key = read_mapping_sheet(xls)
+
+    if uzio_key not in [norm_colname(c) for c in read_header(xls, UZIO_SHEET)]:
+        raise ValueError(f"UZIO key column '{uzio_key}' not found in Uzio Data tab.")
+    if adp_key not in [norm_colname(c) for c in read_header(xls, ADP_SHEET)]:
+        raise ValueError(f"ADP key column '{adp_key}' not found in ADP Data tab.")
+    return mapping_valid, uzio_key, adp_key
+
+def list_mapped_fields(file_bytes: bytes) -> list:
+    """Uzio fields the audit would compare (key excluded), read from the Mapping Sheet only."""
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
+    mapping_valid, uzio_key, _ = read_mapping_sheet(xls)
+    return [f for f in mapping_valid["Uzio Coloumn"].tolist() if f != uzio_key]
+
+def run_comparison(
+    file_bytes: bytes,
+    engine: str = "columnar",
+    layout: str = "flat",
+    fields=None,
+    employee_ids=None,
+    parquet: bool = False,
+    cache_dir: str = None,
+    statuses=None,
+    workers: int = 1,
+):
+    """
+    fields / employee_ids restrict a re-run to those mapped Uzio fields and/or
+    employee IDs; rows and fields outside the selection are dropped up front.
+    cache_dir (one client's directory, see client_cache_dir) enables incremental
+    re-audits: employees unchanged since the last run cached there reuse their rows,
+    and unfiltered runs refresh the cache.
+    statuses (e.g. ACTIVE_STATUSES) keeps only employees whose Uzio Employment Status
+    or ADP status contains one of them; the excluded counts go to the Summary.
+    workers > 1 runs the columnar comparison in that many processes, one hash
+    shard of employees each; the report is identical to a single-process run.
+    Workers are started fresh, so a calling script needs the usual
+    `if __name__ == "__main__":` guard.
+    Returns the xlsx bytes, or (xlsx bytes, Parquet bytes of the full comparison
+    detail) when parquet=True.
+    """
+    if engine not in COMPARISON_ENGINES:
+        raise ValueError(f"Unknown comparison engine '{engine}'. Expected one of: {', '.join(COMPARISON_ENGINES)}")
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"Unknown report layout '{layout}'. Expected one of: {', '.join(OUTPUT_LAYOUTS)}")
+    if workers < 1 or (workers > 1 and engine != "columnar"):
+        raise ValueError("workers must be 1, or more than 1 with the columnar engine.")
+
+
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
+    mapping_valid, UZIO_KEY, ADP_KEY = preflight_workbook(xls)
+    all_mapped_fields = [f for f in mapping_valid["Uzio Coloumn"].tolist() if f != UZIO_KEY]
+    mapped_fields = select_fields(all_mapped_fields, fields)
+
+    uzio = pd.read_excel(xls, sheet_name=UZIO_SHEET, dtype=object)
+    adp = pd.read_excel(xls, sheet_name=ADP_SHEET, dtype=object)
+
+    uzio.columns = [norm_colname(c) for c in uzio.columns]
+    adp.columns = [norm_colname(c) for c in adp.columns]
+
+    uzio[UZIO_KEY] = norm_key_series(uzio[UZIO_KEY])
+    adp[ADP_KEY] = norm_key_series(adp[ADP_KEY])
+
+    requested_ids = normalize_employee_ids(employee_ids)
+    if requested_ids:
+        uzio = uzio[uzio[UZIO_KEY].isin(requested_ids)]
+        adp = adp[adp[ADP_KEY].isin(requested_ids)]
 
     # Apply the new deduplication
     adp = deduplicate_adp(adp, ADP_KEY)
@@ -461,30 +382,43 @@ def run_comparison(file_bytes: bytes) -> bytes:
     uzio = uzio.drop_duplicates(subset=[UZIO_KEY], keep="first").copy()
     # adp = adp.drop_duplicates(subset=[ADP_KEY], keep="first").copy() # Replaced by above
 
-    uzio_keys = set(uzio[UZIO_KEY].dropna().astype(str).str.strip()) - {""}
-    adp_keys = set(adp[ADP_KEY].dropna().astype(str).str.strip()) - {""}
+    # Status filter (e.g. active only): drop employees before any comparison work
+    status_filter = normalize_status_filter(statuses)
+    status_excluded = pd.Series(dtype=object)
+    if status_filter:
+        uz_status_col = find_uzio_employment_status_col(uzio.columns)
+        adp_status_col = next(
+            (a for u, a in zip(mapping_valid["Uzio Coloumn"], mapping_valid["ADP Coloumn"])
+             if is_employment_status_field(u) and a in adp.columns),
+            None,
+        )
+        if uz_status_col is None and adp_status_col is None:
+            raise ValueError("Status filter needs an Employment Status column in Uzio Data or a mapped ADP status column.")
+        sides = []
+        if uz_status_col is not None:
+            sides.append(pd.Series(uzio[uz_status_col].to_numpy(), index=uzio[UZIO_KEY].to_numpy()))
+        if adp_status_col is not None:
+            sides.append(pd.Series(adp[adp_status_col].to_numpy(), index=adp[ADP_KEY].to_numpy()))
+        status_excluded = status_excluded_employees(sides, status_filter)
+        uzio = uzio[~uzio[UZIO_KEY].isin(status_excluded.index)]
+        adp = adp[~adp[ADP_KEY].isin(status_excluded.index)]
+
+    uzio_keys = set(uzio[UZIO_KEY]) - {""}
+    adp_keys = set(adp[ADP_KEY]) - {""}
     all_keys = sorted(uzio_keys.union(adp_keys))
 
     uzio_idx = uzio.set_index(UZIO_KEY, drop=False)
     adp_idx = adp.set_index(ADP_KEY, drop=False)
 
     uz_to_adp = dict(zip(mapping_valid["Uzio Coloumn"], mapping_valid["ADP Coloumn"]))
-    mapped_fields = [f for f in mapping_valid["Uzio Coloumn"].tolist() if f != UZIO_KEY]
+    normalizer_plan = build_normalizer_plan(mapped_fields)
 
-    mapping_missing_adp_col = mapping_valid[~mapping_valid["ADP Coloumn"].isin(adp.columns)].copy()
+    mapping_missing_adp_col = mapping_valid[
+        mapping_valid["Uzio Coloumn"].isin(mapped_fields) & ~mapping_valid["ADP Coloumn"].isin(adp.columns)
+    ].copy()
 
     # Employment Status column (UZIO)
-    uzio_employment_status_col = None
-    for c in uzio.columns:
-        if norm_colname(c).casefold() == "employment status":
-            uzio_employment_status_col = c
-            break
-    if uzio_employment_status_col is None:
-        for c in uzio.columns:
-            cc = norm_colname(c).casefold()
-            if "employment" in cc and "status" in cc:
-                uzio_employment_status_col = c
-                break
+    uzio_employment_status_col = find_uzio_employment_status_col(uzio.columns)
 
     def get_uzio_employment_status(emp_id: str) -> str:
         if uzio_employment_status_col is None:
@@ -511,96 +445,127 @@ def run_comparison(file_bytes: bytes) -> bytes:
         return ""
 
     # ---------- Build FULL comparison ----------
-    rows = []
-    for emp_id in all_keys:
-        uz_exists = emp_id in uzio_idx.index
-        adp_exists = emp_id in adp_idx.index
-
-        uz_emp_status = get_uzio_employment_status(emp_id)
-        emp_paytype = get_employee_pay_type(emp_id, adp_exists=adp_exists, uz_exists=uz_exists)
-        emp_pay_bucket = paytype_bucket(normalize_paytype_text(emp_paytype))
+    # Per-employee context, shared by the columnar engine and the Employees sheet
+    employee_status, employee_paytype, employee_pay_bucket = employee_context_columns(
+        all_keys, uzio_idx, adp_idx, uzio_employment_status_col, UZIO_PAYTYPE_COL, ADP_PAYTYPE_COL
+    )
 
-        for field in mapped_fields:
-            adp_col = uz_to_adp.get(field, "")
+    # Incremental re-audit: only employees whose inputs changed since the cached run are compared
+    compare_pos = np.arange(len(all_keys))
+    reused_keys = set()
+    if cache_dir is not None:
+        uz_cols = [f for f in mapped_fields if f in uzio_idx.columns]
+        adp_cols = [c for c in dict.fromkeys(uz_to_adp.get(f, "") for f in mapped_fields) if c in adp_idx.columns]
+        cache_signature = audit_cache_signature(mapped_fields, uz_to_adp, uzio.columns, adp.columns)
+        fingerprints = employee_fingerprints(
+            all_keys, uzio_idx, adp_idx, uz_cols, adp_cols, employee_status, employee_paytype
+        )
+        cached = load_audit_cache(cache_dir, cache_signature)
+        reused_keys = unchanged_employees(fingerprints, cached)
+        compare_pos = np.flatnonzero(~pd.Index(all_keys, dtype=object).isin(list(reused_keys)))
+    compare_keys = [all_keys[i] for i in compare_pos]
+
+    if engine == "row":
+        rows = []
+        for emp_id in compare_keys:
+            uz_exists = emp_id in uzio_idx.index
+            adp_exists = emp_id in adp_idx.index
+
+            uz_emp_status = get_uzio_employment_status(emp_id)
+            emp_paytype = get_employee_pay_type(emp_id, adp_exists=adp_exists, uz_exists=uz_exists)
+            emp_pay_bucket = paytype_bucket(normalize_paytype_text(emp_paytype))
+
+            for field in mapped_fields:
+                adp_col = uz_to_adp.get(field, "")
             
-            # Check if columns exist in the usage data
-            uz_col_missing = (field not in uzio.columns)
-            adp_col_missing = (adp_col not in adp.columns)
-
-            uz_val_raw = uzio_idx.at[emp_id, field] if (uz_exists and not uz_col_missing) else ""
-            uz_val = cleanse_uzio_value_for_field(field, uz_val_raw)
-
-            adp_val = adp_idx.at[emp_id, adp_col] if (adp_exists and not adp_col_missing) else ""
-
-            if not adp_exists and uz_exists:
-                status = "Employee ID Not Found in ADP"
-            elif adp_exists and not uz_exists:
-                status = "Employee ID Not Found in Uzio"
-            elif adp_exists and uz_exists and adp_col_missing:
-                status = "Column Missing in ADP Sheet"
-            elif adp_exists and uz_exists and uz_col_missing:
-                status = "Column Missing in Uzio Sheet"
-            else:
-                if is_pay_type_field(field):
-                    uz_pt = normalize_paytype_for_compare(uz_val)
-                    adp_pt = normalize_paytype_for_compare(adp_val)
-
-                    if (uz_pt == adp_pt) or (uz_pt == "" and adp_pt == ""):
-                        status = "Data Match"
-                    elif uz_pt == "" and adp_pt != "":
-                        status = "Value missing in Uzio (ADP has value)"
-                    elif uz_pt != "" and adp_pt == "":
-                        status = "Value missing in ADP (Uzio has value)"
-                    else:
-                        status = "Data Mismatch"
+                # Check if columns exist in the usage data
+                uz_col_missing = (field not in uzio.columns)
+                adp_col_missing = (adp_col not in adp.columns)
+
+                uz_val_raw = uzio_idx.at[emp_id, field] if (uz_exists and not uz_col_missing) else ""
+                uz_val = cleanse_uzio_value_for_field(field, uz_val_raw)
+
+                adp_val = adp_idx.at[emp_id, adp_col] if (adp_exists and not adp_col_missing) else ""
+
+                if not adp_exists and uz_exists:
+                    status = "Employee ID Not Found in ADP"
+                elif adp_exists and not uz_exists:
+                    status = "Employee ID Not Found in Uzio"
+                elif adp_exists and uz_exists and adp_col_missing:
+                    status = "Column Missing in ADP Sheet"
+                elif adp_exists and uz_exists and uz_col_missing:
+                    status = "Column Missing in Uzio Sheet"
                 else:
-                    uz_n = norm_value(uz_val, field)
-                    adp_n = norm_value(adp_val, field)
+                    if is_pay_type_field(field):
+                        uz_pt = normalize_paytype_for_compare(uz_val)
+                        adp_pt = normalize_paytype_for_compare(adp_val)
 
-                    if is_employment_status_field(field) and adp_n != "":
-                        adp_is_term_or_ret = status_contains_any(adp_n, ["terminated", "retired"])
-                        
-                        # Special Case: UZIO Active == ADP Leave -> Match
-                        is_active_leave = (uzio_is_active(uz_n) and "leave" in adp_n)
-                        
-                        # Special Case: UZIO Terminated == ADP Deceased -> Match
-                        is_term_deceased = (uzio_is_terminated(uz_n) and "deceased" in adp_n)
-
-                        if is_active_leave or is_term_deceased:
+                        if (uz_pt == adp_pt) or (uz_pt == "" and adp_pt == ""):
                             status = "Data Match"
-                        elif (uz_n == adp_n) or (uz_n == "" and adp_n == ""):
-                             status = "Data Match"
-                        elif uzio_is_terminated(uz_n) and adp_is_term_or_ret:
-                             # Both terminated/retired but strings diff -> Match
-                             status = "Data Match"
+                        elif uz_pt == "" and adp_pt != "":
+                            status = "Value missing in Uzio (ADP has value)"
+                        elif uz_pt != "" and adp_pt == "":
+                            status = "Value missing in ADP (Uzio has value)"
                         else:
-                            # MISMATCH / MISSING LOGIC per User Request
-                            # 1. Active in Uzio
-                            if uzio_is_active(uz_n):
-                                status = "Active in Uzio"
-                            # 2. Terminated in Uzio
-                            elif uzio_is_terminated(uz_n):
-                                status = "Terminated in Uzio"
-                            # 3. Active in ADP (Uzio Blank)
-                            elif uz_n == "" and not adp_is_term_or_ret:
-                                status = "Active in ADP"
-                            # 4. Terminated in ADP (Uzio Blank)
-                            elif uz_n == "" and adp_is_term_or_ret:
-                                status = "Terminated in ADP"
-                            # Fallback for other cases
-                            elif uz_n == "" and adp_n != "":
-                                status = f"Value missing in Uzio (ADP: {adp_val})"  # Generic fallback
-                            elif uz_n != "" and adp_n == "":
-                                status = "Value missing in ADP (Uzio has value)"
-                            else:
-                                status = "Data Mismatch"
+                            status = "Data Mismatch"
+                    else:
+                        normalize = normalizer_plan[field]
+                        uz_n = normalize(uz_val)
+                        adp_n = normalize(adp_val)
 
-                    elif is_termination_reason_field(field):
-                        uz_reason = normalize_reason_text(uz_val)
-                        adp_reason = normalize_reason_text(adp_val)
+                        if is_employment_status_field(field) and adp_n != "":
+                            adp_is_term_or_ret = status_contains_any(adp_n, ["terminated", "retired"])
+                        
+                            # Special Case: UZIO Active == ADP Leave -> Match
+                            is_active_leave = (uzio_is_active(uz_n) and "leave" in adp_n)
+                        
+                            # Special Case: UZIO Terminated == ADP Deceased -> Match
+                            is_term_deceased = (uzio_is_terminated(uz_n) and "deceased" in adp_n)
 
-                        if uz_reason == "other" and adp_reason in ALLOWED_TERM_REASONS:
-                            status = "Data Match"
+                            if is_active_leave or is_term_deceased:
+                                status = "Data Match"
+                            elif (uz_n == adp_n) or (uz_n == "" and adp_n == ""):
+                                 status = "Data Match"
+                            elif uzio_is_terminated(uz_n) and adp_is_term_or_ret:
+                                 # Both terminated/retired but strings diff -> Match
+                                 status = "Data Match"
+                            else:
+                                # MISMATCH / MISSING LOGIC per User Request
+                                # 1. Active in Uzio
+                                if uzio_is_active(uz_n):
+                                    status = "Active in Uzio"
+                                # 2. Terminated in Uzio
+                                elif uzio_is_terminated(uz_n):
+                                    status = "Terminated in Uzio"
+                                # 3. Active in ADP (Uzio Blank)
+                                elif uz_n == "" and not adp_is_term_or_ret:
+                                    status = "Active in ADP"
+                                # 4. Terminated in ADP (Uzio Blank)
+                                elif uz_n == "" and adp_is_term_or_ret:
+                                    status = "Terminated in ADP"
+                                # Fallback for other cases
+                                elif uz_n == "" and adp_n != "":
+                                    status = f"Value missing in Uzio (ADP: {adp_val})"  # Generic fallback
+                                elif uz_n != "" and adp_n == "":
+                                    status = "Value missing in ADP (Uzio has value)"
+                                else:
+                                    status = "Data Mismatch"
+
+                        elif is_termination_reason_field(field):
+                            uz_reason = normalize_reason_text(uz_val)
+                            adp_reason = normalize_reason_text(adp_val)
+
+                            if uz_reason == "other" and adp_reason in ALLOWED_TERM_REASONS:
+                                status = "Data Match"
+                            else:
+                                if (uz_n == adp_n) or (uz_n == "" and adp_n == ""):
+                                    status = "Data Match"
+                                elif uz_n == "" and adp_n != "":
+                                    status = "Value missing in Uzio (ADP has value)"
+                                elif uz_n != "" and adp_n == "":
+                                    status = "Value missing in ADP (Uzio has value)"
+                                else:
+                                    status = "Data Mismatch"
                         else:
                             if (uz_n == adp_n) or (uz_n == "" and adp_n == ""):
                                 status = "Data Match"
@@ -610,38 +575,45 @@ def run_comparison(file_bytes: bytes) -> bytes:
                                 status = "Value missing in ADP (Uzio has value)"
                             else:
                                 status = "Data Mismatch"
-                    else:
-                        if (uz_n == adp_n) or (uz_n == "" and adp_n == ""):
-                            status = "Data Match"
-                        elif uz_n == "" and adp_n != "":
-                            status = "Value missing in Uzio (ADP has value)"
-                        elif uz_n != "" and adp_n == "":
-                            status = "Value missing in ADP (Uzio has value)"
-                        else:
-                            status = "Data Mismatch"
-
-                        if status == "Value missing in Uzio (ADP has value)":
-                            if emp_pay_bucket == "hourly" and is_annual_salary_field(field):
-                                status = "Data Match"
-                            elif emp_pay_bucket == "salaried" and is_hourly_rate_field(field):
-                                status = "Data Match"
-
-            rows.append({
-                "Employee ID": emp_id,
-                "Employment Status": uz_emp_status,
-                "Pay Type": emp_paytype,
-                "Field": field,
-                "UZIO_Value": uz_val,
-                "ADP_Value": adp_val,
-                "ADP_SourceOfTruth_Status": status
-            })
-
-    comparison_detail = pd.DataFrame(rows)[[
-        "Employee ID", "Employment Status", "Pay Type",
-        "Field", "UZIO_Value", "ADP_Value", "ADP_SourceOfTruth_Status"
-    ]]
 
-    mismatches_only = comparison_detail[comparison_detail["ADP_SourceOfTruth_Status"] != "Data Match"].copy()
+                            if status == "Value missing in Uzio (ADP has value)":
+                                if emp_pay_bucket == "hourly" and is_annual_salary_field(field):
+                                    status = "Data Match"
+                                elif emp_pay_bucket == "salaried" and is_hourly_rate_field(field):
+                                    status = "Data Match"
+
+                rows.append({
+                    "Employee ID": emp_id,
+                    "Employment Status": uz_emp_status,
+                    "Pay Type": emp_paytype,
+                    "Field": field,
+                    "UZIO_Value": uz_val,
+                    "ADP_Value": adp_val,
+                    "ADP_SourceOfTruth_Status": status
+                })
+        comparison_detail = encode_detail(pd.DataFrame(rows, columns=DETAIL_COLUMNS))
+    else:
+        comparison_detail = build_comparison_detail_columnar(
+            compare_keys, uzio_idx, adp_idx, mapped_fields, uz_to_adp,
+            employee_status[compare_pos],
+            employee_paytype[compare_pos],
+            employee_pay_bucket[compare_pos],
+            normalizer_plan,
+            # the cache keeps full rows, so the star projection happens after the merge
+            employee_context=(layout == "flat" or cache_dir is not None),
+            workers=workers,
+        )
+
+    if cache_dir is not None:
+        comparison_detail = encode_detail(merge_cached_detail(comparison_detail, cached, reused_keys, all_keys))
+        if not requested_ids and not status_filter:
+            try:
+                save_audit_cache(cache_dir, cache_signature, fingerprints, comparison_detail)
+            except (OSError, ValueError, pa.ArrowException):
+                # The snapshot only speeds up the next run; the report stands without it
+                pass
+    if layout == "star" and list(comparison_detail.columns) != STAR_DETAIL_COLUMNS:
+        comparison_detail = comparison_detail[STAR_DETAIL_COLUMNS]
 
     # ---------- Field Summary By Status ----------
     cols_needed = [
@@ -655,13 +627,7 @@ def run_comparison(file_bytes: bytes) -> bytes:
         "Column Missing in Uzio Sheet",
     ]
 
-    pivot = comparison_detail.pivot_table(
-        index="Field",
-        columns="ADP_SourceOfTruth_Status",
-        values="Employee ID",
-        aggfunc="count",
-        fill_value=0
-    )
+    pivot = count_by_field_and_status(comparison_detail, "Field", "ADP_SourceOfTruth_Status")
 
     for c in cols_needed:
         if c not in pivot.columns:
@@ -691,6 +657,12 @@ def run_comparison(file_bytes: bytes) -> bytes:
     #     errors="ignore"
     # )
 
+    # ---------- Employee Summary (one row per employee) ----------
+    employee_summary = build_employee_summary(
+        comparison_detail, "Employee ID", "ADP_SourceOfTruth_Status", cols_needed + EMPLOYMENT_STATUS_OUTCOMES,
+        context_cols=[c for c in EMPLOYEE_COLUMNS[1:] if c in comparison_detail.columns],
+    )
+
     # ---------- Summary metrics ----------
     summary = pd.DataFrame({
         "Metric": [
@@ -713,32 +685,134 @@ def run_comparison(file_bytes: bytes) -> bytes:
             len(mapped_fields),
             mapping_missing_adp_col.shape[0],
             comparison_detail.shape[0],
-            mismatches_only.shape[0]
+            comparison_detail.shape[0] - int(pivot["Data Match"].sum())
         ]
     })
 
+    scope = audit_scope_metrics(mapped_fields, len(all_mapped_fields), requested_ids, uzio_keys | adp_keys)
+    if not scope.empty:
+        summary = pd.concat([summary, scope], ignore_index=True)
+
+    status_rows = status_filter_metrics(status_filter, status_excluded)
+    if not status_rows.empty:
+        summary = pd.concat([summary, status_rows], ignore_index=True)
+
+    if cache_dir is not None:
+        incremental = pd.DataFrame({
+            "Metric": ["Employees re-compared this run", "Employees reused from the audit cache (unchanged)"],
+            "Value": [len(compare_keys), len(reused_keys)],
+        })
+        summary = pd.concat([summary, incremental], ignore_index=True)
+
+    detail_sheets = shard_sheet_names("Comparison_Detail_AllFields", len(comparison_detail))
+    sharding = shard_metrics(detail_sheets)
+    if not sharding.empty:
+        summary = pd.concat([summary, sharding], ignore_index=True)
+
     # ---------- Export report ----------
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine="openpyxl") as writer:
         summary.to_excel(writer, sheet_name="Summary", index=False)
         field_summary_by_status.to_excel(writer, sheet_name="Field_Summary_By_Status", index=False)
-        comparison_detail.to_excel(writer, sheet_name="Comparison_Detail_AllFields", index=False)
+        employee_summary.to_excel(writer, sheet_name="Employee_Summary", index=False)
+        write_sheet_sharded(writer, comparison_detail, "Comparison_Detail_AllFields")
+        if layout == "star":
+            employees = pd.DataFrame(
+                {"Employee ID": all_keys, "Employment Status": employee_status, "Pay Type": employee_paytype},
+                columns=EMPLOYEE_COLUMNS,
+            )
+            employees.to_excel(writer, sheet_name="Employees", index=False)
+            add_excel_table(writer.sheets["Employees"], employees, "Employees")
+            for i, sheet in enumerate(detail_sheets):
+                shard = comparison_detail.iloc[i * EXCEL_MAX_DATA_ROWS:(i + 1) * EXCEL_MAX_DATA_ROWS]
+                add_excel_table(writer.sheets[sheet], shard, sheet.replace("_AllFields", ""))
         # Do NOT write Mapping_ADP_Col_Missing and Mismatches_Only
 
+    if parquet:
+        return out.getvalue(), detail_parquet_bytes(comparison_detail)
     return out.getvalue()
 
 # ---------- Minimal UI ----------
+STATUS_FILTER_CHOICES = ["All employees", "Active only (Active / Leave)", "Custom statuses"]
+
 def render_ui():
     st.title(APP_TITLE)
     st.write("Upload the Excel workbook (.xlsx). The tool will generate the audit report and provide a download button.")
 
     uploaded_file = st.file_uploader("Upload Excel workbook", type=["xlsx"])
+    star_layout = st.checkbox(
+        "List Employment Status / Pay Type once per employee (separate 'Employees' sheet)",
+        help="Keeps Comparison_Detail_AllFields to Employee ID, Field, values and status. "
+             "Both sheets are Excel tables, so they can be related on Employee ID.",
+    )
+    want_parquet = st.checkbox(
+        "Also provide the full comparison detail as a Parquet file",
+        help="One file with every comparison row, for pandas / BI tools. "
+             "Useful for very large clients, where the Excel detail is split across several sheets.",
+    )
+    status_choice = st.radio("Employees to audit", STATUS_FILTER_CHOICES, horizontal=True)
+    statuses = None
+    if status_choice == STATUS_FILTER_CHOICES[1]:
+        statuses = ACTIVE_STATUSES
+    elif status_choice == STATUS_FILTER_CHOICES[2]:
+        statuses = st.text_input(
+            "Statuses to audit (comma separated; matches statuses containing these words)",
+            placeholder="Active, Leave",
+        ).split(",")
+    workers = st.number_input(
+        "Worker processes",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=1,
+        help="Compares employees in parallel on this many CPU cores. Helps very large clients; "
+             "small files run fastest with 1.",
+    )
+    cache_root = audit_cache_root()
+    incremental = st.checkbox(
+        "Incremental re-audit (reuse results for employees unchanged since the last run)",
+        disabled=cache_root is None,
+        help="Each run keeps a snapshot of the client's comparison, including employee data, in the "
+             "server's private audit cache. Re-runs of the same client with the same mapping then only "
+             "compare employees whose data changed. Snapshots are deleted after "
+             f"{AUDIT_CACHE_MAX_AGE_DAYS} days."
+             if cache_root is not None else
+             f"Not available: the server has no audit cache directory ({AUDIT_CACHE_ENV}) configured.",
+    )
+    client_name = ""
+    if incremental:
+        client_name = st.text_input(
+            "Client name (snapshots are kept per client)",
+            placeholder="Client name as on the workbook",
+        )
+    selected_fields, selected_ids = [], []
+    if uploaded_file is not None:
+        with st.expander("Re-audit only some fields / employees (optional)"):
+            try:
+                field_options = list_mapped_fields(uploaded_file.getvalue())
+            except Exception as e:
+                field_options = []
+                st.warning(f"Could not read the Mapping Sheet: {e}")
+            selected_fields = st.multiselect("Fields (leave empty for all mapped fields)", field_options)
+            selected_ids = parse_employee_ids(st.text_area(
+                "Employee IDs (leave empty for all employees)",
+                placeholder="One per line, or separated by commas",
+            ))
     run_btn = st.button("Run Audit", type="primary", disabled=(uploaded_file is None))
 
     if run_btn:
         try:
             with st.spinner("Running audit..."):
-                report_bytes = run_comparison(uploaded_file.getvalue())
+                result = run_comparison(
+                    uploaded_file.getvalue(),
+                    layout="star" if star_layout else "flat",
+                    fields=selected_fields,
+                    employee_ids=selected_ids,
+                    parquet=want_parquet,
+                    cache_dir=client_cache_dir(cache_root, client_name) if incremental else None,
+                    statuses=statuses,
+                    workers=int(workers),
+                )
+            report_bytes, parquet_bytes = result if want_parquet else (result, None)
 
             st.success("Report generated.")
             
@@ -752,6 +826,13 @@ def render_ui():
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 type="primary",
             )
+            if parquet_bytes is not None:
+                st.download_button(
+                    label="Download Comparison Detail (.parquet)",
+                    data=parquet_bytes,
+                    file_name=f"Client_Name_ADP_Census_Data_Audit_Detail_{today_str}.parquet",
+                    mime="application/vnd.apache.parquet",
+                )
         except Exception as e:
             st.error(f"Failed: {e}")
 
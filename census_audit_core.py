@@ -0,0 +1,724 @@
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date
+from functools import lru_cache, wraps
+
+import numpy as np
+import pandas as pd
+
+from audit_core import as_object_array, distinct_positions, normalize_distinct, parse_sort_dates
+
+# =========================================================
+# Census comparison rules and engines (ADP / Uzio), without Streamlit, so worker
+# processes of the process-parallel engine can import them by name.
+# =========================================================
+
+# ---------- Helpers ----------
+def norm_colname(c: str) -> str:
+    if c is None:
+        return ""
+    c = str(c).replace("\n", " ").replace("\r", " ")
+    c = c.replace("\u00A0", " ")
+    c = re.sub(r"\s+", " ", c).strip()
+    c = c.replace("*", "")
+    c = c.strip('"').strip("'")
+    return c
+
+def norm_blank(x):
+    if x is None:
+        return ""
+    if isinstance(x, float) and np.isnan(x):
+        return ""
+    if isinstance(x, str) and x.strip().lower() in {"", "nan", "none", "null"}:
+        return ""
+    return x
+
+# Numbers in date columns are Excel serial dates when they fall in this window (1910-01-01 .. 2099-12-31);
+# anything outside it (flags, codes) is compared as text like before.
+EXCEL_EPOCH = "1899-12-30"
+EXCEL_SERIAL_MIN = 3653
+EXCEL_SERIAL_MAX = 73050
+
+def is_excel_serial(x) -> bool:
+    if isinstance(x, (bool, np.bool_)) or not isinstance(x, (int, float, np.integer, np.floating)):
+        return False
+    return EXCEL_SERIAL_MIN <= x <= EXCEL_SERIAL_MAX
+
+def excel_serial_to_iso(x) -> str:
+    return (pd.Timestamp(EXCEL_EPOCH) + pd.to_timedelta(float(x), unit="D")).date().isoformat()
+
+def try_parse_date(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    if isinstance(x, (datetime, date, np.datetime64, pd.Timestamp)):
+        return pd.to_datetime(x).date().isoformat()
+    if isinstance(x, str):
+        s = x.strip()
+        try:
+            return pd.to_datetime(s, errors="raise").date().isoformat()
+        except Exception:
+            return s
+    if is_excel_serial(x):
+        return excel_serial_to_iso(x)
+    return str(x)
+
+def digits_only(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    return re.sub(r"\D", "", str(x))
+
+def norm_ssn_9digits(x):
+    # ONLY CHANGE: SSN compare as 9 digits (pad leading zeros if Excel dropped them)
+    d = digits_only(x)
+    if d == "":
+        return ""
+    if len(d) < 9:
+        return d.zfill(9)
+    if len(d) > 9:
+        return d[-9:]
+    return d
+
+def norm_zip_first5(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    if isinstance(x, (int, np.integer)):
+        s = str(int(x))
+    elif isinstance(x, (float, np.floating)) and float(x).is_integer():
+        s = str(int(x))
+    else:
+        s = re.sub(r"[^\d]", "", str(x).strip())
+    if s == "":
+        return ""
+    if 0 < len(s) < 5:
+        s = s.zfill(5)
+    return s[:5]
+
+NUMERIC_KEYWORDS = {"salary", "rate", "hours", "amount"}
+DATE_KEYWORDS = {"date", "dob", "birth", "doh", "hire"}
+SSN_KEYWORDS = {"ssn", "tax id"}
+ZIP_KEYWORDS = {"zip", "zipcode", "postal"}
+GENDER_KEYWORDS = {"gender"}
+PHONE_KEYWORDS = {"phone"}
+MIDDLE_INITIAL_KEYWORDS = {"middle initial"}  # ONLY CHANGE: treat as initial vs full middle name
+JOB_TITLE_KEYWORDS = {"job title", "position title"}
+VETERAN_KEYWORDS = {"veteran"}
+
+JOB_TITLE_MAPPINGS = {
+    "admin": "administrator",
+    "management": "manager",
+    "dsp owner": "owner"
+}
+
+def norm_gender(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    s = str(x).replace("\u00A0", " ")
+    s = re.sub(r"\s+", " ", s).strip().casefold()
+    if "female" in s or "woman" in s:
+        return "female"
+    if "male" in s or "man" in s:
+        return "male"
+    return s
+
+def norm_middle_initial(x):
+    # ONLY CHANGE: compare middle initial to the first letter of ADP middle name
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    s = str(x).strip()
+    m = re.search(r"[A-Za-z]", s)
+    return (m.group(0).casefold() if m else "")
+
+def norm_job_title(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    s = str(x).replace("\u00A0", " ")
+    s = re.sub(r"\s+", " ", s).strip().casefold()
+    return JOB_TITLE_MAPPINGS.get(s, s)
+
+def norm_veteran_status(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    s = str(x).replace("\u00A0", " ")
+    s = re.sub(r"\s+", " ", s).strip().casefold()
+    
+    # Normalize phrases
+    # "i am not a protected veteran" -> "not a protected veteran"
+    if "not a protected veteran" in s:
+        return "not a protected veteran"
+    
+    # "identify as a protected veteran", "protected veteran" (without 'not') -> "protected veteran"
+    if "protected veteran" in s and "not" not in s:
+        return "protected veteran"
+        
+    return s
+
+def norm_numeric_value(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    if isinstance(x, (int, float, np.integer, np.floating)):
+        return float(x)
+    if isinstance(x, str):
+        s = x.strip().replace(",", "").replace("$", "")
+        try:
+            return float(s)
+        except Exception:
+            return re.sub(r"\s+", " ", x.strip()).casefold()
+    return str(x).casefold()
+
+def norm_text_value(x):
+    x = norm_blank(x)
+    if x == "":
+        return ""
+    if isinstance(x, str):
+        return re.sub(r"\s+", " ", x.strip()).casefold()
+    return str(x).casefold()
+
+# First matching keyword set wins (order matters: "middle initial" before anything else).
+NORMALIZER_RULES = [
+    (MIDDLE_INITIAL_KEYWORDS, norm_middle_initial),  # ONLY CHANGE
+    (GENDER_KEYWORDS, norm_gender),
+    (VETERAN_KEYWORDS, norm_veteran_status),
+    (JOB_TITLE_KEYWORDS, norm_job_title),
+    (SSN_KEYWORDS, norm_ssn_9digits),  # ONLY CHANGE: use 9-digit padded SSN
+    (PHONE_KEYWORDS, digits_only),
+    (ZIP_KEYWORDS, norm_zip_first5),
+    (DATE_KEYWORDS, try_parse_date),
+    (NUMERIC_KEYWORDS, norm_numeric_value),
+]
+
+def resolve_normalizer(field_name: str):
+    f = norm_colname(field_name).lower()
+    for keywords, normalizer in NORMALIZER_RULES:
+        if any(k in f for k in keywords):
+            return normalizer
+    return norm_text_value
+
+# Census columns are low-cardinality, so each field keeps a small cache of normalized values.
+NORMALIZE_CACHE_SIZE = 4096
+
+def memoize_normalizer(normalize):
+    # typed=True keeps 1, 1.0 and True apart: they normalize differently (e.g. "1" vs "1.0")
+    cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE, typed=True)(normalize)
+    @wraps(normalize)
+    def _normalize(x):
+        try:
+            return cached(x)
+        except TypeError:  # unhashable cell value
+            return normalize(x)
+    return _normalize
+
+def build_normalizer_plan(fields) -> dict:
+    """Resolve each mapped field to its normalizer once; classification does not depend on the employee."""
+    return {f: memoize_normalizer(resolve_normalizer(f)) for f in fields}
+
+def norm_value(x, field_name: str):
+    return resolve_normalizer(field_name)(x)
+
+# ---------- Rule helpers ----------
+def is_termination_reason_field(field_name: str) -> bool:
+    return "termination reason" in norm_colname(field_name).casefold()
+
+def is_employment_status_field(field_name: str) -> bool:
+    return "employment status" in norm_colname(field_name).casefold()
+
+def status_contains_any(s: str, needles) -> bool:
+    s = ("" if s is None else str(s)).casefold()
+    return any(n in s for n in needles)
+
+def uzio_is_active(uz_norm: str) -> bool:
+    s = ("" if uz_norm is None else str(uz_norm)).casefold()
+    return s == "active" or s.startswith("active")
+
+def uzio_is_terminated(uz_norm: str) -> bool:
+    s = ("" if uz_norm is None else str(uz_norm)).casefold()
+    return s == "terminated" or s.startswith("terminated")
+
+ALLOWED_TERM_REASONS = {
+    "quit without notice",
+    "no reason given",
+    "misconduct",
+    "abandoned job",
+    "advancement (better job with higher pay)",
+    "no-show (never started employment)",
+    "performance",
+    "personal",
+    "scheduling conflicts (schedules don't work)",
+    "attendance",
+}
+
+def normalize_reason_text(x) -> str:
+    s = norm_blank(x)
+    if s == "":
+        return ""
+    s = str(s).replace("\u00A0", " ")
+    s = s.replace("’", "'").replace("“", '"').replace("”", '"')
+    s = re.sub(r"\s+", " ", s).strip()
+    s = s.strip('"').strip("'")
+    return s.casefold()
+
+def normalize_paytype_text(x) -> str:
+    s = norm_blank(x)
+    if s == "":
+        return ""
+    s = str(s).replace("\u00A0", " ")
+    s = re.sub(r"\s+", " ", s).strip()
+    return s.casefold()
+
+def paytype_bucket(paytype_norm: str) -> str:
+    s = ("" if paytype_norm is None else str(paytype_norm)).casefold()
+    if "hour" in s:
+        return "hourly"
+    if "salary" in s or "salaried" in s:
+        return "salaried"
+    return ""
+
+def is_annual_salary_field(field_name: str) -> bool:
+    return "annual salary" in norm_colname(field_name).casefold()
+
+def is_hourly_rate_field(field_name: str) -> bool:
+    f = norm_colname(field_name).casefold()
+    return ("hourly pay rate" in f) or ("hourly rate" in f)
+
+# ---------- Guardrail: prevent ACTIVE/TERMINATED/RETIRED values leaking into non-status fields ----------
+EMP_STATUS_TOKENS = {"active", "terminated", "retired"}
+
+def field_allows_emp_status_value(field_name: str) -> bool:
+    f = norm_colname(field_name).casefold()
+    return (f == "status") or ("employment status" in f)
+
+def cleanse_uzio_value_for_field(field_name: str, uz_val):
+    if norm_blank(uz_val) == "":
+        return uz_val
+    s = str(uz_val).strip().casefold()
+    if (s in EMP_STATUS_TOKENS) and (not field_allows_emp_status_value(field_name)):
+        return ""
+    return uz_val
+
+# ---------- Pay Type equivalence (UZIO Salaried == ADP Salary) ----------
+def is_pay_type_field(field_name: str) -> bool:
+    f = norm_colname(field_name).casefold()
+    return f == "pay type" or ("pay type" in f)
+
+def normalize_paytype_for_compare(x) -> str:
+    s = normalize_paytype_text(x)
+    if s in {"salary", "salaried"}:
+        return "salaried"
+    if s in {"hourly", "hour"}:
+        return "hourly"
+    return s
+
+# ---------- ADP duplicate resolution ----------
+def deduplicate_adp(df: pd.DataFrame, key_col: str) -> pd.DataFrame:
+    """
+    Keep one ADP row per associate (position-history exports repeat the associate):
+      1. Active rows first: prefer Work Location Description, then License/Certification ID,
+         then latest Position Start Date
+      2. Else Terminated rows: prefer License/Certification ID, then latest Termination Date
+         (latest Position Start Date when termination dates are partly blank)
+      3. Else any other status (e.g. Leave): License/Certification ID, then latest Position Start Date
+    Ties keep the earliest row. Associates with a single row are passed through untouched.
+    """
+    col_map = {c: c.lower() for c in df.columns}
+
+    status_col = next((c for c, l in col_map.items() if "position status" in l), None)
+    term_date_col = next((c for c, l in col_map.items() if "termination date" in l), None)
+    start_date_col = next((c for c, l in col_map.items() if "position start date" in l), None)
+    loc_desc_col = next((c for c, l in col_map.items() if "work location description" in l), None)
+    license_id_col = next((c for c, l in col_map.items() if "license/certification id" in l), None)
+
+    # If we can't find status col, fallback to basic drop_duplicates
+    if not status_col:
+        return df.drop_duplicates(subset=[key_col], keep="first")
+
+    dup_mask = df[key_col].duplicated(keep=False)
+    if not dup_mask.any():
+        return df
+
+    dups = df[dup_mask]
+    keys = dups[key_col]
+    norm_status = dups[status_col].astype(str).str.lower().str.strip()
+    is_active = norm_status == "active"
+    is_term = norm_status == "terminated"
+
+    def has_value(col):
+        if not col:
+            return pd.Series(0, index=dups.index)
+        return (dups[col].map(norm_blank) != "").astype(int)
+
+    start_dates = parse_sort_dates(dups[start_date_col]) if start_date_col else pd.Series(pd.Timestamp.min, index=dups.index)
+    sort_date = start_dates.copy()
+    if term_date_col and is_term.any():
+        # Terminated: latest termination date, unless the associate's terminated rows mix blank and filled dates
+        term_blank = dups[term_date_col].map(norm_blank) == ""
+        mixed = (
+            term_blank[is_term].groupby(keys[is_term]).transform("any")
+            & (~term_blank)[is_term].groupby(keys[is_term]).transform("any")
+        )
+        term_dates = parse_sort_dates(dups.loc[is_term, term_date_col])
+        sort_date[is_term] = term_dates.where(~mixed, start_dates[is_term])
+
+    ranked = pd.DataFrame({
+        "key": keys,
+        "tier": np.select([is_active, is_term], [0, 1], default=2),
+        "has_loc": has_value(loc_desc_col).where(is_active, 0),
+        "has_license": has_value(license_id_col),
+        "sort_date": sort_date,
+    }, index=dups.index)
+    ranked = ranked.sort_values(
+        ["key", "tier", "has_loc", "has_license", "sort_date"],
+        ascending=[True, True, False, False, False],
+        kind="stable",
+    )
+    best_idx = ranked.index[~ranked["key"].duplicated(keep="first")]
+
+    return df[~dup_mask | df.index.isin(best_idx)]
+
+# ---------- Columnar engine ----------
+# Same status rules as the per-cell loop in census_audit_app.run_comparison, evaluated
+# one mapped field (a whole column of employees) at a time on frames aligned to the
+# employee key.
+COMPARISON_ENGINES = ("columnar", "row")
+
+DETAIL_COLUMNS = [
+    "Employee ID", "Employment Status", "Pay Type",
+    "Field", "UZIO_Value", "ADP_Value", "ADP_SourceOfTruth_Status"
+]
+
+# "star" layout: employee context is written once to an Employees sheet and the
+# detail sheet keeps only the key, field, values and status.
+OUTPUT_LAYOUTS = ("flat", "star")
+EMPLOYEE_COLUMNS = ["Employee ID", "Employment Status", "Pay Type"]
+STAR_DETAIL_COLUMNS = [c for c in DETAIL_COLUMNS if c not in EMPLOYEE_COLUMNS[1:]]
+
+# Employment Status mismatch outcomes (order matches the conditions in compare_field_columnar)
+EMPLOYMENT_STATUS_OUTCOMES = ["Active in Uzio", "Terminated in Uzio", "Active in ADP", "Terminated in ADP"]
+
+# Field and status repeat on every row, so the detail keeps them as categoricals
+# (small integer codes + one label table); summaries count the codes directly.
+CATEGORICAL_DETAIL_COLUMNS = ["Field", "ADP_SourceOfTruth_Status"]
+
+def encode_detail(detail: pd.DataFrame) -> pd.DataFrame:
+    for c in CATEGORICAL_DETAIL_COLUMNS:
+        if not isinstance(detail[c].dtype, pd.CategoricalDtype):
+            detail[c] = detail[c].astype("category")
+    return detail
+
+def normalize_date_column(values) -> np.ndarray:
+    """
+    Column version of try_parse_date. Native datetimes skip parsing, Excel serial numbers are
+    converted arithmetically and the distinct strings go through a single to_datetime call.
+    """
+    values = np.asarray(values, dtype=object)
+    if len(values) == 0:
+        return values.copy()
+    first_pos, inverse = distinct_positions(values)
+    uniques = values[first_pos]
+    out = np.empty(len(uniques), dtype=object)
+
+    serial_pos, serials, str_pos, strs = [], [], [], []
+    for i, v in enumerate(uniques):
+        x = norm_blank(v)
+        if isinstance(x, str):
+            if x == "":
+                out[i] = ""
+            else:
+                str_pos.append(i)
+                strs.append(x.strip())
+        elif isinstance(x, datetime):
+            out[i] = x.date().isoformat()
+        elif isinstance(x, (date, np.datetime64)):
+            out[i] = pd.to_datetime(x).date().isoformat()
+        elif is_excel_serial(x):
+            serial_pos.append(i)
+            serials.append(float(x))
+        else:
+            out[i] = str(x)
+
+    if serials:
+        days = pd.to_datetime(np.asarray(serials), unit="D", origin=pd.Timestamp(EXCEL_EPOCH))
+        out[serial_pos] = [d.date().isoformat() for d in days]
+
+    if strs:
+        # format="mixed" infers the format per string exactly like the scalar parse, minus the per-call overhead
+        try:
+            parsed = pd.to_datetime(pd.Series(strs, dtype=object), format="mixed", errors="coerce")
+        except (ValueError, TypeError):
+            parsed = None
+        if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed):
+            out[str_pos] = [try_parse_date(s) for s in strs]
+        else:
+            out[str_pos] = [
+                try_parse_date(s) if pd.isna(d) else d.date().isoformat()
+                for s, d in zip(strs, parsed)
+            ]
+
+    return out[inverse]
+
+# Batch implementations for scalar normalizers that have a faster whole-column form
+COLUMN_NORMALIZERS = {
+    try_parse_date: normalize_date_column,
+}
+
+def normalize_column(values, normalize) -> np.ndarray:
+    batch = COLUMN_NORMALIZERS.get(getattr(normalize, "__wrapped__", normalize))
+    if batch is not None:
+        return batch(values)
+    return normalize_distinct(values, normalize)
+
+def _missing_value_ladder(uz_n: np.ndarray, adp_n: np.ndarray) -> np.ndarray:
+    uz_blank = uz_n == ""
+    adp_blank = adp_n == ""
+    status = np.select(
+        [(uz_n == adp_n) | (uz_blank & adp_blank), uz_blank & ~adp_blank, ~uz_blank & adp_blank],
+        ["Data Match", "Value missing in Uzio (ADP has value)", "Value missing in ADP (Uzio has value)"],
+        default="Data Mismatch",
+    )
+    return status.astype(object)
+
+def compare_field_columnar(
+    field: str,
+    uz_vals: np.ndarray,
+    adp_vals: np.ndarray,
+    pay_bucket: np.ndarray,
+    normalize=None,
+) -> np.ndarray:
+    """Status for one mapped field, for employees present in both sheets with both columns present."""
+    if normalize is None:
+        normalize = resolve_normalizer(field)
+    if is_pay_type_field(field):
+        uz_pt = normalize_distinct(uz_vals, normalize_paytype_for_compare)
+        adp_pt = normalize_distinct(adp_vals, normalize_paytype_for_compare)
+        return _missing_value_ladder(uz_pt, adp_pt)
+
+    uz_n = normalize_column(uz_vals, normalize)
+    adp_n = normalize_column(adp_vals, normalize)
+    status = _missing_value_ladder(uz_n, adp_n)
+
+    if is_termination_reason_field(field):
+        uz_other = normalize_distinct(uz_vals, normalize_reason_text) == "other"
+        adp_allowed = pd.Series(normalize_distinct(adp_vals, normalize_reason_text)).isin(ALLOWED_TERM_REASONS).to_numpy()
+        status[uz_other & adp_allowed] = "Data Match"
+    else:
+        missing_in_uzio = status == "Value missing in Uzio (ADP has value)"
+        if is_annual_salary_field(field):
+            status[missing_in_uzio & (pay_bucket == "hourly")] = "Data Match"
+        if is_hourly_rate_field(field):
+            status[missing_in_uzio & (pay_bucket == "salaried")] = "Data Match"
+
+    if is_employment_status_field(field):
+        # Employment Status rules only apply where ADP has a value; blank ADP rows keep the ladder above.
+        emp = adp_n != ""
+        if emp.any():
+            u = uz_n[emp]
+            a = adp_n[emp]
+            uz_active = np.array([uzio_is_active(v) for v in u], dtype=bool)
+            uz_term = np.array([uzio_is_terminated(v) for v in u], dtype=bool)
+            uz_blank = u == ""
+            adp_term_or_ret = np.array([status_contains_any(v, ["terminated", "retired"]) for v in a], dtype=bool)
+            adp_leave = np.array(["leave" in str(v) for v in a], dtype=bool)
+            adp_deceased = np.array(["deceased" in str(v) for v in a], dtype=bool)
+
+            # UZIO blank is fully covered by the Active/Terminated in ADP buckets, so the
+            # row engine's "Value missing" fallbacks can never be reached here.
+            status[emp] = np.select(
+                [
+                    (uz_active & adp_leave) | (uz_term & adp_deceased),
+                    u == a,
+                    uz_term & adp_term_or_ret,
+                    uz_active,
+                    uz_term,
+                    uz_blank & ~adp_term_or_ret,
+                    uz_blank & adp_term_or_ret,
+                ],
+                ["Data Match", "Data Match", "Data Match"] + EMPLOYMENT_STATUS_OUTCOMES,
+                default="Data Mismatch",
+            ).astype(object)
+
+    return status
+
+def _context_text(idx: pd.DataFrame, col, keys: pd.Index) -> np.ndarray:
+    """str(cell) for each key, "" where the employee, the column or the value is missing."""
+    if col is None or col not in idx.columns:
+        return np.full(len(keys), "", dtype=object)
+    values = idx[col].reindex(keys).to_numpy(dtype=object)
+    return normalize_distinct(values, lambda v: "" if norm_blank(v) == "" else str(v))
+
+def employee_context_columns(all_keys, uzio_idx: pd.DataFrame, adp_idx: pd.DataFrame,
+                             uzio_status_col, uzio_paytype_col, adp_paytype_col):
+    """
+    Per-employee context as arrays aligned to all_keys, computed once per distinct value:
+    Employment Status (UZIO), Pay Type (ADP, falling back to UZIO) and its hourly /
+    salaried bucket. Column form of get_uzio_employment_status / get_employee_pay_type.
+    """
+    keys = pd.Index(all_keys, dtype=object)
+    status = _context_text(uzio_idx, uzio_status_col, keys)
+    adp_paytype = _context_text(adp_idx, adp_paytype_col, keys)
+    paytype = np.where(adp_paytype != "", adp_paytype, _context_text(uzio_idx, uzio_paytype_col, keys)).astype(object)
+    bucket = normalize_distinct(paytype, lambda pt: paytype_bucket(normalize_paytype_text(pt)))
+    return status, paytype, bucket
+
+def _compare_field_block(mapped_fields, uz_to_adp: dict, uz_cols: dict, adp_cols: dict,
+                         uz_exists: np.ndarray, adp_exists: np.ndarray, pay_bucket: np.ndarray,
+                         normalizer_plan: dict):
+    """
+    UZIO values and statuses of every employee x mapped field, as (n_emp, n_fields)
+    object arrays. uz_cols / adp_cols map column name -> values aligned to the employees.
+    """
+    n_emp, n_fields = len(uz_exists), len(mapped_fields)
+    both = uz_exists & adp_exists
+    uz_out = np.empty((n_emp, n_fields), dtype=object)
+    status_out = np.empty((n_emp, n_fields), dtype=object)
+
+    for j, field in enumerate(mapped_fields):
+        adp_col = uz_to_adp.get(field, "")
+        uz_col_missing = field not in uz_cols
+        adp_col_missing = adp_col not in adp_cols
+
+        uz_vals = np.full(n_emp, "", dtype=object)
+        if not uz_col_missing:
+            raw = uz_cols[field]
+            uz_vals[uz_exists] = normalize_distinct(raw[uz_exists], lambda v: cleanse_uzio_value_for_field(field, v))
+
+        adp_vals = np.full(n_emp, "", dtype=object)
+        if not adp_col_missing:
+            adp_vals[adp_exists] = adp_cols[adp_col][adp_exists]
+
+        status = np.empty(n_emp, dtype=object)
+        status[uz_exists & ~adp_exists] = "Employee ID Not Found in ADP"
+        status[adp_exists & ~uz_exists] = "Employee ID Not Found in Uzio"
+        if adp_col_missing:
+            status[both] = "Column Missing in ADP Sheet"
+        elif uz_col_missing:
+            status[both] = "Column Missing in Uzio Sheet"
+        elif both.any():
+            status[both] = compare_field_columnar(
+                field, uz_vals[both], adp_vals[both], pay_bucket[both], normalize=normalizer_plan[field]
+            )
+
+        uz_out[:, j] = uz_vals
+        status_out[:, j] = status
+
+    return uz_out, status_out
+
+def _adp_value_block(mapped_fields, uz_to_adp: dict, adp_cols: dict, adp_exists: np.ndarray) -> np.ndarray:
+    """ADP values as shown in the detail: the raw cell, "" where the employee or column is missing."""
+    out = np.full((len(adp_exists), len(mapped_fields)), "", dtype=object)
+    for j, field in enumerate(mapped_fields):
+        col = adp_cols.get(uz_to_adp.get(field, ""))
+        if col is not None:
+            out[adp_exists, j] = col[adp_exists]
+    return out
+
+# ---------- Process-parallel columnar engine ----------
+# Employees are hash-partitioned on their key into one shard per worker process. Each
+# task carries only its shard's slice of the aligned input columns (plain numpy arrays,
+# pickled by the pool), so concurrent runs share no state. Workers are started with
+# "forkserver" (or "spawn"), never by forking the multithreaded Streamlit process, whose
+# held locks a forked child would inherit; this module has no Streamlit code, so the
+# workers import it by name. Workers return UZIO values plus status codes, and the
+# parent writes them back at the shard positions, so the result matches the
+# single-process engine row for row.
+def shard_positions(keys, n_shards: int) -> list:
+    """Row positions of each shard (stable hash of the employee key), ascending within a shard."""
+    shard_of = pd.util.hash_array(np.asarray(keys, dtype=object)) % np.uint64(n_shards)
+    return [np.flatnonzero(shard_of == s) for s in range(n_shards)]
+
+def _shard_task(positions: np.ndarray, inputs: tuple) -> tuple:
+    mapped_fields, uz_to_adp, uz_cols, adp_cols, uz_exists, adp_exists, pay_bucket = inputs
+    return (
+        mapped_fields,
+        uz_to_adp,
+        {c: v[positions] for c, v in uz_cols.items()},
+        {c: v[positions] for c, v in adp_cols.items()},
+        uz_exists[positions],
+        adp_exists[positions],
+        pay_bucket[positions],
+    )
+
+def _compare_shard(task):
+    """Worker: (UZIO values, status codes, status labels) for one shard."""
+    uz_out, status_out = _compare_field_block(*task, build_normalizer_plan(task[0]))
+    codes, labels = pd.factorize(status_out.ravel())
+    return uz_out, codes.astype(np.int32), list(labels)
+
+def compare_in_processes(inputs: tuple, keys, workers: int):
+    """_compare_field_block over hash shards of the employees in a ProcessPoolExecutor."""
+    shards = [pos for pos in shard_positions(keys, workers) if len(pos)]
+    tasks = [_shard_task(pos, inputs) for pos in shards]
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context(start_method)) as pool:
+        results = list(pool.map(_compare_shard, tasks))
+
+    n_emp, n_fields = len(keys), len(inputs[0])
+    uz_out = np.empty((n_emp, n_fields), dtype=object)
+    codes = np.empty((n_emp, n_fields), dtype=np.int32)
+    labels = {}
+    for pos, (shard_uz, shard_codes, shard_labels) in zip(shards, results):
+        to_global = np.array([labels.setdefault(label, len(labels)) for label in shard_labels], dtype=np.int32)
+        uz_out[pos] = shard_uz
+        codes[pos] = to_global[shard_codes].reshape(len(pos), n_fields)
+    return uz_out, pd.Categorical.from_codes(codes.ravel(), categories=list(labels))
+
+def build_comparison_detail_columnar(
+    all_keys,
+    uzio_idx: pd.DataFrame,
+    adp_idx: pd.DataFrame,
+    mapped_fields,
+    uz_to_adp: dict,
+    emp_status,
+    emp_paytype,
+    emp_pay_bucket,
+    normalizer_plan: dict = None,
+    employee_context: bool = True,
+    workers: int = 1,
+) -> pd.DataFrame:
+    if normalizer_plan is None:
+        normalizer_plan = build_normalizer_plan(mapped_fields)
+    keys = pd.Index(all_keys, dtype=object)
+    n_emp, n_fields = len(keys), len(mapped_fields)
+
+    uz_exists = keys.isin(uzio_idx.index)
+    adp_exists = keys.isin(adp_idx.index)
+    pay_bucket = as_object_array(emp_pay_bucket)
+
+    # Only the mapped columns, aligned to the employee keys
+    uz_names = [f for f in dict.fromkeys(mapped_fields) if f in uzio_idx.columns]
+    adp_names = [c for c in dict.fromkeys(uz_to_adp.get(f, "") for f in mapped_fields) if c in adp_idx.columns]
+    uz_aligned = uzio_idx[uz_names].reindex(keys)
+    adp_aligned = adp_idx[adp_names].reindex(keys)
+    uz_cols = {c: uz_aligned[c].to_numpy(dtype=object) for c in uz_names}
+    adp_cols = {c: adp_aligned[c].to_numpy(dtype=object) for c in adp_names}
+
+    if workers > 1 and n_emp >= workers:
+        inputs = (list(mapped_fields), uz_to_adp, uz_cols, adp_cols, uz_exists, adp_exists, pay_bucket)
+        uz_out, status = compare_in_processes(inputs, keys, workers)
+    else:
+        uz_out, status_out = _compare_field_block(
+            mapped_fields, uz_to_adp, uz_cols, adp_cols, uz_exists, adp_exists, pay_bucket, normalizer_plan
+        )
+        status = pd.Categorical(status_out.ravel())
+    adp_out = _adp_value_block(mapped_fields, uz_to_adp, adp_cols, adp_exists)
+
+    # Employee-major order (every field of the first employee, then the next), as in the row engine
+    detail = {
+        "Employee ID": np.repeat(keys.to_numpy(dtype=object), n_fields),
+        "Field": pd.Categorical.from_codes(np.tile(np.arange(n_fields), n_emp), categories=list(mapped_fields)),
+        "UZIO_Value": uz_out.ravel(),
+        "ADP_Value": adp_out.ravel(),
+        "ADP_SourceOfTruth_Status": status,
+    }
+    if not employee_context:
+        return pd.DataFrame(detail, columns=STAR_DETAIL_COLUMNS)
+    detail["Employment Status"] = np.repeat(as_object_array(emp_status), n_fields)
+    detail["Pay Type"] = np.repeat(as_object_array(emp_paytype), n_fields)
+    return pd.DataFrame(detail, columns=DETAIL_COLUMNS)
+
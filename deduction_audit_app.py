@@ -4,6 +4,16 @@ import io
 import re
 from datetime import datetime
 
+from audit_core import (
+    composite_key_codes,
+    deduction_status,
+    money_display,
+    money_values_match,
+    norm_key_series,
+    parse_money_column,
+    read_header,
+)
+
 # =========================================================
 # ADP to Uzio Deduction Audit Tool
 # INPUT: One Excel File with 3 Tabs:
@@ -17,18 +27,14 @@ def norm_col(c):
     if c is None: return ""
     return str(c).strip().replace("\n", " ").strip()
 
-def clean_money_val(x):
-    """Parse money/percentage strings to float. Returns original string if not a number."""
-    if pd.isna(x) or x == "":
-        return 0.0
-    s = str(x).strip()
-    s_clean = s.replace("$", "").replace("%", "").replace(",", "")
-    s_clean = s_clean.replace("(", "-").replace(")", "") # Handle accounting negative
-    try:
-        return float(s_clean)
-    except:
-        # If it's not a number (like an SSN), return the string itself for comparison
-        return s
+def text_column(s):
+    """str(value).strip() for every cell of a column (NaN becomes "nan", as per row)."""
+    return s.astype(object).map(str).str.strip()
+
+def lookup_mapping(labels, mapping):
+    """Mapped Uzio name per label: exact key first, then the lowercased key. NaN when unmapped."""
+    exact = labels.map(mapping)
+    return exact.where(exact.notna(), labels.str.lower().map(mapping))
 
 def run_audit(file_bytes):
     # Load Workbook
@@ -55,25 +61,64 @@ def run_audit(file_bytes):
         if not map_sheet: missing.append("Mapping Sheet")
         return None, f"Missing Tabs: {', '.join(missing)}", []
 
-    # 2. Read Data
+    # 2. Preflight: validate required columns from header rows before parsing the data
+    error = preflight_columns(
+        [norm_col(c) for c in read_header(xls, uzio_sheet)],
+        [norm_col(c) for c in read_header(xls, adp_sheet)],
+        [norm_col(c) for c in read_header(xls, map_sheet)],
+    )
+    if error:
+        return None, error, []
+
+    # 3. Read Data
     df_uzio = pd.read_excel(xls, sheet_name=uzio_sheet)
     df_adp = pd.read_excel(xls, sheet_name=adp_sheet)
     df_map = pd.read_excel(xls, sheet_name=map_sheet)
 
     return _run_deduction_audit(df_uzio, df_adp, df_map)
 
+# ---------- Required columns ----------
+def _find_map_columns(cols):
+    map_adp_col = next((c for c in cols if "adp" in c.lower()), None)
+    map_uzio_col = next((c for c in cols if "uzio" in c.lower()), None)
+    return map_adp_col, map_uzio_col
+
+def _find_adp_columns(cols):
+    adp_id_col = next((c for c in cols if "associate" in c.lower() and "id" in c.lower()), None)
+    adp_code_col = next((c for c in cols if "deduction" in c.lower() and "code" in c.lower()), None)
+    adp_amt_col = next((c for c in cols if "amount" in c.lower() or "rate" in c.lower()), None)
+    adp_desc_col = next((c for c in cols if "deduction" in c.lower() and "description" in c.lower()), None)
+    adp_pct_col = next((c for c in cols if "deduction" in c.lower() and "%" in c.lower()), None)
+    return adp_id_col, adp_code_col, adp_amt_col, adp_desc_col, adp_pct_col
+
+def _find_uzio_columns(cols):
+    uz_id_col = next((c for c in cols if "employee" in c.lower() and "id" in c.lower()), None)
+    uz_ded_col = next((c for c in cols if "deduction" in c.lower() and "name" in c.lower()), None)
+    uz_amt_col = next((c for c in cols if "amount" in c.lower() or "percent" in c.lower()), None)
+    return uz_id_col, uz_ded_col, uz_amt_col
+
+def preflight_columns(uzio_cols, adp_cols, map_cols):
+    """Error message for the first missing required column (header names only), else None."""
+    if not all(_find_map_columns(map_cols)):
+        return "Mapping Sheet must have columns identifying 'ADP' and 'Uzio' deductions."
+    if not all(_find_adp_columns(adp_cols)[:3]):
+        return f"ADP Sheet missing required columns (Associate ID, Deduction Code, Deduction Amount). Found: {list(adp_cols)}"
+    if not all(_find_uzio_columns(uzio_cols)):
+        return f"Uzio Sheet missing required columns (Employee ID, Deduction Name, Amount/Percentage). Found: {list(uzio_cols)}"
+    return None
+
 def _run_deduction_audit(df_uzio, df_adp, df_map):
     # Normalize Columns
     df_uzio.columns = [norm_col(c) for c in df_uzio.columns]
     df_adp.columns = [norm_col(c) for c in df_adp.columns]
     df_map.columns = [norm_col(c) for c in df_map.columns]
 
+    error = preflight_columns(df_uzio.columns, df_adp.columns, df_map.columns)
+    if error:
+        return None, error, []
+
     # Process Mapping
-    map_adp_col = next((c for c in df_map.columns if "adp" in c.lower()), None)
-    map_uzio_col = next((c for c in df_map.columns if "uzio" in c.lower()), None)
-    
-    if not map_adp_col or not map_uzio_col:
-        return None, "Mapping Sheet must have columns identifying 'ADP' and 'Uzio' deductions.", []
+    map_adp_col, map_uzio_col = _find_map_columns(df_map.columns)
 
     mapping = {}
     for _, row in df_map.iterrows():
@@ -84,77 +129,62 @@ def _run_deduction_audit(df_uzio, df_adp, df_map):
             mapping[k.lower()] = v
 
     # Required Cols
-    adp_id_col = next((c for c in df_adp.columns if "associate" in c.lower() and "id" in c.lower()), None)
-    adp_code_col = next((c for c in df_adp.columns if "deduction" in c.lower() and "code" in c.lower()), None)
-    adp_amt_col = next((c for c in df_adp.columns if "amount" in c.lower() or "rate" in c.lower()), None)
-    adp_desc_col = next((c for c in df_adp.columns if "deduction" in c.lower() and "description" in c.lower()), None)
-    adp_pct_col = next((c for c in df_adp.columns if "deduction" in c.lower() and "%" in c.lower()), None)
-
-    if not all([adp_id_col, adp_code_col, adp_amt_col]):
-        return None, f"ADP Sheet missing required columns (Associate ID, Deduction Code, Deduction Amount). Found: {list(df_adp.columns)}", []
-
-    adp_records = []
-    for _, row in df_adp.iterrows():
-        emp_id = str(row[adp_id_col]).strip()
-        raw_code = str(row[adp_code_col]).strip()
-        raw_desc = str(row[adp_desc_col]).strip() if adp_desc_col else ""
-        
-        deduction_name = None
-        if raw_desc:
-            deduction_name = mapping.get(raw_desc, mapping.get(raw_desc.lower()))
-        if not deduction_name and raw_code:
-            deduction_name = mapping.get(raw_code, mapping.get(raw_code.lower()))
-            
-        if not deduction_name:
-            continue
-        
-        amt = clean_money_val(row[adp_amt_col])
-        if amt == 0.0 and adp_pct_col:
-            pct_val = clean_money_val(row[adp_pct_col])
-            if pct_val != 0.0:
-                amt = pct_val
-        
-        adp_records.append({
-            "Employee_ID": emp_id,
-            "Deduction_Name": deduction_name,
-            "ADP_Raw_Code": raw_code,
-            "ADP_Description": raw_desc,
-            "ADP_Amount": amt,
-            "Key": f"{emp_id}|{deduction_name}".lower()
-        })
-    
-    df_adp_clean = pd.DataFrame(adp_records)
-    if not df_adp_clean.empty:
-        df_adp_clean = df_adp_clean.groupby(["Employee_ID", "Deduction_Name", "ADP_Raw_Code", "ADP_Description", "Key"], as_index=False)["ADP_Amount"].sum()
-    else:
-        df_adp_clean = pd.DataFrame(columns=["Employee_ID", "Deduction_Name", "ADP_Raw_Code", "ADP_Description", "Key", "ADP_Amount"])
+    adp_id_col, adp_code_col, adp_amt_col, adp_desc_col, adp_pct_col = _find_adp_columns(df_adp.columns)
+
+    df_adp[adp_id_col] = norm_key_series(df_adp[adp_id_col])
+
+    # Resolve every row at once: description, then code, each exact and then lowercased
+    raw_code = text_column(df_adp[adp_code_col])
+    raw_desc = text_column(df_adp[adp_desc_col]) if adp_desc_col else pd.Series("", index=df_adp.index, dtype=object)
+    deduction_name = lookup_mapping(raw_desc, mapping)
+    deduction_name = deduction_name.where(deduction_name.notna(), lookup_mapping(raw_code, mapping))
+
+    # A zero amount falls back to a non-zero deduction %
+    amt, amt_text = parse_money_column(df_adp[adp_amt_col])
+    if adp_pct_col:
+        pct_val, pct_text = parse_money_column(df_adp[adp_pct_col])
+        use_pct = (amt == 0.0) & (pct_val != 0.0)
+        amt, amt_text = amt.mask(use_pct, pct_val), amt_text.mask(use_pct, pct_text)
+
+    adp_records = pd.DataFrame({
+        "Employee_ID": df_adp[adp_id_col],
+        "Deduction_Name": deduction_name,
+        "ADP_Raw_Code": raw_code,
+        "ADP_Description": raw_desc,
+        "ADP_Amount": amt,
+        "ADP_Amount_Text": amt_text,
+    })[deduction_name.notna()]
 
     # Process Uzio
-    uz_id_col = next((c for c in df_uzio.columns if "employee" in c.lower() and "id" in c.lower()), None)
-    uz_ded_col = next((c for c in df_uzio.columns if "deduction" in c.lower() and "name" in c.lower()), None)
-    uz_amt_col = next((c for c in df_uzio.columns if "amount" in c.lower() or "percent" in c.lower()), None)
-
-    if not all([uz_id_col, uz_ded_col, uz_amt_col]):
-        return None, f"Uzio Sheet missing required columns (Employee ID, Deduction Name, Amount/Percentage). Found: {list(df_uzio.columns)}", []
-
-    uzio_records = []
-    for _, row in df_uzio.iterrows():
-        emp_id = str(row[uz_id_col]).strip()
-        ded_name = str(row[uz_ded_col]).strip()
-        amt = clean_money_val(row[uz_amt_col])
-        
-        uzio_records.append({
-            "Uzio_Employee_ID": emp_id,
-            "Uzio_Deduction_Name": ded_name,
-            "Uzio_Amount": amt,
-            "Key": f"{emp_id}|{ded_name}".lower()
-        })
-    
-    df_uz_clean = pd.DataFrame(uzio_records)
-    if not df_uz_clean.empty:
-        df_uz_clean = df_uz_clean.groupby(["Uzio_Employee_ID", "Uzio_Deduction_Name", "Key"], as_index=False)["Uzio_Amount"].sum()
+    uz_id_col, uz_ded_col, uz_amt_col = _find_uzio_columns(df_uzio.columns)
+
+    df_uzio[uz_id_col] = norm_key_series(df_uzio[uz_id_col])
+
+    uz_amt, uz_amt_text = parse_money_column(df_uzio[uz_amt_col])
+    uzio_records = pd.DataFrame({
+        "Uzio_Employee_ID": df_uzio[uz_id_col],
+        "Uzio_Deduction_Name": text_column(df_uzio[uz_ded_col]),
+        "Uzio_Amount": uz_amt,
+        "Uzio_Amount_Text": uz_amt_text,
+    })
+
+    # Join key: (employee, deduction) case-insensitively, as shared integer codes
+    adp_records["Key"], uzio_records["Key"] = composite_key_codes(
+        [adp_records["Employee_ID"], adp_records["Deduction_Name"]],
+        [uzio_records["Uzio_Employee_ID"], uzio_records["Uzio_Deduction_Name"]],
+    )
+
+    if not adp_records.empty:
+        df_adp_clean = adp_records.groupby(["Employee_ID", "Deduction_Name", "ADP_Raw_Code", "ADP_Description", "Key"], as_index=False).agg(
+            ADP_Amount=("ADP_Amount", "sum"), ADP_Amount_Text=("ADP_Amount_Text", "first"))
+    else:
+        df_adp_clean = pd.DataFrame(columns=["Employee_ID", "Deduction_Name", "ADP_Raw_Code", "ADP_Description", "Key", "ADP_Amount", "ADP_Amount_Text"])
+
+    if not uzio_records.empty:
+        df_uz_clean = uzio_records.groupby(["Uzio_Employee_ID", "Uzio_Deduction_Name", "Key"], as_index=False).agg(
+            Uzio_Amount=("Uzio_Amount", "sum"), Uzio_Amount_Text=("Uzio_Amount_Text", "first"))
     else:
-        df_uz_clean = pd.DataFrame(columns=["Uzio_Employee_ID", "Uzio_Deduction_Name", "Key", "Uzio_Amount"])
+        df_uz_clean = pd.DataFrame(columns=["Uzio_Employee_ID", "Uzio_Deduction_Name", "Key", "Uzio_Amount", "Uzio_Amount_Text"])
 
     # Merge
     merged = pd.merge(df_adp_clean, df_uz_clean, on="Key", how="outer", suffixes=('_ADP', '_UZIO'))
@@ -163,62 +193,30 @@ def _run_deduction_audit(df_uzio, df_adp, df_map):
     adp_emps = set(df_adp_clean["Employee_ID"].unique()) if not df_adp_clean.empty else set()
     uzio_emps = set(df_uz_clean["Uzio_Employee_ID"].unique()) if not df_uz_clean.empty else set()
     
-    results = []
-    for _, row in merged.iterrows():
-        emp_id = row["Employee_ID"] if pd.notna(row["Employee_ID"]) else row["Uzio_Employee_ID"]
-        
-        adp_final_name = row["ADP_Description"] if pd.notna(row["ADP_Amount"]) and pd.notna(row["ADP_Description"]) else (row["ADP_Raw_Code"] if pd.notna(row["ADP_Amount"]) else "Not Available")
-        uzio_final_name = row["Uzio_Deduction_Name"] if pd.notna(row["Uzio_Amount"]) else "Not Available"
-        
-        raw_code = row["ADP_Raw_Code"] if pd.notna(row["ADP_Raw_Code"]) else ""
-        adp_val = row["ADP_Amount"] if pd.notna(row["ADP_Amount"]) else 0.0
-        uz_val = row["Uzio_Amount"] if pd.notna(row["Uzio_Amount"]) else 0.0
-        
-        has_adp = pd.notna(row["ADP_Amount"])
-        has_uzio = pd.notna(row["Uzio_Amount"])
-        
-        status = ""
-        if has_adp and has_uzio:
-            if abs(adp_val - uz_val) < 0.01:
-                status = "Data Match"
-            else:
-                status = "Data Mismatch"
-        elif has_adp and not has_uzio:
-            if emp_id in uzio_emps:
-                status = "Value Missing in Uzio (ADP has Value)"
-            else:
-                status = "Employee Missing in Uzio"
-        elif has_uzio and not has_adp:
-            if emp_id in adp_emps:
-                status = "Value Missing in ADP (Uzio has Value)"
-            else:
-                status = "Employee Missing in ADP"
-        
-        results.append({
-            "Employee ID": emp_id,
-            "ADP Deduction Description": adp_final_name,
-            "Uzio Deduction Name": uzio_final_name,
-            "ADP Code": raw_code,
-            "ADP Amount": adp_val,
-            "Uzio Amount": uz_val,
-            "Status": status
-        })
-        
+    has_adp = merged["ADP_Amount"].notna()
+    has_uzio = merged["Uzio_Amount"].notna()
+    emp_id = merged["Employee_ID"].where(merged["Employee_ID"].notna(), merged["Uzio_Employee_ID"])
+    adp_val = merged["ADP_Amount"].astype("float64").fillna(0.0)
+    uz_val = merged["Uzio_Amount"].astype("float64").fillna(0.0)
+    matched = money_values_match(adp_val, merged["ADP_Amount_Text"], uz_val, merged["Uzio_Amount_Text"])
+
+    adp_final_name = merged["ADP_Description"].where(merged["ADP_Description"].notna(), merged["ADP_Raw_Code"])
+    results = pd.DataFrame({
+        "Employee ID": emp_id,
+        "ADP Deduction Description": adp_final_name.where(has_adp, "Not Available"),
+        "Uzio Deduction Name": merged["Uzio_Deduction_Name"].where(has_uzio, "Not Available"),
+        "ADP Code": merged["ADP_Raw_Code"].where(merged["ADP_Raw_Code"].notna(), ""),
+        "ADP Amount": money_display(adp_val, merged["ADP_Amount_Text"]),
+        "Uzio Amount": money_display(uz_val, merged["Uzio_Amount_Text"]),
+        "Status": deduction_status(has_adp, has_uzio, matched, emp_id.isin(uzio_emps), emp_id.isin(adp_emps)),
+    }).infer_objects()
+
     return _generate_output(results)
 
-def _generate_output(results):
-    df_res = pd.DataFrame(results)
-    
+def _generate_output(df_res):
     # Consolidate Field Logic for Deduction Audit
-    def get_field_name(row):
-        uz_name = row.get("Uzio Deduction Name", "Not Available")
-        adp_name = row.get("ADP Deduction Description", "Not Available")
-        
-        if uz_name != "Not Available":
-            return uz_name
-        return adp_name
-
-    df_res["Field"] = df_res.apply(get_field_name, axis=1)
+    uz_name = df_res["Uzio Deduction Name"]
+    df_res["Field"] = uz_name.where(uz_name != "Not Available", df_res["ADP Deduction Description"])
 
     # Pivot Summary
     expected_statuses = [
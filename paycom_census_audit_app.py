@@ -7,6 +7,32 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from audit_core import (
+    ACTIVE_STATUSES,
+    as_object_array,
+    audit_scope_metrics,
+    build_employee_summary,
+    build_label_index,
+    count_by_field_and_status,
+    detail_parquet_bytes,
+    distinct_positions,
+    first_index_by_key,
+    norm_key_series,
+    normalize_distinct,
+    normalize_employee_ids,
+    normalize_status_filter,
+    parse_employee_ids,
+    parse_sort_dates,
+    read_header,
+    resolve_label,
+    select_fields,
+    shard_metrics,
+    shard_sheet_names,
+    status_excluded_employees,
+    status_filter_metrics,
+    write_sheet_sharded,
+)
+
 # =========================================================
 # Paycom vs UZIO – Census Audit Tool
 # INPUT workbook tabs (single file):
@@ -17,7 +43,10 @@ import streamlit as st
 # OUTPUT workbook tabs:
 #   - Summary
 #   - Field_Summary_By_Status
+#   - Employee_Summary
+#   - Mapping_Resolution   (Paycom column each mapping label resolved to, and how)
 #   - Comparison_Detail_AllFields
+#     (split into Comparison_Detail_AllFields_1, _2, ... past Excel's row limit)
 #
 # Key rules included:
 #   ✅ Dates compare as DATE (ignore time part)
@@ -72,16 +101,6 @@ def find_col(df_cols, *candidate_names):
             return norm_map[key]
     return None
 
-def norm_key_series(s: pd.Series) -> pd.Series:
-    s2 = s.astype(object).where(~s.isna(), "")
-    def _fix(v):
-        v = str(v).strip()
-        v = v.replace("\u00A0", " ")
-        if re.fullmatch(r"\d+\.0+", v):
-            v = v.split(".")[0]
-        return v
-    return s2.map(_fix)
-
 def try_parse_date(x):
     x = norm_blank(x)
     if x == "":
@@ -154,12 +173,6 @@ def first_alpha_char(x):
     m = re.search(r"[A-Za-z]", txt)
     return m.group(0).casefold() if m else ""
 
-def normalize_middle_initial(uzio_val, paycom_val):
-    # UZIO has 'M', Paycom has 'MICHELLE' => OK if first letter matches
-    u = first_alpha_char(uzio_val)
-    p = first_alpha_char(paycom_val)
-    return u != "" and p != "" and u == p
-
 def canonical_pay_type(x):
     s = normalize_space_and_case(x)
     if s == "":
@@ -210,41 +223,7 @@ def resolve_sheet_name(xls: pd.ExcelFile, candidates):
             return existing_norm[k]
     return None
 
-def resolve_paycom_col_label(label: str, paycom_cols_all) -> str:
-    if label is None:
-        return ""
-    raw = str(label).strip()
-    raw = raw.replace("’", "'").replace("“", '"').replace("”", '"')
-    raw = raw.strip().strip(",")
-    if raw == "":
-        return ""
-
-    pay_norm = {norm_colname(c).casefold(): c for c in paycom_cols_all}
-
-    direct = norm_colname(raw).casefold()
-    if direct in pay_norm:
-        return pay_norm[direct]
-
-    parts = re.split(r"\(|\)|\bor\b|/|,|;", raw, flags=re.IGNORECASE)
-    parts = [norm_colname(p) for p in parts if norm_colname(p)]
-
-    extra = []
-    for p in parts:
-        extra.extend([norm_colname(x) for x in re.split(r"\s[-–]\s", p) if norm_colname(x)])
-    parts = parts + extra
-
-    for p in parts:
-        k = norm_colname(p).casefold()
-        if k in pay_norm:
-            return pay_norm[k]
-
-    for k_norm, actual in pay_norm.items():
-        if k_norm and (k_norm in direct or direct in k_norm):
-            return actual
-
-    return ""
-
-def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, paycom_cols_all: list) -> pd.DataFrame:
+def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, paycom_label_index: dict) -> pd.DataFrame:
     m = pd.read_excel(xls, sheet_name=sheet_name, dtype=object)
     m.columns = [norm_colname(c) for c in m.columns]
 
@@ -268,7 +247,12 @@ def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, paycom_cols_all: list
 
     m["UZIO_Column"] = m[uz_col_name]
     m["PAYCOM_Label"] = m[pc_col_name]
-    m["PAYCOM_Resolved_Column"] = m["PAYCOM_Label"].map(lambda x: resolve_paycom_col_label(x, paycom_cols_all))
+    resolved = [resolve_label(x, paycom_label_index) for x in m["PAYCOM_Label"]]
+    m["PAYCOM_Resolved_Column"] = [col for col, _ in resolved]
+    m["PAYCOM_Resolved_By"] = [how or "not found (field skipped)" for _, how in resolved]
+    m["Compare_Kind"] = m["UZIO_Column"].map(field_compare_kind)
+    for pay_type, col in PAY_TYPE_IGNORE_COLUMNS.items():
+        m[col] = [should_ignore_field_for_paytype(f, pay_type) for f in m["UZIO_Column"]]
 
     # exclude Employee ID/Employee Code from comparisons (key only)
     m["_uz_norm"] = m["UZIO_Column"].map(lambda x: norm_colname(x).casefold())
@@ -277,6 +261,10 @@ def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, paycom_cols_all: list
 
     return m
 
+# Pay types that have ignore rules, and the mapping column holding each one's decision per field.
+# Every other pay type (or none) compares all fields.
+PAY_TYPE_IGNORE_COLUMNS = {"hourly": "Ignore_If_Hourly", "salaried": "Ignore_If_Salaried"}
+
 def should_ignore_field_for_paytype(field_name: str, pay_type_canon: str) -> bool:
     """
     Pay-type based ignore rules (as per your requirement):
@@ -301,65 +289,327 @@ def should_ignore_field_for_paytype(field_name: str, pay_type_canon: str) -> boo
 
     return False
 
-def normalized_compare(field_name: str, uzio_val, paycom_val) -> bool:
-    f = norm_colname(field_name).casefold()
+def digits_no_leading_zeros(x):
+    return re.sub(r"\D", "", str(x)).lstrip("0")
+
+def phone_no_leading_zeros(x):
+    return normalize_phone(x).lstrip("0")
 
-    if "termination reason" in f:
+def numeric_equal(uzio_val, paycom_val) -> bool:
+    fa = as_float_or_none(uzio_val)
+    fb = as_float_or_none(paycom_val)
+    if fa is not None and fb is not None:
+        return abs(fa - fb) <= 1e-9
+    return normalize_space_and_case(uzio_val) == normalize_space_and_case(paycom_val)
+
+# ---------- Field comparators ----------
+DATE_KEYWORDS = ["date", "dob", "birth", "effective", "doh", "hire", "termination"]
+NUMERIC_KEYWORDS = ["salary", "rate", "hours", "amount", "percent", "percentage", "digits"]
+
+# First matching rule wins (order matters: "termination reason" before the "termination" date keyword).
+COMPARE_KIND_RULES = [
+    ("termination_reason", lambda f: "termination reason" in f),
+    ("employment_status", lambda f: "employment status" in f),
+    ("pay_type", lambda f: "pay type" in f),
+    ("employment_type", lambda f: "employment type" in f),
+    ("middle_initial", lambda f: ("middle" in f) and ("initial" in f)),
+    ("suffix", lambda f: "suffix" in f),
+    ("ssn", lambda f: "ssn" in f),
+    ("phone", lambda f: "phone" in f),
+    ("zip", lambda f: "zip" in f),
+    ("date", lambda f: any(k in f for k in DATE_KEYWORDS)),
+    ("numeric", lambda f: any(k in f for k in NUMERIC_KEYWORDS)),
+]
+
+def field_compare_kind(field_name: str) -> str:
+    f = norm_colname(field_name).casefold()
+    for kind, matches in COMPARE_KIND_RULES:
+        if matches(f):
+            return kind
+    return "text"
+
+# Kinds that normalize each side on its own; the values match when the normalized forms are equal
+KIND_NORMALIZERS = {
+    "employment_status": canonical_employment_status,
+    "pay_type": canonical_pay_type,
+    "employment_type": normalize_employment_type,
+    # UZIO has 'M', Paycom has 'MICHELLE' => OK if first letter matches
+    "middle_initial": first_alpha_char,
+    "suffix": normalize_suffix,
+    # SSN / Zip: digits only; SSN / Phone / Zip: leading zeros removed
+    "ssn": digits_no_leading_zeros,
+    "phone": phone_no_leading_zeros,
+    "zip": digits_no_leading_zeros,
+    "date": try_parse_date,
+    "text": normalize_space_and_case,
+}
+
+def values_equal(kind: str, uzio_val, paycom_val) -> bool:
+    if kind == "termination_reason":
         return termination_reason_equal(uzio_val, paycom_val)
+    if kind == "numeric":
+        return numeric_equal(uzio_val, paycom_val)
+    normalize = KIND_NORMALIZERS[kind]
+    return normalize(uzio_val) == normalize(paycom_val)
+
+# ---------- Batch comparators (whole columns of values) ----------
+def try_parse_date_column(values) -> np.ndarray:
+    """
+    Column version of try_parse_date: each distinct value once, and the distinct strings
+    through a single to_datetime call instead of one call per string.
+    """
+    values = np.asarray(values, dtype=object)
+    if len(values) == 0:
+        return values.copy()
+    first_pos, inverse = distinct_positions(values)
+    uniques = values[first_pos]
+    out = np.empty(len(uniques), dtype=object)
+
+    str_pos, strs = [], []
+    for i, v in enumerate(uniques):
+        if isinstance(v, str) and norm_blank(v) != "":
+            str_pos.append(i)
+            strs.append(v.strip())
+        else:
+            out[i] = try_parse_date(v)
+
+    if strs:
+        # format="mixed" infers the format per string exactly like the scalar parse, minus the per-call overhead
+        try:
+            parsed = pd.to_datetime(pd.Series(strs, dtype=object), format="mixed", errors="coerce")
+        except (ValueError, TypeError):
+            parsed = None
+        if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed):
+            out[str_pos] = [try_parse_date(s) for s in strs]
+        else:
+            out[str_pos] = [
+                try_parse_date(s) if pd.isna(d) else d.date().isoformat()
+                for s, d in zip(strs, parsed)
+            ]
+
+    return out[inverse]
+
+COLUMN_NORMALIZERS = {
+    try_parse_date: try_parse_date_column,
+}
+
+def normalize_pair(uz_vals: np.ndarray, pc_vals: np.ndarray, normalize):
+    """Both value columns normalized in one pass, so values shared by UZIO and Paycom are normalized once."""
+    batch = COLUMN_NORMALIZERS.get(normalize, lambda v: normalize_distinct(v, normalize))
+    both = batch(np.concatenate([uz_vals, pc_vals]))
+    return both[:len(uz_vals)], both[len(uz_vals):]
+
+def _contains(values: np.ndarray, needle: str) -> np.ndarray:
+    return pd.Series(values, dtype=object).str.contains(needle, regex=False).to_numpy(dtype=bool)
+
+def termination_reason_equal_column(uz_vals: np.ndarray, pc_vals: np.ndarray) -> np.ndarray:
+    uz, pc = normalize_pair(uz_vals, pc_vals, normalize_space_and_case)
+    uz_invol, pc_invol = _contains(uz, "involuntary"), _contains(pc, "involuntary")
+    uz_vol, pc_vol = _contains(uz, "voluntary"), _contains(pc, "voluntary")
+    return np.select(
+        [((uz == "") & (pc == "")) | (uz == "other"), uz_invol | pc_invol, uz_vol | pc_vol],
+        [True, uz_invol & pc_invol, uz_vol & pc_vol],
+        default=(uz == pc),
+    ).astype(bool)
+
+def _as_floats(values: np.ndarray):
+    """(float column, parsed mask) from as_float_or_none results; None marks a failed parse."""
+    parsed = np.array([v is not None for v in values], dtype=bool)
+    floats = np.full(len(values), np.nan)
+    floats[parsed] = values[parsed].astype(float)
+    return floats, parsed
+
+def numeric_equal_column(uz_vals: np.ndarray, pc_vals: np.ndarray) -> np.ndarray:
+    uz_f, pc_f = normalize_pair(uz_vals, pc_vals, as_float_or_none)
+    (uz_f, uz_ok), (pc_f, pc_ok) = _as_floats(uz_f), _as_floats(pc_f)
+    uz_t, pc_t = normalize_pair(uz_vals, pc_vals, normalize_space_and_case)
+    with np.errstate(invalid="ignore"):
+        close = np.abs(uz_f - pc_f) <= 1e-9
+    return np.where(uz_ok & pc_ok, close, uz_t == pc_t).astype(bool)
+
+def values_equal_column(kind: str, uz_vals: np.ndarray, pc_vals: np.ndarray) -> np.ndarray:
+    """values_equal for every row of two aligned value columns."""
+    if kind == "termination_reason":
+        return termination_reason_equal_column(uz_vals, pc_vals)
+    if kind == "numeric":
+        return numeric_equal_column(uz_vals, pc_vals)
+    uz, pc = normalize_pair(uz_vals, pc_vals, KIND_NORMALIZERS[kind])
+    return (uz == pc).astype(bool)
+
+# ---------- Columnar engine ----------
+# Same status rules as the per-cell loop in run_comparison, evaluated one mapped field
+# (a whole column of employees) at a time on frames aligned to the employee key.
+COMPARISON_ENGINES = ("columnar", "row")
+
+DETAIL_COLUMNS = [
+    "Employee",
+    "Field",
+    "Employment Status",
+    "UZIO_Value",
+    "PAYCOM_Value",
+    "PAYCOM_SourceOfTruth_Status",
+]
+
+def blank_mask(values) -> np.ndarray:
+    return normalize_distinct(values, lambda v: norm_blank(v) == "").astype(bool)
+
+def compare_field_columnar(kind: str, uz_vals: np.ndarray, pc_vals: np.ndarray, ignore: np.ndarray) -> np.ndarray:
+    """Status for one mapped field, for employees present in both sheets with both columns present."""
+    same = ignore.copy()
+    todo = ~same
+    if todo.any():
+        same[todo] = values_equal_column(kind, uz_vals[todo], pc_vals[todo])
+    uz_blank = blank_mask(uz_vals)
+    pc_blank = blank_mask(pc_vals)
+    return np.select(
+        [same, uz_blank & ~pc_blank, ~uz_blank & pc_blank],
+        ["Data Match", "Value missing in Uzio (Paycom has value)", "Value missing in Paycom (Uzio has value)"],
+        default="Data Mismatch",
+    ).astype(object)
+
+def aligned_columns(df: pd.DataFrame, first_idx: dict, columns, keys: pd.Index) -> dict:
+    """Column name -> values of each key's first row (first_index_by_key), aligned to keys."""
+    names = [c for c in dict.fromkeys(columns) if c in df.columns]
+    rows = df.loc[list(first_idx.values()), names]
+    rows.index = pd.Index(list(first_idx.keys()), dtype=object)
+    aligned = rows.reindex(keys)
+    return {c: aligned[c].to_numpy(dtype=object) for c in names}
+
+def pay_type_ignore_mask(mapping: pd.DataFrame, emp_pay_type) -> np.ndarray:
+    """
+    Employee x field ignore mask: the mapping's field x pay-type decision table
+    (plus an all-False row for pay types without rules), indexed by each employee's pay type.
+    """
+    decisions = np.vstack(
+        [mapping[col].to_numpy(dtype=bool) for col in PAY_TYPE_IGNORE_COLUMNS.values()]
+        + [np.zeros(len(mapping), dtype=bool)]
+    )
+    pay_types = pd.Series(list(emp_pay_type), dtype=object).str.casefold()
+    # get_indexer gives -1 for pay types without rules, which selects the all-False row
+    return decisions[pd.Index(list(PAY_TYPE_IGNORE_COLUMNS)).get_indexer(pay_types)]
+
+def build_comparison_detail_columnar(
+    all_emps,
+    uzio: pd.DataFrame,
+    uzio_idx: dict,
+    paycom: pd.DataFrame,
+    paycom_idx: dict,
+    mapping: pd.DataFrame,
+    emp_status,
+    emp_pay_type,
+) -> pd.DataFrame:
+    keys = pd.Index(all_emps, dtype=object)
+    fields = mapping["UZIO_Column"].tolist()
+    pc_names = mapping["PAYCOM_Resolved_Column"].tolist()
+    kinds = mapping["Compare_Kind"].tolist()
+    n_emp, n_fields = len(keys), len(fields)
+
+    uz_exists = keys.isin(list(uzio_idx))
+    pc_exists = keys.isin(list(paycom_idx))
+    both = uz_exists & pc_exists
+    ignore = pay_type_ignore_mask(mapping, emp_pay_type)
+    uz_cols = aligned_columns(uzio, uzio_idx, fields, keys)
+    pc_cols = aligned_columns(paycom, paycom_idx, pc_names, keys)
+
+    uz_out = np.full((n_emp, n_fields), "", dtype=object)
+    pc_out = np.full((n_emp, n_fields), "", dtype=object)
+    status_out = np.empty((n_emp, n_fields), dtype=object)
+    for j, (field, pc_col, kind) in enumerate(zip(fields, pc_names, kinds)):
+        uz_col_missing = field not in uz_cols
+        pc_col_missing = pc_col not in pc_cols
+        if not uz_col_missing:
+            uz_out[uz_exists, j] = uz_cols[field][uz_exists]
+        if not pc_col_missing:
+            pc_out[pc_exists, j] = pc_cols[pc_col][pc_exists]
+
+        status = status_out[:, j]
+        status[uz_exists & ~pc_exists] = "Employee ID Not Found in Paycom"
+        status[pc_exists & ~uz_exists] = "Employee ID Not Found in Uzio"
+        if pc_col_missing:
+            status[both] = "Column Missing in Paycom Sheet"
+        elif uz_col_missing:
+            status[both] = "Column Missing in Uzio Sheet"
+        elif both.any():
+            status[both] = compare_field_columnar(kind, uz_out[both, j], pc_out[both, j], ignore[both, j])
+
+    # Employee-major order (every field of the first employee, then the next), as in the row engine
+    field_col = pd.Categorical.from_codes(np.tile(np.arange(n_fields), n_emp), categories=fields)
+    detail = pd.DataFrame(
+        {
+            "Employee": np.repeat(keys.to_numpy(dtype=object), n_fields),
+            # sorted categories, as astype("category") gives the row engine
+            "Field": field_col.reorder_categories(sorted(fields)).remove_unused_categories(),
+            "Employment Status": np.repeat(as_object_array(emp_status), n_fields),
+            "UZIO_Value": uz_out.ravel(),
+            "PAYCOM_Value": pc_out.ravel(),
+            "PAYCOM_SourceOfTruth_Status": pd.Categorical(status_out.ravel()),
+        },
+        columns=DETAIL_COLUMNS,
+    )
+    # the row engine builds the frame from dicts, which infers numeric / date value columns
+    return detail.infer_objects()
 
-    if "employment status" in f:
-        return canonical_employment_status(uzio_val) == canonical_employment_status(paycom_val)
+# ---------- Paycom duplicate resolution ----------
+PAYCOM_STATUS_HEADERS = ["Employment Status", "Employee Status", "Employee_Status"]
+PAYCOM_RANK_DATE_KEYWORDS = ["hire date", "effective date"]  # also matches Rehire_Date, Position_Effective_Date
 
-    if "pay type" in f:
-        return canonical_pay_type(uzio_val) == canonical_pay_type(paycom_val)
+def deduplicate_paycom(df: pd.DataFrame, key_col: str, status_col=None):
+    """
+    Keep one Paycom row per employee (rehires and multiple positions repeat the Employee_Code):
+      1. Active rows first (Active / On Leave), then Terminated, then any other status
+      2. Within a tier, the latest hire / rehire / effective date on the row
+    Ties keep the earliest row, so exports without duplicates pass through untouched.
+    Returns (one row per employee, keys of the rows dropped).
+    """
+    keys = df[key_col]
+    dup_mask = keys.duplicated(keep=False) & (keys != "")
+    if not dup_mask.any():
+        return df, keys.iloc[:0]
+
+    dups = df[dup_mask]
+    if status_col is not None and status_col in dups.columns:
+        status = normalize_distinct(dups[status_col].to_numpy(dtype=object), canonical_employment_status)
+        terminated = pd.Series(status, dtype=object).str.contains("terminat", regex=False).to_numpy(dtype=bool)
+        tier = np.select([status == "active", terminated], [0, 1], default=2)
+    else:
+        tier = np.zeros(len(dups), dtype=int)
 
-    if "employment type" in f:
-        return normalize_employment_type(uzio_val) == normalize_employment_type(paycom_val)
+    date_cols = [
+        c for c in dups.columns
+        if any(k in norm_colname(c).casefold().replace("_", " ") for k in PAYCOM_RANK_DATE_KEYWORDS)
+    ]
+    if date_cols:
+        sort_date = pd.concat([parse_sort_dates(dups[c]) for c in date_cols], axis=1).max(axis=1)
+    else:
+        sort_date = pd.Series(pd.Timestamp.min, index=dups.index)
 
-    if ("middle" in f) and ("initial" in f):
-        if normalize_middle_initial(uzio_val, paycom_val):
-            return True
-        return first_alpha_char(uzio_val) == first_alpha_char(paycom_val)
-
-    if "suffix" in f:
-        return normalize_suffix(uzio_val) == normalize_suffix(paycom_val)
-
-    if "ssn" in f:
-        # Normalize SSN: digits only, remove leading zeros
-        u = re.sub(r"\D", "", str(uzio_val)).lstrip("0")
-        p = re.sub(r"\D", "", str(paycom_val)).lstrip("0")
-        return u == p
-
-    if "phone" in f:
-        # Normalize Phone: digits only, remove leading zeros
-        u = normalize_phone(uzio_val).lstrip("0")
-        p = normalize_phone(paycom_val).lstrip("0")
-        return u == p
-
-    if "zip" in f:
-        # Normalize Zip: digits only (simple), remove leading zeros
-        u = re.sub(r"\D", "", str(uzio_val)).lstrip("0")
-        p = re.sub(r"\D", "", str(paycom_val)).lstrip("0")
-        return u == p
-
-    # Date-ish fields (including DOH)
-    if any(k in f for k in ["date", "dob", "birth", "effective", "doh", "hire", "termination"]):
-        return try_parse_date(uzio_val) == try_parse_date(paycom_val)
-
-    # Numeric-ish fields
-    if any(k in f for k in ["salary", "rate", "hours", "amount", "percent", "percentage", "digits"]):
-        fa = as_float_or_none(uzio_val)
-        fb = as_float_or_none(paycom_val)
-        if fa is not None and fb is not None:
-            return abs(fa - fb) <= 1e-9
-        return normalize_space_and_case(uzio_val) == normalize_space_and_case(paycom_val)
+    ranked = pd.DataFrame({"key": dups[key_col], "tier": tier, "sort_date": sort_date}, index=dups.index)
+    ranked = ranked.sort_values(["key", "tier", "sort_date"], ascending=[True, True, False], kind="stable")
+    best_idx = ranked.index[~ranked["key"].duplicated(keep="first")]
 
-    return normalize_space_and_case(uzio_val) == normalize_space_and_case(paycom_val)
+    keep = ~dup_mask | df.index.isin(best_idx)
+    return df[keep], keys[~keep]
 
 # ---------- Core comparison ----------
-def run_comparison(file_bytes: bytes) -> bytes:
-    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
-
+def first_nonblank_by_key(df: pd.DataFrame, key_col: str, value_col: str, convert=str) -> dict:
+    """
+    {employee key: convert(value)} from each key's first row whose value is not blank
+    (norm_blank); blank keys are skipped. Blankness is decided once per distinct value.
+    """
+    codes, uniques = pd.factorize(df[value_col])
+    # code -1 (NaN / None) lands on the trailing True
+    blank = np.array([norm_blank(u) == "" for u in uniques] + [True], dtype=bool)[codes]
+    first = df.loc[~blank & (df[key_col] != "").to_numpy(), [key_col, value_col]]
+    first = first.drop_duplicates(subset=[key_col], keep="first")
+    return dict(zip(first[key_col], map(convert, first[value_col])))
+
+def preflight_workbook(xls: pd.ExcelFile):
+    """
+    Resolve tabs, key columns and the mapping against header rows only, so a
+    malformed upload fails before the data tabs are parsed.
+    Returns (uzio_sheet, paycom_sheet, UZIO_KEY, PAYCOM_KEY, resolved mapping,
+    label resolution of every mapping row for the Mapping_Resolution tab).
+    """
     uzio_sheet = resolve_sheet_name(xls, UZIO_SHEET_CANDIDATES)
     paycom_sheet = resolve_sheet_name(xls, PAYCOM_SHEET_CANDIDATES)
     map_sheet = resolve_sheet_name(xls, MAP_SHEET_CANDIDATES)
@@ -371,36 +621,105 @@ def run_comparison(file_bytes: bytes) -> bytes:
     if map_sheet is None:
         raise ValueError("Mapping sheet not found. Expected a tab like 'Mapping Sheet' or 'Mapping'.")
 
-    uzio = pd.read_excel(xls, sheet_name=uzio_sheet, dtype=object)
-    paycom = pd.read_excel(xls, sheet_name=paycom_sheet, dtype=object)
-
-    uzio.columns = [norm_colname(c) for c in uzio.columns]
-    paycom.columns = [norm_colname(c) for c in paycom.columns]
+    uzio_cols = [norm_colname(c) for c in read_header(xls, uzio_sheet)]
+    paycom_cols = [norm_colname(c) for c in read_header(xls, paycom_sheet)]
 
     # keys (robust)
-    UZIO_KEY = find_col(
-        uzio.columns,
+    uzio_key = find_col(
+        uzio_cols,
         "Employee ID", "EmployeeID", "Employee Id", "Employee",
         "Employee_Code", "Employee Code"
     )
-    if UZIO_KEY is None:
+    if uzio_key is None:
         raise ValueError("UZIO key column not found (expected 'Employee ID'/'Employee'/'Employee_Code').")
 
-    PAYCOM_KEY = find_col(
-        paycom.columns,
+    paycom_key = find_col(
+        paycom_cols,
         "Employee_Code", "Employee Code",
         "Employee ID", "EmployeeID", "Employee Id", "Employee"
     )
-    if PAYCOM_KEY is None:
+    if paycom_key is None:
         raise ValueError("Paycom key column not found (expected 'Employee_Code'/'Employee ID'/'Employee').")
 
+    # mapping sheet; unresolved labels stay in the resolution report but are not compared
+    resolution = read_mapping_sheet(xls, map_sheet, build_label_index(paycom_cols, norm_colname))
+    mapping = resolution[resolution["PAYCOM_Resolved_Column"] != ""].copy()
+    resolution = resolution[["UZIO_Column", "PAYCOM_Label", "PAYCOM_Resolved_Column", "PAYCOM_Resolved_By"]]
+    return uzio_sheet, paycom_sheet, uzio_key, paycom_key, mapping, resolution
+
+def list_mapped_fields(file_bytes: bytes) -> list:
+    """Uzio fields the audit would compare, from the Mapping Sheet and header rows only."""
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
+    return preflight_workbook(xls)[4]["UZIO_Column"].tolist()
+
+def run_comparison(
+    file_bytes: bytes,
+    fields=None,
+    employee_ids=None,
+    parquet: bool = False,
+    statuses=None,
+    engine: str = "columnar",
+):
+    """
+    fields / employee_ids restrict a re-run to those mapped Uzio fields and/or
+    employee IDs; rows and fields outside the selection are dropped up front.
+    statuses (e.g. ACTIVE_STATUSES) keeps only employees whose Uzio or Paycom
+    Employment Status contains one of them; the excluded counts go to the Summary.
+    Employees with several Paycom rows are compared on one of them (deduplicate_paycom);
+    the Summary counts the rows collapsed.
+    Returns the xlsx bytes, or (xlsx bytes, Parquet bytes of the full comparison
+    detail) when parquet=True.
+    """
+    if engine not in COMPARISON_ENGINES:
+        raise ValueError(f"Unknown comparison engine '{engine}'. Expected one of: {', '.join(COMPARISON_ENGINES)}")
+
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
+    uzio_sheet, paycom_sheet, UZIO_KEY, PAYCOM_KEY, mapping, label_resolution = preflight_workbook(xls)
+    n_mapped_fields = len(mapping)
+    paycom_status_col = next(
+        (pc for uz, pc in zip(mapping["UZIO_Column"], mapping["PAYCOM_Resolved_Column"])
+         if "employment status" in norm_colname(uz).casefold()),
+        None,
+    )
+    mapping = mapping[mapping["UZIO_Column"].isin(select_fields(mapping["UZIO_Column"].tolist(), fields))]
+
+    uzio = pd.read_excel(xls, sheet_name=uzio_sheet, dtype=object)
+    paycom = pd.read_excel(xls, sheet_name=paycom_sheet, dtype=object)
+
+    uzio.columns = [norm_colname(c) for c in uzio.columns]
+    paycom.columns = [norm_colname(c) for c in paycom.columns]
+
     # normalize keys
     uzio[UZIO_KEY] = norm_key_series(uzio[UZIO_KEY])
     paycom[PAYCOM_KEY] = norm_key_series(paycom[PAYCOM_KEY])
 
-    # mapping sheet
-    mapping = read_mapping_sheet(xls, map_sheet, list(paycom.columns))
-    mapping = mapping[mapping["PAYCOM_Resolved_Column"] != ""].copy()
+    requested_ids = normalize_employee_ids(employee_ids)
+    if requested_ids:
+        uzio = uzio[uzio[UZIO_KEY].isin(requested_ids)]
+        paycom = paycom[paycom[PAYCOM_KEY].isin(requested_ids)]
+
+    # one Paycom row per employee (rehires / multiple positions), chosen before the status filter
+    paycom_dedupe_status_col = paycom_status_col if paycom_status_col in paycom.columns else find_col(
+        paycom.columns, *PAYCOM_STATUS_HEADERS
+    )
+    paycom, paycom_collapsed = deduplicate_paycom(paycom, PAYCOM_KEY, paycom_dedupe_status_col)
+
+    # status filter (e.g. active only): drop employees before the comparison loop
+    status_filter = normalize_status_filter(statuses)
+    status_excluded = pd.Series(dtype=object)
+    if status_filter:
+        uzio_status_col = find_col(uzio.columns, "Employment Status")
+        if uzio_status_col is None and paycom_status_col is None:
+            raise ValueError("Status filter needs an 'Employment Status' column in Uzio Data or mapped to Paycom.")
+        sides = []
+        if uzio_status_col is not None:
+            sides.append(pd.Series(uzio[uzio_status_col].to_numpy(), index=uzio[UZIO_KEY].to_numpy()))
+        if paycom_status_col is not None:
+            sides.append(pd.Series(paycom[paycom_status_col].to_numpy(), index=paycom[PAYCOM_KEY].to_numpy()))
+        status_excluded = status_excluded_employees(sides, status_filter)
+        uzio = uzio[~uzio[UZIO_KEY].isin(status_excluded.index)]
+        paycom = paycom[~paycom[PAYCOM_KEY].isin(status_excluded.index)]
+        paycom_collapsed = paycom_collapsed[~paycom_collapsed.isin(status_excluded.index)]
 
     # employment status context map (prefer UZIO)
     uzio_emp_status_col = find_col(uzio.columns, "Employment Status")
@@ -408,25 +727,11 @@ def run_comparison(file_bytes: bytes) -> bytes:
 
     uzio_status_map = {}
     if uzio_emp_status_col is not None:
-        tmp = uzio[[UZIO_KEY, uzio_emp_status_col]].copy()
-        tmp[uzio_emp_status_col] = tmp[uzio_emp_status_col].map(norm_blank)
-        tmp = tmp[tmp[UZIO_KEY] != ""]
-        for _, r in tmp.iterrows():
-            eid = str(r[UZIO_KEY]).strip()
-            v = r[uzio_emp_status_col]
-            if eid and norm_blank(v) != "" and eid not in uzio_status_map:
-                uzio_status_map[eid] = str(v)
+        uzio_status_map = first_nonblank_by_key(uzio, UZIO_KEY, uzio_emp_status_col)
 
     paycom_status_map = {}
     if paycom_emp_status_col is not None:
-        tmp = paycom[[PAYCOM_KEY, paycom_emp_status_col]].copy()
-        tmp[paycom_emp_status_col] = tmp[paycom_emp_status_col].map(norm_blank)
-        tmp = tmp[tmp[PAYCOM_KEY] != ""]
-        for _, r in tmp.iterrows():
-            eid = str(r[PAYCOM_KEY]).strip()
-            v = r[paycom_emp_status_col]
-            if eid and norm_blank(v) != "" and eid not in paycom_status_map:
-                paycom_status_map[eid] = str(v)
+        paycom_status_map = first_nonblank_by_key(paycom, PAYCOM_KEY, paycom_emp_status_col)
 
     def get_emp_status(eid: str) -> str:
         eid = (eid or "").strip()
@@ -441,115 +746,93 @@ def run_comparison(file_bytes: bytes) -> bytes:
     paycom_pay_type_col = find_col(paycom.columns, "Pay Type")
 
     pay_type_map = {}
-    if uzio_pay_type_col is not None:
-        tmp = uzio[[UZIO_KEY, uzio_pay_type_col]].copy()
-        tmp[uzio_pay_type_col] = tmp[uzio_pay_type_col].map(norm_blank)
-        tmp = tmp[tmp[UZIO_KEY] != ""]
-        for _, r in tmp.iterrows():
-            eid = str(r[UZIO_KEY]).strip()
-            v = r[uzio_pay_type_col]
-            if eid and norm_blank(v) != "" and eid not in pay_type_map:
-                pay_type_map[eid] = canonical_pay_type(v)
-
     if paycom_pay_type_col is not None:
-        tmp = paycom[[PAYCOM_KEY, paycom_pay_type_col]].copy()
-        tmp[paycom_pay_type_col] = tmp[paycom_pay_type_col].map(norm_blank)
-        tmp = tmp[tmp[PAYCOM_KEY] != ""]
-        for _, r in tmp.iterrows():
-            eid = str(r[PAYCOM_KEY]).strip()
-            v = r[paycom_pay_type_col]
-            if eid and norm_blank(v) != "" and eid not in pay_type_map:
-                pay_type_map[eid] = canonical_pay_type(v)
+        pay_type_map.update(first_nonblank_by_key(paycom, PAYCOM_KEY, paycom_pay_type_col, canonical_pay_type))
+    if uzio_pay_type_col is not None:
+        # UZIO wins where both sheets have a pay type
+        pay_type_map.update(first_nonblank_by_key(uzio, UZIO_KEY, uzio_pay_type_col, canonical_pay_type))
 
     # index maps (keep first occurrence per employee)
-    uzio_idx = {}
-    for i, eid in uzio[UZIO_KEY].items():
-        e = str(eid).strip()
-        if e and e not in uzio_idx:
-            uzio_idx[e] = i
-
-    paycom_idx = {}
-    for i, eid in paycom[PAYCOM_KEY].items():
-        e = str(eid).strip()
-        if e and e not in paycom_idx:
-            paycom_idx[e] = i
+    uzio_idx = first_index_by_key(uzio[UZIO_KEY])
+    paycom_idx = first_index_by_key(paycom[PAYCOM_KEY])
 
     all_emps = sorted(set(uzio_idx.keys()).union(set(paycom_idx.keys())))
 
-    rows = []
-    for eid in all_emps:
-        u_i = uzio_idx.get(eid)
-        p_i = paycom_idx.get(eid)
-
-        emp_status_context = get_emp_status(eid)
-        emp_pay_type = pay_type_map.get(eid, "")
-
-        for _, mr in mapping.iterrows():
-            uz_field = mr["UZIO_Column"]
-            pc_col = mr["PAYCOM_Resolved_Column"]
-
-            uz_missing_row = (u_i is None)
-            pc_missing_row = (p_i is None)
-
-            uz_missing_col = (uz_field not in uzio.columns)
-            pc_missing_col = (pc_col not in paycom.columns)
-
-            uz_val = ""
-            pc_val = ""
-            if (not uz_missing_row) and (not uz_missing_col):
-                uz_val = uzio.loc[u_i, uz_field]
-            if (not pc_missing_row) and (not pc_missing_col):
-                pc_val = paycom.loc[p_i, pc_col]
-
-            # Decide status
-            if pc_missing_row and (not uz_missing_row):
-                status = "Employee ID Not Found in Paycom"
-            elif uz_missing_row and (not pc_missing_row):
-                status = "Employee ID Not Found in Uzio"
-            elif pc_missing_col:
-                status = "Column Missing in Paycom Sheet"
-            elif uz_missing_col:
-                status = "Column Missing in Uzio Sheet"
-            else:
-                # ✅ Pay-type based ignore rules (your latest requirement)
-                if should_ignore_field_for_paytype(uz_field, emp_pay_type):
-                    status = "Data Match"
+    if engine == "row":
+        rows = []
+        for eid in all_emps:
+            u_i = uzio_idx.get(eid)
+            p_i = paycom_idx.get(eid)
+
+            emp_status_context = get_emp_status(eid)
+            emp_ignore_col = PAY_TYPE_IGNORE_COLUMNS.get(pay_type_map.get(eid, "").casefold())
+
+            for _, mr in mapping.iterrows():
+                uz_field = mr["UZIO_Column"]
+                pc_col = mr["PAYCOM_Resolved_Column"]
+
+                uz_missing_row = (u_i is None)
+                pc_missing_row = (p_i is None)
+
+                uz_missing_col = (uz_field not in uzio.columns)
+                pc_missing_col = (pc_col not in paycom.columns)
+
+                uz_val = ""
+                pc_val = ""
+                if (not uz_missing_row) and (not uz_missing_col):
+                    uz_val = uzio.loc[u_i, uz_field]
+                if (not pc_missing_row) and (not pc_missing_col):
+                    pc_val = paycom.loc[p_i, pc_col]
+
+                # Decide status
+                if pc_missing_row and (not uz_missing_row):
+                    status = "Employee ID Not Found in Paycom"
+                elif uz_missing_row and (not pc_missing_row):
+                    status = "Employee ID Not Found in Uzio"
+                elif pc_missing_col:
+                    status = "Column Missing in Paycom Sheet"
+                elif uz_missing_col:
+                    status = "Column Missing in Uzio Sheet"
                 else:
-                    same = normalized_compare(uz_field, uz_val, pc_val)
-                    if same:
+                    # ✅ Pay-type based ignore rules (your latest requirement)
+                    if emp_ignore_col is not None and mr[emp_ignore_col]:
                         status = "Data Match"
                     else:
-                        uz_b = norm_blank(uz_val)
-                        pc_b = norm_blank(pc_val)
-                        if (uz_b == "" or uz_b is None) and (pc_b != "" and pc_b is not None):
-                            status = "Value missing in Uzio (Paycom has value)"
-                        elif (uz_b != "" and uz_b is not None) and (pc_b == "" or pc_b is None):
-                            status = "Value missing in Paycom (Uzio has value)"
+                        same = values_equal(mr["Compare_Kind"], uz_val, pc_val)
+                        if same:
+                            status = "Data Match"
                         else:
-                            status = "Data Mismatch"
-
-            rows.append(
-                {
-                    "Employee": eid,
-                    "Field": uz_field,
-                    "Employment Status": emp_status_context,  # extra context column
-                    "UZIO_Value": uz_val,
-                    "PAYCOM_Value": pc_val,
-                    "PAYCOM_SourceOfTruth_Status": status,
-                }
-            )
+                            uz_b = norm_blank(uz_val)
+                            pc_b = norm_blank(pc_val)
+                            if (uz_b == "" or uz_b is None) and (pc_b != "" and pc_b is not None):
+                                status = "Value missing in Uzio (Paycom has value)"
+                            elif (uz_b != "" and uz_b is not None) and (pc_b == "" or pc_b is None):
+                                status = "Value missing in Paycom (Uzio has value)"
+                            else:
+                                status = "Data Mismatch"
+
+                rows.append(
+                    {
+                        "Employee": eid,
+                        "Field": uz_field,
+                        "Employment Status": emp_status_context,  # extra context column
+                        "UZIO_Value": uz_val,
+                        "PAYCOM_Value": pc_val,
+                        "PAYCOM_SourceOfTruth_Status": status,
+                    }
+                )
+
+        comparison_detail = pd.DataFrame(rows, columns=DETAIL_COLUMNS)
+    else:
+        comparison_detail = build_comparison_detail_columnar(
+            all_emps, uzio, uzio_idx, paycom, paycom_idx, mapping,
+            [get_emp_status(eid) for eid in all_emps],
+            [pay_type_map.get(eid, "") for eid in all_emps],
+        )
 
-    comparison_detail = pd.DataFrame(
-        rows,
-        columns=[
-            "Employee",
-            "Field",
-            "Employment Status",
-            "UZIO_Value",
-            "PAYCOM_Value",
-            "PAYCOM_SourceOfTruth_Status",
-        ],
-    )
+    # Field / status repeat on every row: categorical codes instead of a string per row
+    for c in ("Field", "PAYCOM_SourceOfTruth_Status"):
+        comparison_detail[c] = comparison_detail[c].astype("category")
 
     # Field summary
     statuses = [
@@ -565,13 +848,7 @@ def run_comparison(file_bytes: bytes) -> bytes:
 
     if not comparison_detail.empty:
         field_summary_by_status = (
-            comparison_detail.pivot_table(
-                index="Field",
-                columns="PAYCOM_SourceOfTruth_Status",
-                values="Employee",
-                aggfunc="count",
-                fill_value=0,
-            )
+            count_by_field_and_status(comparison_detail, "Field", "PAYCOM_SourceOfTruth_Status")
             .reindex(columns=statuses, fill_value=0)
             .reset_index()
         )
@@ -579,6 +856,12 @@ def run_comparison(file_bytes: bytes) -> bytes:
     else:
         field_summary_by_status = pd.DataFrame(columns=["Field"] + statuses + ["Total"])
 
+    # Employee summary (one row per employee)
+    employee_summary = build_employee_summary(
+        comparison_detail, "Employee", "PAYCOM_SourceOfTruth_Status", statuses,
+        context_cols=["Employment Status"],
+    )
+
     # Summary
     uzio_emps = set(uzio[UZIO_KEY].dropna().map(str))
     paycom_emps = set(paycom[PAYCOM_KEY].dropna().map(str))
@@ -593,6 +876,7 @@ def run_comparison(file_bytes: bytes) -> bytes:
                 "Employees only in PAYCOM",
                 "Total UZIO Records",
                 "Total PAYCOM Records",
+                "Duplicate PAYCOM rows collapsed (one row kept per employee)",
                 "Fields Compared",
                 "Total Comparisons (field-level rows)",
             ],
@@ -603,33 +887,86 @@ def run_comparison(file_bytes: bytes) -> bytes:
                 len(uzio_emps - paycom_emps),
                 len(paycom_emps - uzio_emps),
                 int(len(uzio)),
-                int(len(paycom)),
+                int(len(paycom) + len(paycom_collapsed)),
+                int(len(paycom_collapsed)),
                 int(mapping.shape[0]),
                 int(comparison_detail.shape[0]),
             ],
         }
     )
 
+    scope = audit_scope_metrics(mapping["UZIO_Column"].tolist(), n_mapped_fields, requested_ids, uzio_emps | paycom_emps)
+    if not scope.empty:
+        summary = pd.concat([summary, scope], ignore_index=True)
+
+    status_rows = status_filter_metrics(status_filter, status_excluded)
+    if not status_rows.empty:
+        summary = pd.concat([summary, status_rows], ignore_index=True)
+
+    sharding = shard_metrics(shard_sheet_names("Comparison_Detail_AllFields", len(comparison_detail)))
+    if not sharding.empty:
+        summary = pd.concat([summary, sharding], ignore_index=True)
+
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine="openpyxl") as writer:
         summary.to_excel(writer, sheet_name="Summary", index=False)
         field_summary_by_status.to_excel(writer, sheet_name="Field_Summary_By_Status", index=False)
-        comparison_detail.to_excel(writer, sheet_name="Comparison_Detail_AllFields", index=False)
+        employee_summary.to_excel(writer, sheet_name="Employee_Summary", index=False)
+        label_resolution.to_excel(writer, sheet_name="Mapping_Resolution", index=False)
+        write_sheet_sharded(writer, comparison_detail, "Comparison_Detail_AllFields")
 
+    if parquet:
+        return out.getvalue(), detail_parquet_bytes(comparison_detail)
     return out.getvalue()
 
 # ---------- UI ----------
+STATUS_FILTER_CHOICES = ["All employees", "Active only (Active / On Leave)", "Custom statuses"]
+
 def render_ui():
     st.title(APP_TITLE)
     st.write("Upload the Excel workbook (.xlsx) with 3 tabs: Uzio Data, Paycom Data, and Mapping Sheet.")
 
     uploaded_file = st.file_uploader("Upload Excel workbook", type=["xlsx"])
+    want_parquet = st.checkbox(
+        "Also provide the full comparison detail as a Parquet file",
+        help="One file with every comparison row, for pandas / BI tools. "
+             "Useful for very large clients, where the Excel detail is split across several sheets.",
+    )
+    status_choice = st.radio("Employees to audit", STATUS_FILTER_CHOICES, horizontal=True)
+    statuses = None
+    if status_choice == STATUS_FILTER_CHOICES[1]:
+        statuses = ACTIVE_STATUSES
+    elif status_choice == STATUS_FILTER_CHOICES[2]:
+        statuses = st.text_input(
+            "Statuses to audit (comma separated; matches statuses containing these words)",
+            placeholder="Active, On Leave",
+        ).split(",")
+    selected_fields, selected_ids = [], []
+    if uploaded_file is not None:
+        with st.expander("Re-audit only some fields / employees (optional)"):
+            try:
+                field_options = list_mapped_fields(uploaded_file.getvalue())
+            except Exception as e:
+                field_options = []
+                st.warning(f"Could not read the Mapping Sheet: {e}")
+            selected_fields = st.multiselect("Fields (leave empty for all mapped fields)", field_options)
+            selected_ids = parse_employee_ids(st.text_area(
+                "Employee IDs (leave empty for all employees)",
+                placeholder="One per line, or separated by commas",
+            ))
     run_btn = st.button("Run Audit", type="primary", disabled=(uploaded_file is None))
 
     if run_btn:
         try:
             with st.spinner("Running audit..."):
-                report_bytes = run_comparison(uploaded_file.getvalue())
+                result = run_comparison(
+                    uploaded_file.getvalue(),
+                    fields=selected_fields,
+                    employee_ids=selected_ids,
+                    parquet=want_parquet,
+                    statuses=statuses,
+                )
+            report_bytes, parquet_bytes = result if want_parquet else (result, None)
 
             st.success("Report generated.")
             # requested format: Client_Name_Paycom_Census_Data_Audit_<Current Date>
@@ -643,6 +980,13 @@ def render_ui():
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 type="primary",
             )
+            if parquet_bytes is not None:
+                st.download_button(
+                    label="Download Comparison Detail (.parquet)",
+                    data=parquet_bytes,
+                    file_name=f"Client_Name_Paycom_Census_Data_Audit_Detail_{today_str}.parquet",
+                    mime="application/vnd.apache.parquet",
+                )
         except Exception as e:
             st.error(f"Failed: {e}")
 
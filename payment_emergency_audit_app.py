@@ -7,6 +7,20 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from audit_core import (
+    build_label_index,
+    clean_mapping_label,
+    count_by_field_and_status,
+    detail_parquet_bytes,
+    norm_key_series,
+    read_header,
+    require_sheets,
+    resolve_label,
+    shard_metrics,
+    shard_sheet_names,
+    write_sheet_sharded,
+)
+
 # =========================================================
 # UZIO vs ADP – Payment & Emergency Contact Comparison Tool
 #
@@ -21,8 +35,10 @@ import streamlit as st
 #   - Summary
 #   - Field_Summary_By_Status
 #       (columns removed: MISSING_IN_ADP, ADP_COLUMN_MISSING, UZIO_COLUMN_MISSING)
+#   - Mapping_Resolution   (ADP column each mapping label resolved to, and how)
 #   - Comparison_Detail_AllFields
-#       (NO FieldKey column)
+#       (NO FieldKey column; split into Comparison_Detail_AllFields_1, _2, ...
+#        past Excel's row limit)
 #
 # FIXES / RULES INCLUDED:
 # 1) Phone normalization: (410) 292-5939 == 4102925939
@@ -367,17 +383,6 @@ def is_fuzzy_match(v1, v2) -> bool:
 
 
 
-def norm_key_series(s: pd.Series) -> pd.Series:
-    s2 = s.astype(object).where(~s.isna(), "")
-    def _fix(v):
-        v = str(v).strip()
-        v = v.replace("\u00A0", " ")
-        if re.fullmatch(r"\d+\.0+", v):
-            v = v.split(".")[0]
-        return v
-    return s2.map(_fix)
-
-
 def find_col(df_cols, *candidate_names):
     """
     Search for a column name in a dataframe given a list of candidate names.
@@ -391,48 +396,18 @@ def find_col(df_cols, *candidate_names):
     return None
 
 
-def resolve_adp_col_label(label: str, adp_cols_all) -> str:
+def resolve_adp_col_label(label: str, adp_label_index: dict) -> tuple:
     """
     Resolve mapping sheet labels to actual ADP columns when possible.
     If cannot resolve, keep it as a constant: __CONST__:<label>
+    Returns (resolved column, how it was resolved).
     """
-    if label is None:
-        return ""
-    raw = str(label).strip()
-    raw = raw.replace("’", "'").replace("“", '"').replace("”", '"')
-    raw = raw.strip().strip(",")
-    if raw == "":
-        return ""
-
-    adp_norm = {norm_colname(c).casefold(): c for c in adp_cols_all}
-
-    direct = norm_colname(raw).casefold()
-    if direct in adp_norm:
-        return adp_norm[direct]
-
-    # If mapping has patterns like: ASSOCIATE ID (or "Associate ID")
-    parts = re.split(r"\(|\)|\bor\b|/|,|;", raw, flags=re.IGNORECASE)
-    parts = [norm_colname(p) for p in parts if norm_colname(p)]
-
-    # Also split patterns like "SV1 - savings"
-    extra = []
-    for p in parts:
-        extra.extend([norm_colname(x) for x in re.split(r"\s[-–]\s", p) if norm_colname(x)])
-    parts = parts + extra
-
-    # Try exact matches for each part
-    for p in parts:
-        k = norm_colname(p).casefold()
-        if k in adp_norm:
-            return adp_norm[k]
-
-    # Try contains match
-    for k_norm, actual in adp_norm.items():
-        if k_norm and (k_norm in direct or direct in k_norm):
-            return actual
-
+    col, how = resolve_label(label, adp_label_index)
+    raw = clean_mapping_label(label)
+    if how or raw == "":
+        return col, how
     # Otherwise treat as constant
-    return f"__CONST__:{raw}"
+    return f"__CONST__:{raw}", "not found (label used as a constant)"
 
 
 
@@ -689,15 +664,22 @@ def normalize_uzio_payment_priority(uzio_pay: pd.DataFrame, emp_col: str) -> pd.
 
 
 # ---------- Record key builders ----------
+def employee_keys(df: pd.DataFrame, emp_col: str) -> pd.Series:
+    """Normalized employee key per row, computed once for the whole frame."""
+    if emp_col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return norm_key_series(df[emp_col])
+
 def build_payment_base_key(df: pd.DataFrame, emp_col: str):
     routing_col = find_col(df.columns, "ROUTING NUMBER", "Routing Number")
     acct_col = find_col(df.columns, "ACCOUNT NUMBER", "Account Number")
     dep_type_col = find_col(df.columns, "DEPOSIT TYPE", "Deposit Type")
     dep_amt_col = find_col(df.columns, "DEPOSIT AMOUNT", "Deposit Amount")
     dep_pct_col = find_col(df.columns, "DEPOSIT PERCENT", "Deposit Percent", "DEPOSIT PERCENTAGE", "Deposit Percentage")
+    emp_keys = employee_keys(df, emp_col)
 
     def _row_key(r):
-        emp = norm_key_series(pd.Series([r.get(emp_col, "")])).iloc[0]
+        emp = emp_keys.at[r.name]
         routing = digits_only_padded(r.get(routing_col, ""), 9) if routing_col else ""
         acct = digits_only(r.get(acct_col, "")) if acct_col else ""
 
@@ -721,9 +703,10 @@ def build_contact_base_key(df: pd.DataFrame, emp_col: str):
     name_col = find_col(df.columns, "Contact Name", "NAME", "Name")
     phone_col = find_col(df.columns, "Mobile Phone", "Phone", "MOBILE PHONE")
     rel_col = find_col(df.columns, "Relationship Description", "Relationship")
+    emp_keys = employee_keys(df, emp_col)
 
     def _row_key(r):
-        emp = norm_key_series(pd.Series([r.get(emp_col, "")])).iloc[0]
+        emp = emp_keys.at[r.name]
         nm = normalize_person_name(r.get(name_col, "")) if name_col else ""
         ph = norm_phone_digits(r.get(phone_col, "")) if phone_col else ""
         rl = norm_value(r.get(rel_col, ""), "Relationship Description") if rel_col else ""
@@ -764,7 +747,7 @@ def group_indices(df: pd.DataFrame):
     return g
 
 
-def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, adp_all_cols: list) -> pd.DataFrame:
+def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, adp_label_index: dict) -> pd.DataFrame:
     m = pd.read_excel(xls, sheet_name=sheet_name, dtype=object)
     m.columns = [norm_colname(c) for c in m.columns]
 
@@ -787,7 +770,9 @@ def read_mapping_sheet(xls: pd.ExcelFile, sheet_name: str, adp_all_cols: list) -
 
     m["UZIO_Column"] = m[uz_col_name]
     m["ADP_Label"] = m[adp_col_name]
-    m["ADP_Resolved_Column"] = m["ADP_Label"].map(lambda x: resolve_adp_col_label(x, adp_all_cols))
+    resolved = [resolve_adp_col_label(x, adp_label_index) for x in m["ADP_Label"]]
+    m["ADP_Resolved_Column"] = [col for col, _ in resolved]
+    m["ADP_Resolved_By"] = [how for _, how in resolved]
 
     # exclude Employee ID row from comparisons (it is only key)
     m["_uz_norm"] = m["UZIO_Column"].map(lambda x: norm_colname(x).casefold())
@@ -810,8 +795,42 @@ def drop_unwanted_field_summary_columns(field_summary_df: pd.DataFrame) -> pd.Da
 
 
 # ---------- Core comparison ----------
-def run_comparison(file_bytes: bytes) -> dict:
+def preflight_workbook(xls: pd.ExcelFile):
+    """
+    Validate the five tabs, the three key columns and both mapping sheets from
+    header rows only, so a malformed upload fails before the data tabs are parsed.
+    Returns (UZIO_KEY, ADP_PAY_KEY, ADP_EC_KEY, pay_map, ec_map).
+    """
+    require_sheets(xls, UZIO_SHEET, ADP_PAY_SHEET, ADP_EC_SHEET, PAY_MAP_SHEET, EC_MAP_SHEET)
+    uzio_cols = [norm_colname(c) for c in read_header(xls, UZIO_SHEET)]
+    adp_pay_cols = [norm_colname(c) for c in read_header(xls, ADP_PAY_SHEET)]
+    adp_ec_cols = [norm_colname(c) for c in read_header(xls, ADP_EC_SHEET)]
+
+    uzio_key = find_col(uzio_cols, "Employee ID", "EmployeeID", "Employee Id")
+    if uzio_key is None:
+        raise ValueError("UZIO key column 'Employee ID' not found in 'Uzio Data' tab.")
+
+    adp_pay_key = find_col(adp_pay_cols, "ASSOCIATE ID", "Associate ID")
+    adp_ec_key = find_col(adp_ec_cols, "ASSOCIATE ID", "Associate ID")
+    if adp_pay_key is None:
+        raise ValueError("ADP Payment Data must contain 'ASSOCIATE ID' (or 'Associate ID').")
+    if adp_ec_key is None:
+        raise ValueError("ADP Emergency Contact Data must contain 'ASSOCIATE ID' (or 'Associate ID').")
+
+    # one label index over both ADP tabs, shared by the two mapping sheets
+    adp_label_index = build_label_index(adp_pay_cols + adp_ec_cols, norm_colname)
+    pay_map = read_mapping_sheet(xls, PAY_MAP_SHEET, adp_label_index)
+    ec_map = read_mapping_sheet(xls, EC_MAP_SHEET, adp_label_index)
+    return uzio_key, adp_pay_key, adp_ec_key, pay_map, ec_map
+
+
+def run_comparison(file_bytes: bytes, parquet: bool = False) -> dict:
+    """
+    {"payment": xlsx bytes, "emergency_contact": xlsx bytes}; with parquet=True also
+    "payment_parquet" / "emergency_contact_parquet" holding each full comparison detail.
+    """
     xls = pd.ExcelFile(io.BytesIO(file_bytes), engine="openpyxl")
+    UZIO_KEY, ADP_PAY_KEY, ADP_EC_KEY, pay_map, ec_map = preflight_workbook(xls)
 
     uzio = pd.read_excel(xls, sheet_name=UZIO_SHEET, dtype=object)
     adp_pay_raw = pd.read_excel(xls, sheet_name=ADP_PAY_SHEET, dtype=object)
@@ -821,25 +840,10 @@ def run_comparison(file_bytes: bytes) -> dict:
     adp_pay_raw.columns = [norm_colname(c) for c in adp_pay_raw.columns]
     adp_ec.columns = [norm_colname(c) for c in adp_ec.columns]
 
-    UZIO_KEY = find_col(uzio.columns, "Employee ID", "EmployeeID", "Employee Id")
-    if UZIO_KEY is None:
-        raise ValueError("UZIO key column 'Employee ID' not found in 'Uzio Data' tab.")
-
-    ADP_PAY_KEY = find_col(adp_pay_raw.columns, "ASSOCIATE ID", "Associate ID")
-    ADP_EC_KEY = find_col(adp_ec.columns, "ASSOCIATE ID", "Associate ID")
-    if ADP_PAY_KEY is None:
-        raise ValueError("ADP Payment Data must contain 'ASSOCIATE ID' (or 'Associate ID').")
-    if ADP_EC_KEY is None:
-        raise ValueError("ADP Emergency Contact Data must contain 'ASSOCIATE ID' (or 'Associate ID').")
-
     uzio[UZIO_KEY] = norm_key_series(uzio[UZIO_KEY])
     adp_pay_raw[ADP_PAY_KEY] = norm_key_series(adp_pay_raw[ADP_PAY_KEY])
     adp_ec[ADP_EC_KEY] = norm_key_series(adp_ec[ADP_EC_KEY])
 
-    adp_all_cols = list(adp_pay_raw.columns) + list(adp_ec.columns)
-    pay_map = read_mapping_sheet(xls, PAY_MAP_SHEET, adp_all_cols)
-    ec_map = read_mapping_sheet(xls, EC_MAP_SHEET, adp_all_cols)
-
     payment_derived_fields = {
         "Paycheck Distribution",
         "Paycheck Percentage",
@@ -850,6 +854,7 @@ def run_comparison(file_bytes: bytes) -> dict:
     pay_map.loc[pay_map["UZIO_Column"].isin(payment_derived_fields), "ADP_Resolved_Column"] = pay_map.loc[
         pay_map["UZIO_Column"].isin(payment_derived_fields), "UZIO_Column"
     ]
+    pay_map.loc[pay_map["UZIO_Column"].isin(payment_derived_fields), "ADP_Resolved_By"] = "derived from the ADP payment rows"
 
     adp_pay = normalize_adp_payment_table(adp_pay_raw, ADP_PAY_KEY)
 
@@ -881,9 +886,10 @@ def run_comparison(file_bytes: bytes) -> dict:
         emp_key_uz: str,
         emp_key_ad: str,
         mapping_df: pd.DataFrame,
-    ) -> bytes:
+    ) -> tuple:
         """
         Generates the comparison report for a specific section (Payment or Emergency Contact).
+        Returns (xlsx bytes, Parquet bytes of the comparison detail or None).
         - Iterates through all unique record keys (union of UZIO and ADP keys).
         - Aligns records based on the generated keys.
         - Compares fields defined in the Mapping Sheet.
@@ -972,11 +978,12 @@ def run_comparison(file_bytes: bytes) -> dict:
             rows,
             columns=["Employee ID", "Section", "Field", "UZIO_Value", "ADP_Value", "ADP_SourceOfTruth_Status"],
         )
+        # Field / status repeat on every row: categorical codes instead of a string per row
+        for c in ("Field", "ADP_SourceOfTruth_Status"):
+            comparison_detail[c] = comparison_detail[c].astype("category")
 
-        # Field summary
+        # Field summary (one report = one section, so "<Section> :: <Field>" keeps the field order)
         if len(comparison_detail):
-            comparison_detail["_FieldKey"] = comparison_detail["Section"] + " :: " + comparison_detail["Field"]
-
             statuses = [
                 "Data Match",
                 "Data Mismatch",
@@ -988,16 +995,10 @@ def run_comparison(file_bytes: bytes) -> dict:
                 "Column Missing in Uzio Sheet",
             ]
             field_summary_by_status = (
-                comparison_detail.pivot_table(
-                    index="_FieldKey",
-                    columns="ADP_SourceOfTruth_Status",
-                    values="Employee ID",
-                    aggfunc="count",
-                    fill_value=0,
-                )
+                count_by_field_and_status(comparison_detail, "Field", "ADP_SourceOfTruth_Status")
+                .rename(index=lambda f: f"{section} :: {f}")
                 .reindex(columns=statuses, fill_value=0)
                 .reset_index()
-                .rename(columns={"_FieldKey": "Field"})
             )
             field_summary_by_status["Total"] = field_summary_by_status[statuses].sum(axis=1)
         else:
@@ -1019,10 +1020,6 @@ def run_comparison(file_bytes: bytes) -> dict:
         # Remove requested columns from Field_Summary_By_Status
         field_summary_by_status = drop_unwanted_field_summary_columns(field_summary_by_status)
 
-        # Remove FieldKey helper from Comparison_Detail_AllFields output
-        if "_FieldKey" in comparison_detail.columns:
-            comparison_detail = comparison_detail.drop(columns=["_FieldKey"])
-
         # Summary
         uzio_emp = set(uz_df[emp_key_uz].dropna().map(str)) if (len(uz_df) and emp_key_uz in uz_df.columns) else set()
         adp_emp = set(ad_df[emp_key_ad].dropna().map(str)) if (len(ad_df) and emp_key_ad in ad_df.columns) else set()
@@ -1056,15 +1053,22 @@ def run_comparison(file_bytes: bytes) -> dict:
             }
         )
 
+        sharding = shard_metrics(shard_sheet_names("Comparison_Detail_AllFields", len(comparison_detail)))
+        if not sharding.empty:
+            summary = pd.concat([summary, sharding], ignore_index=True)
+
         out = io.BytesIO()
         with pd.ExcelWriter(out, engine="openpyxl") as writer:
             summary.to_excel(writer, sheet_name="Summary", index=False)
             field_summary_by_status.to_excel(writer, sheet_name="Field_Summary_By_Status", index=False)
-            comparison_detail.to_excel(writer, sheet_name="Comparison_Detail_AllFields", index=False)
+            mapping_df[["UZIO_Column", "ADP_Label", "ADP_Resolved_Column", "ADP_Resolved_By"]].to_excel(
+                writer, sheet_name="Mapping_Resolution", index=False
+            )
+            write_sheet_sharded(writer, comparison_detail, "Comparison_Detail_AllFields")
 
-        return out.getvalue()
+        return out.getvalue(), (detail_parquet_bytes(comparison_detail) if parquet else None)
 
-    payment_bytes = build_report_for_section(
+    payment_bytes, payment_parquet = build_report_for_section(
         section="Payment",
         uz_df=uzio_pay,
         ad_df=adp_pay,
@@ -1075,7 +1079,7 @@ def run_comparison(file_bytes: bytes) -> dict:
         mapping_df=pay_map,
     )
 
-    emergency_contact_bytes = build_report_for_section(
+    emergency_contact_bytes, emergency_contact_parquet = build_report_for_section(
         section="Emergency Contact",
         uz_df=uzio_ec,
         ad_df=adp_ec,
@@ -1086,7 +1090,11 @@ def run_comparison(file_bytes: bytes) -> dict:
         mapping_df=ec_map,
     )
 
-    return {"payment": payment_bytes, "emergency_contact": emergency_contact_bytes}
+    reports = {"payment": payment_bytes, "emergency_contact": emergency_contact_bytes}
+    if parquet:
+        reports["payment_parquet"] = payment_parquet
+        reports["emergency_contact_parquet"] = emergency_contact_parquet
+    return reports
 
 
 # ---------- UI ----------
@@ -1096,12 +1104,17 @@ def render_ui():
     st.write("Upload the Excel workbook (.xlsx). The tool will generate two independent reports (Payment + Emergency Contact).")
 
     uploaded_file = st.file_uploader("Upload Excel workbook", type=["xlsx"])
+    want_parquet = st.checkbox(
+        "Also provide each full comparison detail as a Parquet file",
+        help="One file per report with every comparison row, for pandas / BI tools. "
+             "Useful for very large clients, where the Excel detail is split across several sheets.",
+    )
     run_btn = st.button("Run Audit", type="primary", disabled=(uploaded_file is None))
 
     if run_btn:
         try:
             with st.spinner("Running audit..."):
-                reports = run_comparison(uploaded_file.getvalue())
+                reports = run_comparison(uploaded_file.getvalue(), parquet=want_parquet)
 
             st.success("Reports generated (Payment + Emergency Contact).")
 
@@ -1126,6 +1139,21 @@ def render_ui():
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     type="primary",
                 )
+            if want_parquet:
+                with col1:
+                    st.download_button(
+                        label="Download Payment Detail (.parquet)",
+                        data=reports["payment_parquet"],
+                        file_name=payment_name.replace(".xlsx", "_Detail.parquet"),
+                        mime="application/vnd.apache.parquet",
+                    )
+                with col2:
+                    st.download_button(
+                        label="Download Emergency Contact Detail (.parquet)",
+                        data=reports["emergency_contact_parquet"],
+                        file_name=ec_name.replace(".xlsx", "_Detail.parquet"),
+                        mime="application/vnd.apache.parquet",
+                    )
 
         except Exception as e:
             st.error(f"Failed: {e}")
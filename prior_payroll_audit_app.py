@@ -1,9 +1,21 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import io
 import re
 from datetime import datetime
 
+from audit_core import (
+    composite_key_codes,
+    deduction_status,
+    money_display,
+    money_values_match,
+    norm_key_series,
+    normalize_distinct,
+    parse_money_column,
+    read_header,
+)
+
 # =========================================================
 # ADP to Uzio Prior Payroll Audit Tool
 # INPUT: One Excel File with 3 Tabs:
@@ -17,18 +29,12 @@ def norm_col(c):
     if c is None: return ""
     return str(c).strip().replace("\n", " ").strip()
 
-def clean_money_val(x):
-    """Parse money/percentage strings to float. Returns original string if not a number."""
-    if pd.isna(x) or x == "":
-        return 0.0
-    s = str(x).strip()
-    s_clean = s.replace("$", "").replace("%", "").replace(",", "")
-    s_clean = s_clean.replace("(", "-").replace(")", "") # Handle accounting negative
+def pay_date_text(v):
+    """Pay date as YYYY-MM-DD; values that do not parse keep their text."""
     try:
-        return float(s_clean)
-    except:
-        # If it's not a number (like an SSN), return the string itself for comparison
-        return s
+        return pd.to_datetime(v).strftime("%Y-%m-%d")
+    except Exception:
+        return str(v)
 
 def run_audit(file_bytes):
     # Load Workbook
@@ -55,20 +61,85 @@ def run_audit(file_bytes):
         if not map_sheet: missing.append("Mapping Sheet")
         return None, f"Missing Tabs: {', '.join(missing)}", []
 
-    # 2. Read Data
+    # 2. Preflight: validate required columns from header rows before parsing the data
+    error = preflight_columns(read_header(xls, uzio_sheet), read_header(xls, adp_sheet), read_header(xls, map_sheet))
+    if error:
+        return None, error, []
+
+    # 3. Read Data
     df_uzio = pd.read_excel(xls, sheet_name=uzio_sheet)
     df_adp = pd.read_excel(xls, sheet_name=adp_sheet)
     df_map = pd.read_excel(xls, sheet_name=map_sheet)
 
     return _run_prior_payroll_audit(df_uzio, df_adp, df_map)
 
+# ---------- Required columns ----------
+def _find_map_columns(cols):
+    map_adp_col = next((c for c in cols if "adp" in c.lower()), None)
+    map_uzio_col = next((c for c in cols if "uzio" in c.lower()), None)
+    return map_adp_col, map_uzio_col
+
+def _find_adp_columns(cols):
+    adp_id_col = next((c for c in cols if "associate" in c.lower() and "id" in c.lower()), None)
+
+    # Smarter Date Column Selection for ADP
+    adp_date_col = None
+    adp_date_prefs = ["PAY DATE", "CHECK DATE", "PAY_DATE"]
+
+    # 1. Try exact/preferred matches
+    for pref in adp_date_prefs:
+        match = next((c for c in cols if pref.lower() in str(c).lower()), None)
+        if match:
+            adp_date_col = match
+            break
+
+    # 2. Fallback to generic "pay" + "date" if NOT "period"
+    if not adp_date_col:
+        adp_date_col = next((c for c in cols if "pay" in c.lower() and "date" in c.lower() and "period" not in c.lower()), None)
+
+    return adp_id_col, adp_date_col
+
+def _find_uzio_columns(cols):
+    uz_id_col = next((c for c in cols if "employee" in c.lower() and "id" in c.lower()), None)
+
+    # Smarter Date Column Selection for Uzio
+    uz_date_col = None
+    uz_date_prefs = ["PAY CHECK DATE", "CHECK DATE", "PAYMENT DATE"]
+
+    # 1. Try exact/preferred matches
+    for pref in uz_date_prefs:
+        match = next((c for c in cols if pref.lower() in str(c).lower()), None)
+        if match:
+            uz_date_col = match
+            break
+
+    # 2. Fallback to generic "pay" + "date" if NOT "period" (ignores Period Start/End)
+    if not uz_date_col:
+        uz_date_col = next((c for c in cols if "pay" in c.lower() and "date" in c.lower() and "period" not in c.lower()), None)
+
+    # 3. Last resort fallback (user might only have Period End Date)
+    if not uz_date_col:
+         uz_date_col = next((c for c in cols if "pay" in c.lower() and "date" in c.lower()), None)
+
+    return uz_id_col, uz_date_col
+
+def preflight_columns(uzio_cols, adp_cols, map_cols):
+    """Error message for the first missing required column (header names only), else None."""
+    if not all(_find_map_columns(map_cols)):
+        return "Mapping Sheet must have columns identifying 'ADP' and 'Uzio' deductions."
+    if not all(_find_adp_columns(adp_cols)):
+        return f"ADP Sheet missing required columns (Associate ID, Pay Date). Found: {list(adp_cols)}"
+    if not all(_find_uzio_columns(uzio_cols)):
+        return f"Uzio Sheet missing required columns (Employee ID, Pay Date). Found: {list(uzio_cols)}"
+    return None
+
 def _run_prior_payroll_audit(df_uzio, df_adp, df_map):
+    error = preflight_columns(df_uzio.columns, df_adp.columns, df_map.columns)
+    if error:
+        return None, error, []
+
     # Mapping
-    map_adp_col = next((c for c in df_map.columns if "adp" in c.lower()), None)
-    map_uzio_col = next((c for c in df_map.columns if "uzio" in c.lower()), None)
-    
-    if not map_adp_col or not map_uzio_col:
-        return None, "Mapping Sheet must have columns identifying 'ADP' and 'Uzio' deductions.", []
+    map_adp_col, map_uzio_col = _find_map_columns(df_map.columns)
 
     # Map: ADP Header -> Uzio Header
     # Normalize input mapping keys to match headers we find
@@ -88,26 +159,7 @@ def _run_prior_payroll_audit(df_uzio, df_adp, df_map):
             mapping[k.lower()] = v
 
     # --- PROCESS ADP (WIDE) ---
-    adp_id_col = next((c for c in df_adp.columns if "associate" in c.lower() and "id" in c.lower()), None)
-    
-    # Smarter Date Column Selection for ADP
-    adp_date_col = None
-    adp_date_prefs = ["PAY DATE", "CHECK DATE", "PAY_DATE"]
-    
-    # 1. Try exact/preferred matches
-    for pref in adp_date_prefs:
-        match = next((c for c in df_adp.columns if pref.lower() in str(c).lower()), None)
-        if match:
-            adp_date_col = match
-            break
-            
-    # 2. Fallback to generic "pay" + "date" if NOT "period"
-    if not adp_date_col:
-        adp_date_col = next((c for c in df_adp.columns if "pay" in c.lower() and "date" in c.lower() and "period" not in c.lower()), None)
-    
-    if not adp_id_col or not adp_date_col:
-        return None, f"ADP Sheet missing required columns (Associate ID, Pay Date). Found: {list(df_adp.columns)}", []
-
+    adp_id_col, adp_date_col = _find_adp_columns(df_adp.columns)
 
     # Identify Deduction Columns in ADP Data
     # They should match keys in 'mapping'
@@ -167,58 +219,29 @@ def _run_prior_payroll_audit(df_uzio, df_adp, df_map):
         # Sometimes user puts the same name in both.
         # (Optional, but helps if mapping is sparse)
 
-    adp_records = []
-    # Melt/Unpivot
-    for _, row in df_adp.iterrows():
-        emp_id = str(row[adp_id_col]).strip()
-        # Normalize Date
-        try:
-            p_date = pd.to_datetime(row[adp_date_col]).strftime("%Y-%m-%d")
-        except:
-            p_date = str(row[adp_date_col])
-            
-        for d_col, uz_name in adp_deduction_map.items():
-            val = clean_money_val(row[d_col])
-            if val != 0:
-                adp_records.append({
-                    "Employee_ID": emp_id,
-                    "Pay_Date": p_date,
-                    "Deduction_Name": uz_name, # Map to Common Name
-                    "ADP_Raw_Code": d_col, # Use Header as code
-                    "ADP_Amount": val,
-                    "Key": f"{emp_id}|{p_date}|{uz_name}".lower()
-                })
-                
-    df_adp_clean = pd.DataFrame(adp_records)
-    if not df_adp_clean.empty:
-         df_adp_clean = df_adp_clean.groupby(["Employee_ID", "Pay_Date", "Deduction_Name", "ADP_Raw_Code", "Key"], as_index=False)["ADP_Amount"].sum() # Sum handling duplicates
-    else:
-         df_adp_clean = pd.DataFrame(columns=["Employee_ID", "Pay_Date", "Deduction_Name", "ADP_Raw_Code", "Key", "ADP_Amount"])
+    df_adp[adp_id_col] = norm_key_series(df_adp[adp_id_col])
+
+    # Melt/Unpivot one deduction column at a time; zero amounts are dropped
+    adp_ids = df_adp[adp_id_col].to_numpy(dtype=object)
+    adp_dates = normalize_distinct(df_adp[adp_date_col], pay_date_text)
+    adp_parts = []
+    for d_col, uz_name in adp_deduction_map.items():
+        val, val_text = parse_money_column(df_adp[d_col])
+        keep = (val != 0).to_numpy()
+        adp_parts.append(pd.DataFrame({
+            "Employee_ID": adp_ids[keep],
+            "Pay_Date": adp_dates[keep],
+            "Deduction_Name": uz_name, # Map to Common Name
+            "ADP_Raw_Code": d_col, # Use Header as code
+            "ADP_Amount": val.to_numpy()[keep],
+            "ADP_Amount_Text": val_text.to_numpy()[keep],
+        }))
+
+    adp_records = pd.concat(adp_parts, ignore_index=True) if adp_parts else pd.DataFrame(
+        columns=["Employee_ID", "Pay_Date", "Deduction_Name", "ADP_Raw_Code", "ADP_Amount", "ADP_Amount_Text"])
 
     # --- PROCESS UZIO (WIDE) ---
-    uz_id_col = next((c for c in df_uzio.columns if "employee" in c.lower() and "id" in c.lower()), None)
-    
-    # Smarter Date Column Selection for Uzio
-    uz_date_col = None
-    uz_date_prefs = ["PAY CHECK DATE", "CHECK DATE", "PAYMENT DATE"]
-    
-    # 1. Try exact/preferred matches
-    for pref in uz_date_prefs:
-        match = next((c for c in df_uzio.columns if pref.lower() in str(c).lower()), None)
-        if match:
-            uz_date_col = match
-            break
-            
-    # 2. Fallback to generic "pay" + "date" if NOT "period" (ignores Period Start/End)
-    if not uz_date_col:
-        uz_date_col = next((c for c in df_uzio.columns if "pay" in c.lower() and "date" in c.lower() and "period" not in c.lower()), None)
-
-    # 3. Last resort fallback (user might only have Period End Date)
-    if not uz_date_col:
-         uz_date_col = next((c for c in df_uzio.columns if "pay" in c.lower() and "date" in c.lower()), None)
-    
-    if not uz_id_col or not uz_date_col:
-        return None, f"Uzio Sheet missing required columns (Employee ID, Pay Date). Found: {list(df_uzio.columns)}", []
+    uz_id_col, uz_date_col = _find_uzio_columns(df_uzio.columns)
 
     # Identify Deduction Columns in Uzio Data
     # We should look for columns in Uzio data that match the VALUES in the mapping dictionary
@@ -229,122 +252,84 @@ def _run_prior_payroll_audit(df_uzio, df_adp, df_map):
         if norm_c in valid_uzio_names:
             uzio_cols_found.append(col)
             
-    uzio_records = []
-    for _, row in df_uzio.iterrows():
-        emp_id = str(row[uz_id_col]).strip()
-        try:
-            p_date = pd.to_datetime(row[uz_date_col]).strftime("%Y-%m-%d")
-        except:
-             p_date = str(row[uz_date_col])
-             
-        for col in uzio_cols_found:
-            val = clean_money_val(row[col])
-            if val != 0:
-                uzio_records.append({
-                    "Uzio_Employee_ID": emp_id,
-                    "Pay_Date": p_date,
-                    "Uzio_Deduction_Name": col, # The header is the name
-                    "Uzio_Amount": val,
-                    "Key": f"{emp_id}|{p_date}|{col}".lower()
-                })
-
-    df_uz_clean = pd.DataFrame(uzio_records)
-    if not df_uz_clean.empty:
-        df_uz_clean = df_uz_clean.groupby(["Uzio_Employee_ID", "Pay_Date", "Uzio_Deduction_Name", "Key"], as_index=False)["Uzio_Amount"].sum()
+    df_uzio[uz_id_col] = norm_key_series(df_uzio[uz_id_col])
+
+    uz_ids = df_uzio[uz_id_col].to_numpy(dtype=object)
+    uz_dates = normalize_distinct(df_uzio[uz_date_col], pay_date_text)
+    uzio_parts = []
+    for col in uzio_cols_found:
+        val, val_text = parse_money_column(df_uzio[col])
+        keep = (val != 0).to_numpy()
+        uzio_parts.append(pd.DataFrame({
+            "Uzio_Employee_ID": uz_ids[keep],
+            "Pay_Date": uz_dates[keep],
+            "Uzio_Deduction_Name": col, # The header is the name
+            "Uzio_Amount": val.to_numpy()[keep],
+            "Uzio_Amount_Text": val_text.to_numpy()[keep],
+        }))
+
+    uzio_records = pd.concat(uzio_parts, ignore_index=True) if uzio_parts else pd.DataFrame(
+        columns=["Uzio_Employee_ID", "Pay_Date", "Uzio_Deduction_Name", "Uzio_Amount", "Uzio_Amount_Text"])
+
+    # Join key: (employee, pay date, deduction) case-insensitively, as shared integer codes
+    adp_records["Key"], uzio_records["Key"] = composite_key_codes(
+        [adp_records["Employee_ID"], adp_records["Pay_Date"], adp_records["Deduction_Name"]],
+        [uzio_records["Uzio_Employee_ID"], uzio_records["Pay_Date"], uzio_records["Uzio_Deduction_Name"]],
+    )
+
+    if not adp_records.empty:
+        df_adp_clean = adp_records.groupby(["Employee_ID", "Pay_Date", "Deduction_Name", "ADP_Raw_Code", "Key"], as_index=False).agg(
+            ADP_Amount=("ADP_Amount", "sum"), ADP_Amount_Text=("ADP_Amount_Text", "first")) # Sum handling duplicates
     else:
-        df_uz_clean = pd.DataFrame(columns=["Uzio_Employee_ID", "Pay_Date", "Uzio_Deduction_Name", "Key", "Uzio_Amount"])
+        df_adp_clean = pd.DataFrame(columns=["Employee_ID", "Pay_Date", "Deduction_Name", "ADP_Raw_Code", "Key", "ADP_Amount", "ADP_Amount_Text"])
+
+    if not uzio_records.empty:
+        df_uz_clean = uzio_records.groupby(["Uzio_Employee_ID", "Pay_Date", "Uzio_Deduction_Name", "Key"], as_index=False).agg(
+            Uzio_Amount=("Uzio_Amount", "sum"), Uzio_Amount_Text=("Uzio_Amount_Text", "first"))
+    else:
+        df_uz_clean = pd.DataFrame(columns=["Uzio_Employee_ID", "Pay_Date", "Uzio_Deduction_Name", "Key", "Uzio_Amount", "Uzio_Amount_Text"])
 
     # --- COMPARISON ---
     merged = pd.merge(df_adp_clean, df_uz_clean, on="Key", how="outer", suffixes=('_ADP', '_UZIO'))
     
     # ID Sets for Missing Check (Needs ID + Date context?)
-    uzio_all_emps = set(df_uzio[uz_id_col].astype(str).str.strip().unique())
-    adp_all_emps = set(df_adp[adp_id_col].astype(str).str.strip().unique())
+    uzio_all_emps = set(df_uzio[uz_id_col].unique())
+    adp_all_emps = set(df_adp[adp_id_col].unique())
     
-    results = []
-    for _, row in merged.iterrows():
-        # Recover ID and Date from available side
-        if pd.notna(row.get("Employee_ID")):
-            emp_id = row["Employee_ID"]
-            p_date = row["Pay_Date_ADP"] if "Pay_Date_ADP" in row else row["Pay_Date"]
-        else:
-            emp_id = row["Uzio_Employee_ID"]
-            p_date = row["Pay_Date_UZIO"] if "Pay_Date_UZIO" in row else row["Pay_Date"]
-
-        adp_val = row["ADP_Amount"] if pd.notna(row["ADP_Amount"]) else 0.0
-        uz_val = row["Uzio_Amount"] if pd.notna(row["Uzio_Amount"]) else 0.0
-        
-        has_adp = pd.notna(row["ADP_Amount"])
-        has_uzio = pd.notna(row["Uzio_Amount"])
-        
-        # FIX: If Uzio value is missing, we still want to show what the ADP field *mapped to*
-        if has_uzio:
-            uz_name = row["Uzio_Deduction_Name"]
-        elif has_adp and pd.notna(row.get("Deduction_Name")):
-            # If we have ADP data, we know what it mapped to
-            uz_name = row["Deduction_Name"]
-        else:
-            uz_name = "Not Available"
-        
-        # Name resolution continued
-        adp_desc = row["ADP_Raw_Code"] if has_adp else "Not Available"
+    # Recover ID and Date from available side
+    from_adp = merged["Employee_ID"].notna()
+    emp_id = merged["Employee_ID"].where(from_adp, merged["Uzio_Employee_ID"])
+    p_date = merged["Pay_Date_ADP"].where(from_adp, merged["Pay_Date_UZIO"])
+
+    has_adp = merged["ADP_Amount"].notna()
+    has_uzio = merged["Uzio_Amount"].notna()
+    adp_val = merged["ADP_Amount"].astype("float64").fillna(0.0)
+    uz_val = merged["Uzio_Amount"].astype("float64").fillna(0.0)
+    # Numbers within a cent, text (e.g. "N/A") by exact value
+    matched = money_values_match(adp_val, merged["ADP_Amount_Text"], uz_val, merged["Uzio_Amount_Text"])
+
+    # FIX: If Uzio value is missing, we still want to show what the ADP field *mapped to*
+    uz_name = np.select(
+        [has_uzio, has_adp & merged["Deduction_Name"].notna()],
+        [merged["Uzio_Deduction_Name"], merged["Deduction_Name"]],
+        default="Not Available",
+    )
+
+    results = pd.DataFrame({
+        "Employee ID": emp_id,
+        "Pay Date": p_date,
+        "ADP field": merged["ADP_Raw_Code"].where(has_adp, "Not Available"),
+        "Uzio field": uz_name,
+        "ADP Amount": money_display(adp_val, merged["ADP_Amount_Text"]),
+        "Uzio Amount": money_display(uz_val, merged["Uzio_Amount_Text"]),
+        "Status": deduction_status(has_adp, has_uzio, matched, emp_id.isin(uzio_all_emps), emp_id.isin(adp_all_emps)),
+    }).infer_objects()
 
-        # Comparison Logic with type safety
-        status = ""
-        is_match = False
-        
-        # Check if values are numeric
-        is_adp_num = isinstance(adp_val, (int, float))
-        is_uz_num = isinstance(uz_val, (int, float))
-        
-        if has_adp and has_uzio:
-            if is_adp_num and is_uz_num:
-                # Numeric comparison
-                if abs(adp_val - uz_val) < 0.01:
-                    is_match = True
-            else:
-                # String comparison
-                if str(adp_val).strip() == str(uz_val).strip():
-                    is_match = True
-            
-            if is_match:
-                status = "Data Match"
-            else:
-                status = "Data Mismatch"
-                
-        elif has_adp and not has_uzio:
-            if emp_id in uzio_all_emps:
-                status = "Value Missing in Uzio (ADP has Value)"
-            else:
-                status = "Employee Missing in Uzio"
-        elif has_uzio and not has_adp:
-            if emp_id in adp_all_emps:
-                status = "Value Missing in ADP (Uzio has Value)"
-            else:
-                status = "Employee Missing in ADP"
-
-        results.append({
-            "Employee ID": emp_id,
-            "Pay Date": p_date,
-            "ADP field": adp_desc,
-            "Uzio field": uz_name,
-            "ADP Amount": adp_val,
-            "Uzio Amount": uz_val,
-            "Status": status
-        })
-        
     return _generate_output(results)
 
-def _generate_output(results):
-    df_res = pd.DataFrame(results)
-    
+def _generate_output(df_res):
     # Consolidate Field logic for Prior Payroll
-    def get_field_name(row):
-        if row["Uzio field"] != "Not Available":
-            return row["Uzio field"]
-        return row["ADP field"] if "ADP field" in row else "Unknown"
-            
-    df_res["Field"] = df_res.apply(get_field_name, axis=1)
+    df_res["Field"] = df_res["Uzio field"].where(df_res["Uzio field"] != "Not Available", df_res["ADP field"])
 
     # Pivot Summary
     expected_statuses = [